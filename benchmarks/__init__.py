@@ -0,0 +1 @@
+"""Benchmarks for the ranch data paths; see benchmarks/run.py for the suite."""
@@ -0,0 +1,165 @@
+"""Load-test a local ranch API: throughput and latency percentiles.
+
+Usage: python -m benchmarks.bench_api [--horses 10000] [--clients 32] [--seconds 10] [--write-ratio 0.1]
+       python -m benchmarks.bench_api --url http://127.0.0.1:8080 --user alice --password ...
+
+Without --url a throwaway server is started in a subprocess on a free port,
+with a seeded user and --horses horses. Each client keeps one connection
+open and sends a mix of searches, horse reads and (with --write-ratio)
+horse edits. Edits are saved, so they include the fsync of each append.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.generator import BREEDS, SYLLABLES, dataset_paths, generate_owner, write_ranch
+from ranch.auth import UserStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection."""
+
+    def __init__(self, host, port, token=None):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode() if payload is not None else b""
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(body)}\r\n"
+        if self.token:
+            head += f"Authorization: Bearer {self.token}\r\n"
+        self.writer.write(head.encode() + b"\r\n" + body)
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while (line := await self.reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode().partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+
+def seed(directory, user, password, count, seed=1):
+    """Create a user and a generated ranch of count horses for them."""
+    UserStore(os.path.join(directory, "users.log"), iterations=1000).register(user, password)
+    write_ranch(directory, {user: generate_owner(user, count, random.Random(seed))}, users=False)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(directory, port):
+    horses_file, barns_file, log_file, data_dir = dataset_paths(directory)
+    env = dict(os.environ)  # the repository on the path, so the server finds ranch wherever this was started
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "ranch.api", "--port", str(port), "--data-dir", data_dir,
+         "--users", os.path.join(directory, "users.log"), "--horses", horses_file, "--barns", barns_file,
+         "--log", log_file],
+        cwd=directory, env=env, stdout=subprocess.PIPE, text=True)
+    process.stdout.readline()  # "Serving on ..."
+    return process
+
+
+async def worker(host, port, token, ids, deadline, write_ratio, latencies, errors, rng):
+    client = Client(host, port, token)
+    try:
+        while time.perf_counter() < deadline:
+            roll = rng.random()
+            if roll < write_ratio:
+                kind, call = "edit", ("PATCH", f"/horses/{rng.choice(ids)}", {"breed": rng.choice(BREEDS)})
+            elif roll < (1 + write_ratio) / 2:
+                kind, call = "search", ("GET", f"/horses?name={rng.choice(SYLLABLES)}&per_page=20", None)
+            else:
+                kind, call = "get", ("GET", f"/horses/{rng.choice(ids)}", None)
+            start = time.perf_counter()
+            status, _ = await client.request(*call)
+            latencies.setdefault(kind, []).append(time.perf_counter() - start)
+            if status >= 400:
+                errors.append(status)
+    finally:
+        client.close()
+
+
+async def run(host, port, user, password, clients, seconds, write_ratio):
+    login = Client(host, port)
+    status, payload = await login.request("POST", "/login", {"username": user, "password": password})
+    if status != 200:
+        raise SystemExit(f"Login failed: {payload}")
+    login.token = payload["token"]
+    status, payload = await login.request("GET", "/horses?per_page=500")
+    ids = [h["id"] for h in payload["horses"]]
+    login.close()
+    if not ids:
+        raise SystemExit("No horses to test against.")
+
+    latencies, errors = {}, []
+    start = time.perf_counter()
+    deadline = start + seconds
+    await asyncio.gather(*(worker(host, port, login.token, ids, deadline, write_ratio, latencies, errors,
+                                  random.Random(i)) for i in range(clients)))
+    elapsed = time.perf_counter() - start
+    latencies["all"] = [t for times in latencies.values() for t in times]
+    total = len(latencies["all"])
+
+    print(f"{total} requests in {elapsed:.1f}s from {clients} clients ({write_ratio:.0%} writes)")
+    print(f"throughput: {total / elapsed:.0f} req/s")
+    print(f"{'latency ms':<12}{'count':>8}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    for kind, times in latencies.items():
+        times.sort()
+        pct = [times[min(len(times) - 1, int(len(times) * p))] * 1000 for p in (0.5, 0.9, 0.99)]
+        print(f"{kind:<12}{len(times):>8}" + "".join(f"{v:>9.2f}" for v in pct) + f"{times[-1] * 1000:>9.2f}")
+    if errors:
+        print(f"errors: {len(errors)}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="test a running server instead of starting one")
+    parser.add_argument("--user", default="bench")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--horses", type=int, default=10000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    if args.url:
+        url = urlsplit(args.url)
+        asyncio.run(run(url.hostname, url.port or 80, args.user, args.password,
+                        args.clients, args.seconds, args.write_ratio))
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        seed(directory, args.user, args.password, args.horses)
+        port = free_port()
+        server = start_server(directory, port)
+        try:
+            asyncio.run(run("127.0.0.1", port, args.user, args.password,
+                            args.clients, args.seconds, args.write_ratio))
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Time password verification at several PBKDF2 costs against a session token check.
+
+Usage: python -m benchmarks.bench_auth [--iterations 100000 300000 600000] [--users 10000] [--repeat 5]
+
+The store is filled with users hashed at a low cost, so only the
+verification being timed pays the full cost.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from ranch.auth import UserStore, _user_entry, hash_password, verify_password
+
+
+def best_of(repeat, call):
+    """Fastest of repeat runs of call(), in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, nargs="+", default=[100_000, 300_000, 600_000])
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{'verify':<26}{'ms':>10}")
+    for iterations in args.iterations:
+        stored = hash_password("secret", iterations)
+        seconds = best_of(args.repeat, lambda: verify_password("secret", stored))
+        print(f"{f'pbkdf2 {iterations}':<26}{seconds * 1000:>10.2f}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = UserStore(os.path.join(tmp, "users.log"), iterations=args.iterations[-1])
+        with store.log.lock():
+            store.log.append([_user_entry(f"user{i}", hash_password("x", 1)) for i in range(args.users)])
+        store.register("rider", "secret")
+        token = store.issue_token("rider")
+        login = best_of(args.repeat, lambda: store.authenticate("rider", "secret"))
+        check = best_of(args.repeat, lambda: store.check_token(token))
+        start = time.perf_counter()
+        UserStore(os.path.join(tmp, "users.log"))
+        opened = time.perf_counter() - start
+    print(f"{f'login, {args.users} users':<26}{login * 1000:>10.2f}")
+    print(f"{'session token check':<26}{check * 1000:>10.3f}")
+    print(f"{'open store':<26}{opened * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""Compare the streaming exporters with the old python-docx table export.
+
+Usage: python -m benchmarks.bench_export [--sizes 1000 10000 100000] [--skip-python-docx]
+
+Timings include generating the synthetic horses. Peak memory is measured
+in a second run under tracemalloc, so it only counts Python allocations;
+lxml's own buffers used by python-docx are not included.
+"""
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.generator import BREEDS, HAY
+from ranch.export import COLUMNS, horse_row, title_for, write_csv, write_docx, write_xlsx
+from ranch.records import Horse
+
+
+def synthetic_horses(count, seed=1):
+    """Yield count made-up horses, the same ones for the same seed."""
+    rng = random.Random(seed)
+    for i in range(count):
+        yield Horse(
+            id=f"h{i}",
+            name=f"Horse {i}",
+            breed=rng.choice(BREEDS),
+            barn=f"Barn {i // 200}",
+            stall=i % 200 + 1,
+            birth_date=datetime.date(2000, 1, 1) + datetime.timedelta(days=rng.randrange(9000)),
+            breakfast_hay=rng.choice(HAY),
+            lunch_hay=rng.choice(HAY),
+            dinner_hay=rng.choice(HAY),
+        )
+
+
+def python_docx_export(horses, path):
+    """The export view_horse() used to do, cell by cell with python-docx."""
+    from docx import Document
+
+    doc = Document()
+    doc.add_heading(title_for(), level=1)
+    table = doc.add_table(rows=1, cols=len(COLUMNS))
+    for cell, text in zip(table.rows[0].cells, COLUMNS):
+        cell.text = text
+    for horse in horses:
+        for cell, text in zip(table.add_row().cells, horse_row(horse)):
+            cell.text = text
+    doc.save(path)
+
+
+def measure(writer, count, path):
+    """Time one export, then repeat it under tracemalloc for peak memory."""
+    start = time.perf_counter()
+    writer(synthetic_horses(count), path)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    writer(synthetic_horses(count), path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, os.path.getsize(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark horse-list exports.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--skip-python-docx", action="store_true", help="only run the streaming writers")
+    args = parser.parse_args(argv)
+
+    writers = [("docx (streamed)", write_docx, "docx"), ("xlsx (streamed)", write_xlsx, "xlsx"),
+               ("csv", write_csv, "csv")]
+    if not args.skip_python_docx:
+        try:
+            import docx  # noqa: F401
+            writers.append(("docx (python-docx)", python_docx_export, "docx"))
+        except ImportError:
+            print("python-docx is not installed; skipping the python-docx comparison.\n")
+
+    print(f"{'writer':<20} {'horses':>8} {'seconds':>9} {'peak MiB':>9} {'file KiB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            for label, writer, ext in writers:
+                path = os.path.join(tmp, f"horses.{ext}")
+                elapsed, peak, size_bytes = measure(writer, size, path)
+                print(f"{label:<20} {size:>8} {elapsed:>9.3f} {peak / 2**20:>9.1f} {size_bytes / 1024:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Load and save throughput of the whole-file formats: pretty JSON, JSON Lines, msgpack.
+
+Usage: python -m benchmarks.bench_formats [--horses 100000] [--owners 20] [--repeat 3]
+
+A generated network is written in each format, then timed:
+
+    write       encode and write every record
+    read        read and decode every record into Horse/Barn objects
+    load owner  JsonStorage.load() of the largest owner
+    save owner  JsonStorage.save() of the largest owner, rewriting both files
+
+msgpack is skipped when the package is not installed.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.generator import generate_ranch
+from ranch.formats import CODECS
+from ranch.records import Barn, Horse
+from ranch.storage import JsonStorage, read_records, write_records
+
+OWNER = "owner0"
+
+
+def best_of(repeat, fn):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return min(runs)
+
+
+def bench_format(fmt, directory, horses, barns, owner_records, repeat):
+    horses_file = os.path.join(directory, "horses" + CODECS[fmt].extension)
+    barns_file = os.path.join(directory, "barns" + CODECS[fmt].extension)
+    horse_dicts = [h.to_dict() for h in horses]
+    barn_dicts = [b.to_dict() for b in barns]
+
+    def write():
+        write_records(horses_file, horse_dicts)
+        write_records(barns_file, barn_dicts)
+
+    def read():
+        [Horse.from_dict(h) for h in read_records(horses_file)]
+        [Barn.from_dict(b) for b in read_records(barns_file)]
+
+    storage = JsonStorage(horses_file, barns_file)
+    result = {
+        "write": best_of(repeat, write),
+        "read": best_of(repeat, read),
+        "load owner": best_of(repeat, lambda: storage.load(OWNER)),
+        "save owner": best_of(repeat, lambda: storage.save(OWNER, *owner_records)),
+    }
+    size = os.path.getsize(horses_file) + os.path.getsize(barns_file)
+    return result, size
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--horses", type=int, default=100000)
+    parser.add_argument("--owners", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    ranch = generate_ranch(args.horses, args.owners, args.seed)
+    horses = [h for owner_horses, _ in ranch.values() for h in owner_horses]
+    barns = [b for _, owner_barns in ranch.values() for b in owner_barns]
+    records = len(horses) + len(barns)
+    print(f"{len(horses)} horses and {len(barns)} barns; {OWNER} has {len(ranch[OWNER][0])} horses")
+    print(f"{'format':<9}{'MiB':>8}{'write s':>9}{'read s':>9}{'rec/s read':>12}{'MiB/s read':>12}"
+          f"{'load owner':>12}{'save owner':>12}")
+    for fmt in CODECS:
+        with tempfile.TemporaryDirectory() as directory:
+            try:
+                result, size = bench_format(fmt, directory, horses, barns, ranch[OWNER], args.repeat)
+            except ImportError as e:
+                print(f"{fmt:<9}skipped: {e}")
+                continue
+        mib = size / 2 ** 20
+        print(f"{fmt:<9}{mib:>8.1f}{result['write']:>9.3f}{result['read']:>9.3f}"
+              f"{records / result['read']:>12,.0f}{mib / result['read']:>12.1f}"
+              f"{result['load owner']:>12.3f}{result['save owner']:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Stall history queries over years of moves: interval index against a full scan.
+
+Usage: python -m benchmarks.bench_history [--horses 2000] [--years 5] [--moves-per-day 40]
+
+A synthetic history of horses moving between stalls every day is written,
+then timed:
+
+    load        reading and replaying the history file
+    stall       who was in one stall during a month (interval index)
+    barn mates  who shared a barn with a horse in the last 30 days
+    scan        the stall query done by checking every stay
+
+Every indexed answer is checked against the scan.
+"""
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+
+from ranch.history import FOREVER, StallHistory, now
+
+QUERIES = 200
+
+
+def generate(path, horses, barns, stalls, years, moves_per_day, seed):
+    """Write a history of horses moving between stalls every day; returns the barn names."""
+    rng = random.Random(seed)
+    history = StallHistory(path)
+    names = [f"Barn {i + 1}" for i in range(barns)]
+    free = [(b, s) for b in names for s in range(1, stalls + 1)]
+    rng.shuffle(free)
+    place = {}
+    start = now() - datetime.timedelta(days=365 * years)
+    events = []
+
+    def event(at, kind, horse, where):
+        events.append({"at": at.isoformat(), "event": kind, "horse": f"h{horse}", "name": f"Horse {horse}",
+                       "barn": where[0], "stall": where[1]})
+
+    for horse in range(horses):
+        if free:
+            place[horse] = free.pop()
+            event(start, "in", horse, place[horse])
+    for day in range(365 * years):
+        for _ in range(moves_per_day):
+            at = start + datetime.timedelta(days=day, seconds=rng.randrange(86400))
+            horse = rng.randrange(horses)
+            if horse in place:
+                event(at, "out", horse, place[horse])
+                free.append(place.pop(horse))
+            if free and rng.random() < 0.95:
+                place[horse] = free.pop(rng.randrange(len(free)))
+                event(at, "in", horse, place[horse])
+        if len(events) > 50000:
+            history.commit(events)
+            events = []
+    if events:
+        history.commit(events)
+    return names
+
+
+def scan(stays, barn, stall, start, end):
+    return [s for s in stays if s.barn == barn and s.stall == stall and s.start < end and (s.end or FOREVER) > start]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--horses", type=int, default=2000)
+    parser.add_argument("--barns", type=int, default=60)
+    parser.add_argument("--stalls", type=int, default=40)
+    parser.add_argument("--years", type=int, default=5)
+    parser.add_argument("--moves-per-day", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "history.jsonl")
+        barns = generate(path, args.horses, args.barns, args.stalls, args.years, args.moves_per_day, args.seed)
+        size = os.path.getsize(path)
+        history = StallHistory(path)
+        start = time.perf_counter()
+        stays = history.stays()
+        load = time.perf_counter() - start
+
+        first = min(s.start for s in stays)
+        span = (now() - first).days
+        months = [first + datetime.timedelta(days=rng.randrange(span - 31)) for _ in range(QUERIES)]
+        places = [(rng.choice(barns), rng.randint(1, args.stalls)) for _ in range(QUERIES)]
+        for (barn, stall) in set(places):
+            history.occupants(barn, stall)  # build the indexes outside the timing
+
+        start = time.perf_counter()
+        answers = [history.occupants(barn, stall, m, m + datetime.timedelta(days=31))
+                   for (barn, stall), m in zip(places, months)]
+        indexed = (time.perf_counter() - start) / QUERIES
+
+        start = time.perf_counter()
+        scanned = [scan(stays, barn, stall, m, m + datetime.timedelta(days=31)) for (barn, stall), m in zip(places, months)]
+        full_scan = (time.perf_counter() - start) / QUERIES
+        assert [sorted(id(s) for s in a) for a in answers] == [sorted(id(s) for s in a) for a in scanned]
+
+        since = now() - datetime.timedelta(days=30)
+        horses = [f"h{rng.randrange(args.horses)}" for _ in range(QUERIES)]
+        for horse in horses:
+            for own in history.stays_of(horse):
+                history.occupants(own.barn)
+        start = time.perf_counter()
+        for horse in horses:
+            history.barn_mates(horse, since)
+        mates = (time.perf_counter() - start) / QUERIES
+
+    print(f"{len(stays)} stays over {args.years} years, {size / 2 ** 20:.1f} MiB of history")
+    print(f"load        {load:10.3f} s")
+    print(f"stall       {indexed * 1000:10.3f} ms per query")
+    print(f"barn mates  {mates * 1000:10.3f} ms per query")
+    print(f"scan        {full_scan * 1000:10.3f} ms per query")
+
+
+if __name__ == "__main__":
+    main()
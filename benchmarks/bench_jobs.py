@@ -0,0 +1,79 @@
+"""How long an export holds up the menu, inline against as a background job.
+
+Usage: python -m benchmarks.bench_jobs [--horses 20000 100000] [--format docx] [--workers 2]
+
+One generated owner is saved with the sharded backend. "inline" is the
+old export: the menu waits for export_horses() to write the whole file.
+"submit" is how long JobQueue.submit() keeps it waiting instead, and
+"job" how long the job takes to finish. While it runs, name searches are
+made in this thread, as a user would go on using the menus, and their
+median and slowest times are shown next to the same searches with no job
+running. The job and the searches share one interpreter lock, so the
+searches slow down by about the job's share of it.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from benchmarks.generator import dataset_paths, generate_owner, write_ranch
+from ranch.export import export_horses
+from ranch.jobs import FINISHED, JobQueue
+from ranch.repository import RanchRepository
+from ranch.search import SearchIndex
+
+
+def searches(index, names, until):
+    """Times in ms of searches for names, one after another, until until() is true."""
+    times = []
+    for name in names:
+        if until():
+            break
+        start = time.perf_counter()
+        index.query(name=name, per_page=20)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--horses", type=int, nargs="+", default=[20000, 100000])
+    parser.add_argument("--format", default="docx", choices=("docx", "xlsx", "csv"))
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    print(f"{'horses':>8}{'inline s':>10}{'submit ms':>11}{'job s':>8}"
+          f"{'search ms idle':>16}{'with job':>10}{'max':>8}")
+    for count in args.horses:
+        rng = random.Random(1)
+        horses, barns = generate_owner("owner0", count, rng)
+        with tempfile.TemporaryDirectory() as directory:
+            write_ranch(directory, {"owner0": (horses, barns)}, "sharded", users=False)
+            index = SearchIndex(RanchRepository(horses, barns))
+            names = [rng.choice(horses).name[:3] for _ in range(100000)]
+
+            start = time.perf_counter()
+            export_horses(iter(horses), os.path.join(directory, f"inline.{args.format}"))
+            inline = time.perf_counter() - start
+            idle = searches(index, names[:2000], lambda: False)
+
+            queue = JobQueue(os.path.join(directory, "jobs.log"), ("sharded",) + dataset_paths(directory),
+                             os.path.join(directory, "exports"), args.workers)
+            try:
+                start = time.perf_counter()
+                job = queue.submit("owner0", "export", format=args.format)
+                submitted = time.perf_counter() - start
+                busy = searches(index, names, lambda: queue.get(job.id).state in FINISHED)
+                job = queue.wait(job.id)
+                took = time.perf_counter() - start
+            finally:
+                queue.close()
+            assert job.state == "done", job.describe()
+        print(f"{count:>8}{inline:>10.2f}{submitted * 1000:>11.1f}{took:>8.2f}"
+              f"{statistics.median(idle):>16.2f}{statistics.median(busy):>10.2f}{max(busy):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
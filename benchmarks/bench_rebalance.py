@@ -0,0 +1,115 @@
+"""Plan and apply barn rebalances on generated herds, and check every rule holds after.
+
+Usage: python -m benchmarks.bench_rebalance [--horses 1000 5000 20000] [--close 2] [--groups 0.03]
+                                            [--apart 20] [--allergies] [--seed 1]
+
+Each herd is one generated owner, its horses renamed to be unique as
+rules name them. The first --close barns are closed and one new barn with
+as many stalls as they had is added. A --groups share of the horses is put
+in keep-together groups of two to four, and --apart groups of three horses
+are kept apart. The plan is timed, applied, and the result checked: closed
+barns empty, no barn over capacity, groups together and apart, no allergy
+conflicts and (ranch.consistency) no two horses in one stall. With
+--allergies, horses are first taken off hay they are allergic to, which
+the generator does not avoid. The moves are
+shown next to the lower bound no plan can beat.
+"""
+import argparse
+import random
+import time
+
+from benchmarks.generator import generate_owner
+from ranch.consistency import check
+from ranch.rebalance import Rules, _allergies, _hays, _words, apply_plan, plan_rebalance
+from ranch.repository import RanchRepository, make_barn
+
+
+def safe_diets(horses):
+    """Feed Timothy instead of any hay a horse is allergic to, as a ranch would."""
+    for horse in horses:
+        allergies = _allergies(horse)
+        for meal in ("breakfast_hay", "lunch_hay", "dinner_hay"):
+            if allergies & _words(getattr(horse, meal)):
+                setattr(horse, meal, "Timothy")
+
+
+def make_rules(repo, rng, close, groups, apart, allergies):
+    closing = repo.barns[:close]
+    repo.add_barn(make_barn("owner0", "New Barn", sum(b.stalls for b in closing)))
+    horses = repo.horses
+    rng.shuffle(horses)
+    together, position = [], 0
+    while position < len(horses) * groups:
+        group = horses[position:position + rng.randint(2, 4)]
+        position += len(group)
+        if allergies:  # a group whose horses may not share a barn could never be placed
+            group = [h for h in group if not any(_allergies(h) & _hays(o) or _allergies(o) & _hays(h)
+                                                 for o in group if o is not h)]
+        if len(group) > 1:
+            together.append([h.name for h in group])
+    kept_apart = [[h.name for h in horses[position + 3 * i:position + 3 * i + 3]] for i in range(apart)]
+    return Rules([b.barn_name for b in closing], together, kept_apart, allergies)
+
+
+def broken_rules(repo, rules):
+    """Descriptions of every rule the repository breaks."""
+    broken = [p.message for p in check(repo.horses, repo.barns)[0]]
+    for name in rules.close:
+        if repo.barn_named(name).horse_ids:
+            broken.append(f"closed barn {name} is not empty")
+    for group in rules.together:
+        if len({repo.horse_named(n).barn for n in group}) > 1:
+            broken.append(f"group {group} is split")
+    for group in rules.apart:
+        barns = [repo.horse_named(n).barn for n in group if repo.horse_named(n).barn]
+        if len(barns) != len(set(barns)):
+            broken.append(f"group {group} shares a barn")
+    if rules.allergies:
+        for barn in repo.barns:
+            horses = repo.horses_of(barn)
+            hays = {}
+            for horse in horses:
+                for word in _hays(horse):
+                    hays.setdefault(word, set()).add(horse.id)
+            for horse in horses:
+                if any(hays.get(word, set()) - {horse.id} for word in _allergies(horse)):
+                    broken.append(f"{horse.name} is allergic to hay fed in {barn.barn_name}")
+    return broken
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--horses", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--close", type=int, default=2)
+    parser.add_argument("--groups", type=float, default=0.03, help="share of the horses in groups, from 0 up to 1")
+    parser.add_argument("--apart", type=int, default=20)
+    parser.add_argument("--allergies", action="store_true", help="also keep horses from hay they are allergic to")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    if not 0 <= args.groups < 1:
+        parser.error("--groups is a share of the horses: at least 0 and below 1")
+
+    print(f"{'horses':>8}{'barns':>7}{'plan s':>9}{'apply s':>9}{'moves':>8}{'bound':>8}  result")
+    for count in args.horses:
+        rng = random.Random(args.seed)
+        horses, barns = generate_owner("owner0", count, rng, occupancy=0.8)
+        for number, horse in enumerate(horses):
+            horse.name = f"{horse.name} {number}"
+        if args.allergies:
+            safe_diets(horses)
+        repo = RanchRepository(horses, barns)
+        rules = make_rules(repo, rng, args.close, args.groups, args.apart, args.allergies)
+        start = time.perf_counter()
+        plan = plan_rebalance(repo, rules)
+        planned = time.perf_counter() - start
+        start = time.perf_counter()
+        apply_plan(repo, plan)
+        applied = time.perf_counter() - start
+        broken = broken_rules(repo, rules)
+        result = "ok" if not broken else f"{len(broken)} broken, e.g. {broken[0]}"
+        print(f"{count:>8}{len(repo.barns):>7}{planned:>9.3f}{applied:>9.3f}{len(plan.moves):>8}"
+              f"{plan.lower_bound:>8}  {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Compare dict horses with embedded barn copies against slotted records.
+
+Usage: python -m benchmarks.bench_records [--horses 100000] [--per-barn 200]
+
+Memory is the tracemalloc peak of building the in-memory horses and barns.
+File size is the horses.json plus barns.json each layout writes.
+"""
+import argparse
+import datetime
+import json
+import random
+import tracemalloc
+
+from benchmarks.generator import BREEDS, HAY
+from ranch.records import Barn, Horse
+
+
+def _fields(count, per_barn, seed):
+    rng = random.Random(seed)
+    for i in range(count):
+        yield {
+            "id": f"{i:032x}",
+            "name": f"Horse {i}",
+            "birth_date": datetime.date(2000, 1, 1) + datetime.timedelta(days=rng.randrange(9000)),
+            "breed": rng.choice(BREEDS),
+            "breakfast_hay": rng.choice(HAY),
+            "lunch_hay": rng.choice(HAY),
+            "dinner_hay": rng.choice(HAY),
+            "allergies": [rng.choice(HAY).lower()] if rng.random() < 0.1 else [],
+            "barn": f"Barn {i // per_barn}",
+            "stall": i % per_barn + 1,
+            "owner": "bench",
+        }
+
+
+def build_dicts(count, per_barn, seed=1):
+    """The old layout: horse dicts, and barns holding a copy of each horse."""
+    horses = list(_fields(count, per_barn, seed))
+    barns = []
+    for start in range(0, count, per_barn):
+        barns.append({"id": f"b{start // per_barn}", "barn_name": f"Barn {start // per_barn}",
+                      "stalls": per_barn, "horses": [dict(h) for h in horses[start:start + per_barn]],
+                      "owner": "bench"})
+    return horses, barns
+
+
+def build_records(count, per_barn, seed=1):
+    """Horse records, and barns holding only horse ids."""
+    horses = [Horse(**f) for f in _fields(count, per_barn, seed)]
+    barns = []
+    for start in range(0, count, per_barn):
+        barns.append(Barn(f"b{start // per_barn}", f"Barn {start // per_barn}", per_barn,
+                          [h.id for h in horses[start:start + per_barn]], owner="bench"))
+    return horses, barns
+
+
+def peak_memory(build, count, per_barn):
+    tracemalloc.start()
+    data = build(count, per_barn)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return data, peak
+
+
+def file_size(horses, barns):
+    return (len(json.dumps(horses, default=str, indent=4)) +
+            len(json.dumps(barns, default=str, indent=4)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--horses", type=int, default=100000)
+    parser.add_argument("--per-barn", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    (horses, barns), dict_peak = peak_memory(build_dicts, args.horses, args.per_barn)
+    dict_size = file_size(horses, barns)
+    del horses, barns
+    (horses, barns), record_peak = peak_memory(build_records, args.horses, args.per_barn)
+    record_size = file_size([h.to_dict() for h in horses], [b.to_dict() for b in barns])
+
+    print(f"{args.horses} horses, {args.per_barn} per barn")
+    print(f"{'layout':<22}{'memory MiB':>12}{'files MiB':>12}")
+    for label, peak, size in (("dicts + barn copies", dict_peak, dict_size),
+                              ("slotted + horse ids", record_peak, record_size)):
+        print(f"{label:<22}{peak / 2 ** 20:>12.1f}{size / 2 ** 20:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Listing a herd with a print per line against cached, buffered pages.
+
+Usage: python -m benchmarks.bench_render [--horses 1000 10000 50000] [--repeat 3]
+
+Output goes to a line-buffered stream over a raw writer that counts and
+discards its writes, the way a terminal receives it: every line printed is
+a write() system call. "print" is the old listing, nine prints per horse.
+"pages" writes every page of RenderCache.details with show_pages, cold
+(an empty cache) and warm (after a first listing); "menu" is the numbered
+one-line list the edit and assign menus show, warm.
+"""
+import argparse
+import io
+import random
+import time
+
+from benchmarks.generator import generate_owner
+from ranch.render import DETAILS_PER_PAGE, LINES_PER_PAGE, RenderCache, show_pages
+from ranch.repository import RanchRepository
+
+
+class CountingSink(io.RawIOBase):
+    """A raw stream that throws its bytes away and counts the writes."""
+
+    def __init__(self):
+        self.writes = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.writes += 1
+        return len(data)
+
+
+def terminal():
+    sink = CountingSink()
+    return sink, io.TextIOWrapper(io.BufferedWriter(sink), line_buffering=True)
+
+
+def print_listing(horses, out):
+    for horse in horses:
+        print(f"\nName: {horse.name}", file=out)
+        print(f"Breed: {horse.breed}", file=out)
+        print(f"Barn: {horse.barn}, Stall: {horse.stall}", file=out)
+        print(f"Birthdate: {horse.birth_date}", file=out)
+        print(f"Breakfast hay: {horse.breakfast_hay}", file=out)
+        print(f"Lunch hay: {horse.lunch_hay}", file=out)
+        print(f"Dinner hay: {horse.dinner_hay}", file=out)
+        print(f"Allergies: {', '.join(horse.allergies) if horse.allergies else 'None'}", file=out)
+        print("-" * 40, file=out)
+
+
+def yes(prompt):
+    """Answer every "Show next page?" so the whole herd is listed."""
+    return "y"
+
+
+def measure(repeat, run):
+    """(best seconds, writes of the last run) of run(out)."""
+    best = float("inf")
+    for _ in range(repeat):
+        sink, out = terminal()
+        start = time.perf_counter()
+        run(out)
+        out.flush()
+        best = min(best, time.perf_counter() - start)
+    return best, sink.writes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--horses", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'horses':>8}{'listing':>14}{'ms':>10}{'writes':>10}")
+    for count in args.horses:
+        repo = RanchRepository(*generate_owner("owner0", count, random.Random(1)))
+        horses = repo.horses
+        rows = [("print", lambda out: print_listing(horses, out))]
+        rows.append(("pages cold", lambda out: show_pages(horses, RenderCache(repo).details, DETAILS_PER_PAGE,
+                                                          out, yes)))
+        cache = RenderCache(repo)
+        show_pages(horses, cache.details, DETAILS_PER_PAGE, terminal()[1], yes)
+        show_pages(horses, cache.menu, LINES_PER_PAGE, terminal()[1], yes)
+        rows.append(("pages warm", lambda out: show_pages(horses, cache.details, DETAILS_PER_PAGE, out, yes)))
+        rows.append(("menu warm", lambda out: show_pages(horses, cache.menu, LINES_PER_PAGE, out, yes)))
+        for name, run in rows:
+            seconds, writes = measure(args.repeat, run)
+            print(f"{count:>8}{name:>14}{seconds * 1000:>10.1f}{writes:>10}")
+
+
+if __name__ == "__main__":
+    main()
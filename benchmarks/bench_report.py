@@ -0,0 +1,56 @@
+"""How the ranch-wide report scales with worker processes.
+
+Usage: python -m benchmarks.bench_report [--horses 200000] [--owners 40] [--workers 1 2 4 8] [--repeat 3]
+
+A generated network is saved with the sharded backend, then
+ranch.report.collect() is timed with each number of workers. The speedup
+is against one worker, which runs everything in this process. Every run
+must give the same totals.
+
+The speedup cannot go past the number of CPUs, nor past total work over
+the largest owner's share of it, as one owner is never split between
+workers.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.generator import dataset_paths, generate_ranch, write_ranch
+from ranch.report import collect
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--horses", type=int, default=200000)
+    parser.add_argument("--owners", type=int, default=40)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    ranch = generate_ranch(args.horses, args.owners, args.seed)
+    largest = max(len(horses) for horses, _ in ranch.values())
+    with tempfile.TemporaryDirectory() as directory:
+        write_ranch(directory, ranch, "sharded", users=False)
+        del ranch
+        storage_args = ("sharded",) + dataset_paths(directory)
+        print(f"{args.horses} horses across {args.owners} owners (largest {largest}); {os.cpu_count()} CPU(s)")
+        print(f"{'workers':>8}{'best s':>10}{'speedup':>10}{'efficiency':>12}")
+        expected = base = None
+        for workers in args.workers:
+            runs = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                totals = collect(storage_args, workers)
+                runs.append(time.perf_counter() - start)
+            totals.barns.sort()
+            assert expected is None or totals == expected, f"{workers} workers gave different totals"
+            expected = totals
+            best = min(runs)
+            base = base or best
+            print(f"{workers:>8}{best:>10.3f}{base / best:>10.2f}{base / best / workers:>12.0%}")
+
+
+if __name__ == "__main__":
+    main()
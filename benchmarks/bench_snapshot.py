@@ -0,0 +1,104 @@
+"""Login time of one owner's shard: replaying the full log against a snapshot.
+
+Usage: python -m benchmarks.bench_snapshot [--horses 500000] [--owners 20] [--tail 1000] [--repeat 3]
+
+A generated network is saved with the sharded backend, then timed for the
+largest owner:
+
+    log         ShardedStorage.load() replaying a shard of one line per record
+    compact     writing that shard's snapshot and emptying its log
+    snapshot    ShardedStorage.load() mapping the snapshot
+    + tail      the same with --tail edited horses appended to the log since
+    login       the snapshot load plus building the repository
+
+Each snapshot load is checked against the log load.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.generator import generate_ranch, write_ranch
+from ranch.repository import RanchRepository
+from ranch.storage import RecordLog, ShardedStorage
+
+OWNER = "owner0"
+
+
+def best_of(repeat, fn):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        runs.append(time.perf_counter() - start)
+    return min(runs), result
+
+
+def unsnapshot(storage, owner):
+    """Turn owner's shard back into a log of one line per record, as shards were before snapshots."""
+    storage.load(owner)
+    log = RecordLog(storage.log.path)
+    log.live = {(e["kind"], e["id"]): e for e in storage.log.entries()}
+    with log.lock():
+        log.compact()
+    os.remove(storage.log.snapshot_path)
+
+
+def fingerprint(records):
+    # Strings, so keeping them does not slow the garbage collector in later timings.
+    return sorted(map(repr, records))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--horses", type=int, default=500000)
+    parser.add_argument("--owners", type=int, default=20)
+    parser.add_argument("--tail", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        write_ranch(directory, generate_ranch(args.horses, args.owners, args.seed), "sharded", users=False)
+        root = os.path.join(directory, "ranch_data")
+        unsnapshot(ShardedStorage(root), OWNER)
+        storage = ShardedStorage(root)
+        log, (horses, barns) = best_of(args.repeat, lambda: storage.load(OWNER))
+        size = os.path.getsize(storage.log.path)
+        counts = len(horses), len(barns)
+        expected = fingerprint(horses + barns)
+        del horses, barns
+
+        with storage.log.lock():
+            compact, _ = best_of(1, storage.log.compact)
+        del storage
+        snapshot, loaded = best_of(args.repeat, lambda: ShardedStorage(root).load(OWNER))
+        assert fingerprint(loaded[0] + loaded[1]) == expected
+
+        storage = ShardedStorage(root, compact_min=args.tail + 1)
+        repo = RanchRepository(*storage.load(OWNER))
+        for horse in rng.sample(repo.horses, args.tail):
+            repo.update_horse(horse, breed=horse.breed + "!")
+        storage.save(OWNER, repo.horses, repo.barns, changed=repo.take_dirty())
+        expected = fingerprint(repo.horses)
+        del repo, loaded
+        tail, loaded = best_of(args.repeat, lambda: ShardedStorage(root).load(OWNER))
+        assert fingerprint(loaded[0]) == expected
+        del loaded
+
+        login, _ = best_of(args.repeat, lambda: RanchRepository(*ShardedStorage(root).load(OWNER)))
+        snap_size = os.path.getsize(storage.log.snapshot_path)
+
+    print(f"{OWNER} has {counts[0]} horses and {counts[1]} barns; "
+          f"shard {size / 2 ** 20:.1f} MiB, snapshot {snap_size / 2 ** 20:.1f} MiB")
+    print(f"log         {log:10.3f} s")
+    print(f"compact     {compact:10.3f} s")
+    print(f"snapshot    {snapshot:10.3f} s")
+    print(f"+ tail      {tail:10.3f} s  ({args.tail} lines)")
+    print(f"login       {login:10.3f} s")
+
+
+if __name__ == "__main__":
+    main()
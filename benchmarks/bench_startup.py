@@ -0,0 +1,117 @@
+"""Time from starting horseranch.py to its login prompt, and what it imports on the way.
+
+Usage: python -m benchmarks.bench_startup [--repeat 20] [--target-ms 40] [--top 12]
+
+horseranch.py is started in an empty directory and timed until it prints
+"Enter choice:", then told to exit. The time over a bare interpreter
+(python -c pass) is compared against --target-ms. The slowest imports
+below ranch.cli are listed from python -X importtime, and the run fails if
+any module in DEFERRED (the storage backend, exporters, batch parser and
+the packages behind them) was imported before the prompt.
+
+Bytecode is cached under a temporary PYTHONPYCACHEPREFIX and warmed up
+first, so the numbers are for an installed program rather than the first
+run after an edit.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROMPT = b"Enter choice:"
+DEFERRED = ("ranch.storage", "ranch.repository", "ranch.export", "ranch.batch", "ranch.auth", "ranch.jobs",
+            "ranch.tasks", "argparse", "csv", "zipfile", "docx", "openpyxl", "msgpack")
+
+
+def _environment(cache):
+    env = dict(os.environ, PYTHONPYCACHEPREFIX=cache)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    return env
+
+
+def time_to_prompt(env, cwd):
+    """Seconds from starting horseranch.py until it asks for a choice."""
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(ROOT, "horseranch.py")], cwd=cwd, env=env,
+                               stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+    seen = b""
+    while PROMPT not in seen:
+        chunk = os.read(process.stdout.fileno(), 4096)
+        if not chunk:
+            raise SystemExit(f"horseranch.py exited before the login prompt: {seen.decode()!r}")
+        seen += chunk
+    seconds = time.perf_counter() - start
+    process.communicate(b"3\n")
+    return seconds
+
+
+def time_bare(env, cwd):
+    """Seconds to start and stop an interpreter that does nothing."""
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], cwd=cwd, env=env, check=True)
+    return time.perf_counter() - start
+
+
+def import_times(env, cwd):
+    """[(module, self µs, cumulative µs, depth)] from -X importtime, for what import ranch.cli loads."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import ranch.cli"],
+                            cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        own, total, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), int(own), int(total), depth))
+    end = next(i for i, row in enumerate(rows) if row[0] == "ranch.cli" and row[3] == 0)
+    start = end
+    while start and rows[start - 1][3] > 0:
+        start -= 1
+    return rows[start:end + 1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--target-ms", type=float, default=40.0,
+                        help="most the login prompt may take over a bare interpreter (median)")
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as cache, tempfile.TemporaryDirectory() as cwd:
+        env = _environment(cache)
+        time_to_prompt(env, cwd)  # writes the bytecode cache
+        rows = import_times(env, cwd)
+        bare = [time_bare(env, cwd) for _ in range(args.repeat)]
+        prompt = [time_to_prompt(env, cwd) for _ in range(args.repeat)]
+
+    print(f"import ranch.cli: {rows[-1][2] / 1000:.1f} ms, {len(rows)} modules")
+    print(f"{'slowest imports':<32}{'self ms':>10}{'total ms':>10}")
+    for name, own, total, depth in sorted(rows, key=lambda row: -row[1])[:args.top]:
+        print(f"{'  ' * (depth - 1) + name:<32}{own / 1000:>10.2f}{total / 1000:>10.2f}")
+
+    overhead = statistics.median(prompt) - statistics.median(bare)
+    print()
+    print(f"{'':<24}{'median ms':>10}{'best ms':>10}")
+    print(f"{'python -c pass':<24}{statistics.median(bare) * 1000:>10.1f}{min(bare) * 1000:>10.1f}")
+    print(f"{'login prompt':<24}{statistics.median(prompt) * 1000:>10.1f}{min(prompt) * 1000:>10.1f}")
+    print(f"Over a bare interpreter: {overhead * 1000:.1f} ms (target {args.target_ms:.0f} ms)")
+
+    failed = False
+    early = [name for name, _, _, _ in rows if name.split(".")[0] in DEFERRED or name in DEFERRED]
+    if early:
+        print(f"FAIL: imported before the login prompt: {', '.join(early)}")
+        failed = True
+    if overhead * 1000 > args.target_ms:
+        print("FAIL: over target")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
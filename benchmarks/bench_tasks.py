@@ -0,0 +1,115 @@
+"""What is due, from the per-barn task queues against a scan of every rule.
+
+Usage: python -m benchmarks.bench_tasks [--horses 10000 100000] [--repeat 5]
+
+One generated owner gets, for every horse, a farrier visit every 6 weeks
+and a vet check every 6 months (each from a random start day) and, for one
+horse in five, medicine twice a day; every barn is mucked out daily.
+Feeding rounds come from the feed ledger. "load" reads the rules back
+from their log and "build" indexes them.
+"next hour" asks what is due in one barn in the next hour, for one barn
+after another through a day; "day" lists every task of the day. Both
+against "scan", which asks every rule, as the list would be made without
+the queues. The two must give the same tasks.
+"""
+import argparse
+import datetime
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.generator import generate_owner
+from ranch.feed import FeedLedger
+from ranch.repository import RanchRepository
+from ranch.tasks import Schedule, make_rule
+
+
+def add_rules(schedule, repo, rng, today):
+    for horse in repo.iter_horses():
+        schedule.add_rule(make_rule("owner0", "farrier", "08:30", 42, today - datetime.timedelta(rng.randrange(42)),
+                                    horse_id=horse.id))
+        schedule.add_rule(make_rule("owner0", "vet", "14:00", 182, today - datetime.timedelta(rng.randrange(182)),
+                                    horse_id=horse.id))
+        if rng.random() < 0.2:
+            schedule.add_rule(make_rule("owner0", "medicine", "09:00, 21:00", 1, today, 1, horse_id=horse.id))
+    for barn in repo.barns:
+        schedule.add_rule(make_rule("owner0", "muck out", "10:00", 1, today, 3, barn=barn.barn_name))
+
+
+def scan(schedule, repo, start, end, barn=None):
+    """(due, rule id) of every care task in [start, end), asking each rule."""
+    found = []
+    for rule in schedule.rules():
+        where = repo.horse_by_id(rule.horse_id).barn if rule.horse_id else rule.barn
+        if barn is None or (where or "").lower() == barn.lower():
+            found += [(due, rule.id) for due in rule.due_between(start, end)]
+    return sorted(found)
+
+
+def best(repeat, run):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = run()
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--horses", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{'horses':>8}{'rules':>8}{'load ms':>9}{'build ms':>10}{'next hour ms':>14}{'scan ms':>9}"
+          f"{'day ms':>8}{'tasks':>7}{'scan ms':>9}")
+    for count in args.horses:
+        rng = random.Random(1)
+        repo = RanchRepository(*generate_owner("owner0", count, rng))
+        ledger = FeedLedger(repo)
+        today = datetime.date.today()
+        midnight = datetime.datetime.combine(today, datetime.time())
+        with tempfile.TemporaryDirectory() as directory:
+            schedule = Schedule(os.path.join(directory, "rules.log"), "owner0")
+            schedule.follow(repo, ledger)
+            add_rules(schedule, repo, rng, today)
+            schedule.save()
+            start = time.perf_counter()
+            schedule = Schedule(schedule.log.path, "owner0")
+            load = time.perf_counter() - start
+            start = time.perf_counter()
+            schedule.follow(repo, ledger)
+            build = time.perf_counter() - start
+
+            # A horse removed while no schedule follows the ranch (the tasks
+            # menu not opened yet) has its rules dropped by the next load.
+            gone = next(repo.iter_horses())
+            stale = Schedule(schedule.log.path, "owner0")
+            repo.remove_horse(gone)
+            stale.follow(repo, ledger)
+            repo.unsubscribe(stale)
+            assert not stale.rules(horse_id=gone.id) and len(stale.rules()) == len(schedule.rules())
+        barns = [b.barn_name for b in repo.barns]
+
+        # One barn after another, an hour later each time, as a day's questions would come in.
+        hours = [(barns[i % len(barns)], midnight + datetime.timedelta(minutes=10 * i)) for i in range(144)]
+        start = time.perf_counter()
+        answers = [schedule.due(at, at + datetime.timedelta(hours=1), barn) for barn, at in hours]
+        hour = (time.perf_counter() - start) / len(hours)
+        start = time.perf_counter()
+        scans = [scan(schedule, repo, at, at + datetime.timedelta(hours=1), barn) for barn, at in hours[:10]]
+        hour_scan = (time.perf_counter() - start) / 10
+        for tasks, scanned in zip(answers, scans):
+            assert sorted((t.due, t.rule_id) for t in tasks if t.rule_id) == scanned
+
+        tomorrow = midnight + datetime.timedelta(days=1)
+        day, tasks = best(args.repeat, lambda: schedule.day(tomorrow.date()))
+        day_scan, scanned = best(1, lambda: scan(schedule, repo, tomorrow, tomorrow + datetime.timedelta(days=1)))
+        assert sorted((t.due, t.rule_id) for t in tasks if t.rule_id) == scanned
+        print(f"{count:>8}{len(schedule.rules()):>8}{load * 1000:>9.0f}{build * 1000:>10.1f}{hour * 1000:>14.3f}"
+              f"{hour_scan * 1000:>9.1f}{day * 1000:>8.1f}{len(tasks):>7}{day_scan * 1000:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
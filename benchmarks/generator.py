@@ -0,0 +1,103 @@
+"""Seeded synthetic ranches for benchmarks: owners, barns, stalls, horses and allergies.
+
+The same seed always gives the same ranch, so results can be compared
+between runs. Ranch sizes are skewed like real networks: a few owners hold
+most of the horses.
+"""
+import datetime
+import os
+import random
+
+from ranch.auth import UserStore
+from ranch.records import Barn, Horse
+from ranch.storage import open_storage
+
+BREEDS = ["Quarter Horse", "Thoroughbred", "Arabian", "Appaloosa", "Paint", "Morgan", "Tennessee Walker",
+          "Mustang", "Friesian", "Clydesdale", "Welsh Pony", "Haflinger"]
+BREED_WEIGHTS = [30, 18, 12, 8, 8, 6, 5, 4, 3, 2, 2, 2]
+HAY = ["Timothy", "Alfalfa", "Orchard", "Bermuda", "Oat", "Timothy alfalfa mix", "Brome", "Clover mix"]
+ALLERGIES = ["alfalfa", "clover", "dust", "oat", "mold", "brome"]
+SYLLABLES = ["sta", "ma", "bel", "thun", "der", "dus", "ty", "ro", "sie", "cas", "per", "mid", "night",
+             "gol", "den", "ash", "win", "ter", "blaze", "co", "met", "lu", "na", "ra", "ven"]
+PASSWORD = "benchmark"
+
+
+def horse_name(rng):
+    name = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3)))
+    return name.capitalize()
+
+
+def owner_sizes(horses, owners, rng):
+    """Split horses between owners with a Zipf-like skew; every owner gets at least one."""
+    weights = [1 / (rank + 1) for rank in range(owners)]
+    total = sum(weights)
+    sizes = [max(1, int(horses * w / total)) for w in weights]
+    sizes[0] += horses - sum(sizes)
+    rng.shuffle(sizes[1:])
+    return sizes
+
+
+def generate_owner(owner, count, rng, occupancy=0.85, stalls=(12, 60)):
+    """(horses, barns) for one owner with about occupancy of the horses stabled."""
+    horses = []
+    for i in range(count):
+        allergies = rng.sample(ALLERGIES, rng.choice((1, 1, 2))) if rng.random() < 0.12 else []
+        horses.append(Horse(
+            id=f"{rng.getrandbits(128):032x}",
+            name=horse_name(rng),
+            birth_date=datetime.date(1998, 1, 1) + datetime.timedelta(days=rng.randrange(26 * 365)),
+            breed=rng.choices(BREEDS, BREED_WEIGHTS)[0],
+            breakfast_hay=rng.choice(HAY),
+            lunch_hay=rng.choice(HAY) if rng.random() < 0.7 else "",
+            dinner_hay=rng.choice(HAY),
+            allergies=allergies,
+            owner=owner,
+        ))
+    barns = []
+    stabled = horses[:int(count * occupancy)]
+    position = 0
+    while position < len(stabled) or not barns:
+        barn = Barn(id=f"{rng.getrandbits(128):032x}", barn_name=f"Barn {len(barns) + 1}",
+                    stalls=rng.randint(*stalls), owner=owner)
+        for stall in range(1, barn.stalls + 1):
+            # Leave some stalls empty in every barn.
+            if position >= len(stabled) or rng.random() < 0.1:
+                continue
+            horse = stabled[position]
+            horse.barn, horse.stall = barn.barn_name, stall
+            barn.horse_ids.append(horse.id)
+            position += 1
+        barns.append(barn)
+    return horses, barns
+
+
+def generate_ranch(horses, owners=20, seed=1):
+    """{owner: (horses, barns)} holding about horses horses in total.
+
+    Owners are named owner0, owner1, ...; owner0 is always the largest.
+    """
+    rng = random.Random(seed)
+    sizes = owner_sizes(horses, owners, rng)
+    return {f"owner{i}": generate_owner(f"owner{i}", size, rng) for i, size in enumerate(sizes)}
+
+
+def dataset_paths(directory):
+    """The (horses_file, barns_file, log_file, data_dir) layout horseranch.py uses, under directory."""
+    return (os.path.join(directory, "horses.json"), os.path.join(directory, "barns.json"),
+            os.path.join(directory, "ranch.log"), os.path.join(directory, "ranch_data"))
+
+
+def write_ranch(directory, ranch, backend="sharded", users=True):
+    """Save a generated ranch under directory with the given storage backend.
+
+    With users=True every owner is registered with the password PASSWORD,
+    hashed cheaply so setting up large ranches stays fast.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for owner, (horses, barns) in ranch.items():
+        storage = open_storage(backend, *dataset_paths(directory))
+        storage.save(owner, horses, barns)
+    if users:
+        store = UserStore(os.path.join(directory, "users.log"), iterations=1000)
+        for owner in ranch:
+            store.register(owner, PASSWORD)
@@ -0,0 +1,204 @@
+"""Repeatable benchmarks for load, save, stall assignment, name search and export.
+
+Usage: python -m benchmarks.run [--sizes 1000 10000 100000] [--backend sharded] [--repeat 3]
+                                [--output results.json] [--compare baseline.json] [--only load save ...]
+
+For each size a ranch network of that many horses is generated from a
+fixed seed and saved with the chosen backend. The paths horseranch.py takes
+are then timed for the largest owner:
+
+    load     load_data(): storage load, repository, search index, feed ledger
+    save     save_data() after editing one horse
+    assign   unassign and reassign a horse to the first barn with room (per op)
+    search   name search through the index, as in view_horse() (per query)
+    export   streamed .docx export of the owner's horses
+    check    the barn consistency check load_data() runs
+
+Each benchmark runs --repeat times; the best run is the headline number.
+Results are written as JSON, and --compare prints the ratio to an earlier
+results file, marking anything slower than --threshold.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.generator import SYLLABLES, dataset_paths, generate_ranch, write_ranch
+from ranch.consistency import check
+from ranch.export import export_horses
+from ranch.feed import FeedLedger
+from ranch.repository import RanchRepository
+from ranch.search import SearchIndex
+from ranch.storage import open_storage
+
+OWNER = "owner0"
+ASSIGN_OPS = 1000
+SEARCH_OPS = 200
+
+
+def load_data(directory, backend):
+    storage = open_storage(backend, *dataset_paths(directory))
+    repo = RanchRepository(*storage.load(OWNER))
+    return storage, repo, SearchIndex(repo), FeedLedger(repo)
+
+
+# ===============================
+# BENCHMARKS
+# ===============================
+# Each takes (directory, backend, rng) and returns (setup, timed, ops):
+# setup() runs untimed before every run and its result is passed to timed().
+def bench_load(directory, backend, rng):
+    return (lambda: None), (lambda _: load_data(directory, backend)), 1
+
+
+def bench_save(directory, backend, rng):
+    def setup():
+        storage, repo, _, _ = load_data(directory, backend)
+        horse = rng.choice(repo.horses)
+        repo.update_horse(horse, breed=horse.breed + "!")
+        return storage, repo
+    return setup, (lambda s: s[0].save(OWNER, s[1].horses, s[1].barns)), 1
+
+
+def bench_assign(directory, backend, rng):
+    def setup():
+        repo = load_data(directory, backend)[1]
+        return repo, [rng.choice(repo.horses) for _ in range(ASSIGN_OPS)]
+
+    def timed(state):
+        repo, horses = state
+        for horse in horses:
+            repo.unassign(horse, clear=False)
+            barns = repo.available_barns()
+            if barns:
+                repo.assign(horse, barns[0])
+    return setup, timed, ASSIGN_OPS
+
+
+def bench_search(directory, backend, rng):
+    terms = [rng.choice(SYLLABLES) + rng.choice(SYLLABLES)[:rng.randint(0, 2)] for _ in range(SEARCH_OPS)]
+    index = load_data(directory, backend)[2]
+
+    def timed(_):
+        for term in terms:
+            index.query(name=term, page=1, per_page=20)
+    return (lambda: None), timed, SEARCH_OPS
+
+
+def bench_export(directory, backend, rng):
+    repo = load_data(directory, backend)[1]
+    path = os.path.join(directory, "horse_list.docx")
+    return (lambda: None), (lambda _: export_horses(repo.iter_horses(), path)), 1
+
+
+def bench_check(directory, backend, rng):
+    horses, barns = open_storage(backend, *dataset_paths(directory)).load(OWNER)
+    return (lambda: None), (lambda _: check(horses, barns)), 1
+
+
+BENCHMARKS = {
+    "load": bench_load,
+    "save": bench_save,
+    "assign": bench_assign,
+    "search": bench_search,
+    "export": bench_export,
+    "check": bench_check,
+}
+
+
+def run_one(name, directory, backend, repeat, seed):
+    setup, timed, ops = BENCHMARKS[name](directory, backend, random.Random(seed))
+    runs = []
+    for _ in range(repeat):
+        state = setup()
+        start = time.perf_counter()
+        timed(state)
+        runs.append(time.perf_counter() - start)
+    return {"ops": ops, "best": min(runs), "mean": sum(runs) / len(runs), "runs": runs}
+
+
+# ===============================
+# RESULTS
+# ===============================
+def environment():
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "argv": sys.argv[1:],
+    }
+
+
+def _key(result):
+    return result["name"], result["size"], result["backend"]
+
+
+def compare(results, baseline_path, threshold):
+    """Print each result next to the matching baseline one; returns the regressions."""
+    with open(baseline_path, "r") as f:
+        baseline = {_key(r): r for r in json.load(f)["results"]}
+    regressions = []
+    print(f"\nCompared with {baseline_path}:")
+    for result in results:
+        old = baseline.get(_key(result))
+        if old is None:
+            continue
+        ratio = result["best"] / old["best"] if old["best"] else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  SLOWER"
+            regressions.append(result)
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"  {result['name']:<8}{result['size']:>9}  {old['best']:>10.4f}s -> {result['best']:>10.4f}s"
+              f"  x{ratio:.2f}{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the ranch benchmark suite.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="horses in the whole generated network")
+    parser.add_argument("--owners", type=int, default=20)
+    parser.add_argument("--backend", choices=("sharded", "log", "json"), default="sharded")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="ratio change reported as a regression")
+    args = parser.parse_args(argv)
+
+    names = args.only or list(BENCHMARKS)
+    results = []
+    print(f"{'benchmark':<10}{'horses':>9}{'owner':>8}{'best s':>11}{'mean s':>11}{'per op ms':>11}")
+    for size in args.sizes:
+        ranch = generate_ranch(size, args.owners, args.seed)
+        owner_horses = len(ranch[OWNER][0])
+        with tempfile.TemporaryDirectory() as directory:
+            write_ranch(directory, ranch, args.backend, users=False)
+            for name in names:
+                result = run_one(name, directory, args.backend, args.repeat, args.seed)
+                result.update(name=name, size=size, owner_horses=owner_horses, backend=args.backend)
+                results.append(result)
+                print(f"{name:<10}{size:>9}{owner_horses:>8}{result['best']:>11.4f}{result['mean']:>11.4f}"
+                      f"{result['best'] / result['ops'] * 1000:>11.3f}")
+
+    with open(args.output, "w") as f:
+        json.dump({"environment": environment(), "seed": args.seed, "results": results}, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    if args.compare:
+        return 1 if compare(results, args.compare, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
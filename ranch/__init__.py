@@ -0,0 +1 @@
+"""Support modules for the Horse & Barn Management System."""
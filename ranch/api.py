@@ -0,0 +1,630 @@
+"""A local asynchronous HTTP/JSON service over the horse and barn operations.
+
+Usage: python -m ranch.api [--host 127.0.0.1] [--port 8080] [--data-dir DIR] [--storage sharded|log|json]
+
+POST /login with {"username", "password"} returns {"token"}; every other
+request needs "Authorization: Bearer <token>" and acts on that user's data.
+
+    GET    /horses                 search: name, fuzzy, breed, hay, allergy, barn,
+                                   born_before, born_after, page, per_page
+    POST   /horses                 add a horse (batch add_horse fields, optional barn/stall)
+    GET    /horses/{id}
+    PATCH  /horses/{id}            change any of the horse fields
+    DELETE /horses/{id}
+    PUT    /horses/{id}/stall      {"barn", "stall"?} assign to a stall
+    DELETE /horses/{id}/stall      unassign
+    GET    /barns
+    POST   /barns                  {"barn_name", "stalls"}
+    GET    /barns/{name}           the barn and its horses
+    PATCH  /barns/{name}           {"note"}
+    DELETE /barns/{name}
+    GET    /barns/{name}/history   who was in the barn: stall, from, to (YYYY-MM-DD, to inclusive)
+    GET    /horses/{id}/barn-mates horses that shared a barn with it: days (default 30)
+    POST   /jobs                   {"kind": "export", "format"} start an export in the background
+    GET    /jobs                   the caller's jobs, newest first
+    GET    /jobs/{id}              a job and its progress; with wait (seconds) and done, answers
+                                   when done has moved on, the job ended or wait ran out
+    DELETE /jobs/{id}              cancel a queued or running job
+    GET    /tasks                  feeding and care tasks due: date (YYYY-MM-DD, a whole day)
+                                   or hours (from now, default 1); barn
+    GET    /rules                  care rules: horse (id) or barn
+    POST   /rules                  {"kind", "times", "every"?, "start"?, "priority"?, "note"?,
+                                   and "horse_id" or "barn"} schedule a recurring care task
+    DELETE /rules/{id}
+
+Each owner's data is loaded once and then kept in memory. A write is
+applied and saved without yielding to the event loop, so other requests
+never see half of one and writes need no lock. Each save appends only the
+records the write changed, which takes a couple of milliseconds. Password
+hashing and loads run in a thread pool, and exports in a ranch.jobs queue
+that writes under --output-dir. Care rules are kept under --schedules-dir
+and indexed by the first task request, like the search index by the first
+search. If a write fails or loses a conflict with another session, that
+owner's data is reloaded from storage in the thread pool; the owner's next
+requests wait for it.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import re
+import traceback
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from ranch import batch, metrics
+from ranch.auth import UserStore
+from ranch.consistency import check
+from ranch.history import StallHistory, history_path
+from ranch.jobs import FINISHED, JobQueue
+from ranch.repository import RanchRepository
+from ranch.search import SearchIndex
+from ranch.storage import ConflictError, open_storage
+from ranch.tasks import Schedule, make_rule, schedule_path
+
+MAX_BODY = 1 << 20
+MAX_HEADERS = 100
+MAX_PER_PAGE = 500
+MAX_WAIT = 60.0  # longest a GET /jobs/{id} waits for progress
+JOB_POLL = 0.2   # seconds between looks at a job being waited for
+
+
+class HttpError(Exception):
+    """An error answered with its status code and {"error": message}."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class OwnerData:
+    """One owner's repository, search index and storage, kept between requests.
+
+    A save only compares the records the repository marked dirty. With a
+    history_dir, stall moves are recorded in the owner's StallHistory; with
+    a schedule_dir, care rules are kept in a ranch.tasks.Schedule.
+    Barn problems found on load are repaired in memory (see
+    ranch.consistency), printed, and saved with the next change.
+    """
+
+    def __init__(self, owner, storage, history_dir=None, schedule_dir=None):
+        self.owner = owner
+        self.storage = storage
+        self.history_dir = history_dir
+        self.schedule_dir = schedule_dir
+        self.repo = None
+        self._search = None
+        self._schedule = None
+        self.history = None
+
+    @metrics.timed("load_data")
+    def load(self):
+        horses, barns = self.storage.load(self.owner)
+        problems, repaired = check(horses, barns, repair=True)
+        for problem in problems:
+            print(f"{self.owner}: repaired: {problem.message}", flush=True)
+        repo = RanchRepository(horses, barns)
+        repo.dirty |= repaired
+        self.repo, self._search, self._schedule = repo, None, None
+        if self.history_dir:
+            self.history = StallHistory(history_path(self.history_dir, self.owner))
+            self.history.follow(repo)
+
+    @property
+    def search(self):
+        """The search index, built by the first search rather than at login."""
+        if self._search is None:
+            self._search = SearchIndex(self.repo)
+        return self._search
+
+    @property
+    def schedule(self):
+        """The care rules and feeding rounds, loaded by the first task request; None without a schedule_dir."""
+        if self._schedule is None and self.schedule_dir:
+            from ranch.feed import FeedLedger
+            self._schedule = Schedule(schedule_path(self.schedule_dir, self.owner), self.owner)
+            self._schedule.follow(self.repo, FeedLedger(self.repo))
+        return self._schedule
+
+    def barn_removed(self, name):
+        if self._schedule:
+            self._schedule.barn_removed(name)
+
+    @metrics.timed("save_data")
+    def save(self):
+        self.storage.save(self.owner, self.repo.horses, self.repo.barns, partial=False,
+                          changed=self.repo.dirty)
+        self.repo.take_dirty()
+        if self.history:
+            self.history.save()
+        if self._schedule:
+            self._schedule.save()
+
+
+# ===============================
+# HTTP
+# ===============================
+async def _readline(reader, status, what):
+    # StreamReader.readline() raises ValueError for a line over its limit.
+    try:
+        return await reader.readline()
+    except ValueError:
+        raise HttpError(status, f"{what} too long")
+
+
+async def read_request(reader):
+    """(method, target, headers, body, keep_alive) for the next request, or None at EOF."""
+    line = await _readline(reader, 414, "request line")
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "malformed request line")
+    headers = {}
+    while True:
+        line = await _readline(reader, 431, "header line")
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+        if len(headers) > MAX_HEADERS:
+            raise HttpError(431, "too many headers")
+    if "transfer-encoding" in headers:
+        raise HttpError(501, "chunked request bodies are not supported")
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HttpError(400, "bad Content-Length")
+    if length > MAX_BODY:
+        raise HttpError(413, "request body too large")
+    body = await reader.readexactly(length) if length else b""
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+    return method, target, headers, body, keep_alive
+
+
+def encode_response(status, payload, keep_alive):
+    body = json.dumps(payload).encode()
+    head = (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode() + body
+
+
+# ===============================
+# SERVICE
+# ===============================
+def _midnight(text, days_after=0):
+    """Start of the day a YYYY-MM-DD date names, or of days_after days later."""
+    return datetime.datetime.combine(batch.parse_date(text) + datetime.timedelta(days=days_after), datetime.time())
+
+
+def _whole_number(query, name, default, minimum=1):
+    """query[name] as an int of at least minimum, or default when it is not given."""
+    text = query.get(name)
+    if not text:
+        return default
+    try:
+        value = int(text)
+    except ValueError:
+        raise HttpError(400, f"{name} must be a whole number, not '{text}'")
+    if value < minimum:
+        raise HttpError(400, f"{name} must be at least {minimum}")
+    return value
+
+
+def _barn_dict(repo, barn):
+    data = barn.to_dict()
+    data["free_stalls"] = repo.free_stalls(barn)
+    return data
+
+
+def _task_dict(task):
+    data = task._asdict()
+    data["due"] = task.due.isoformat(timespec="minutes")
+    return data
+
+
+class RanchService:
+    """Routes requests to per-owner data loaded on first use.
+
+    open_store is called once per owner and returns a new storage backend
+    for that owner's data. Stall history is kept under history_dir, care
+    rules under schedule_dir, and exports run on jobs (a JobQueue), if given.
+    """
+
+    def __init__(self, users, open_store, history_dir=None, jobs=None, schedule_dir=None):
+        self.users = users
+        self.open_store = open_store
+        self.history_dir = history_dir
+        self.jobs = jobs
+        self.schedule_dir = schedule_dir
+        self.owners = {}
+        # (method, path pattern, handler, writes)
+        self.routes = [
+            ("GET", r"/horses", self.list_horses, False),
+            ("POST", r"/horses", self.add_horse, True),
+            ("GET", r"/horses/([^/]+)", self.get_horse, False),
+            ("PATCH", r"/horses/([^/]+)", self.edit_horse, True),
+            ("DELETE", r"/horses/([^/]+)", self.remove_horse, True),
+            ("PUT", r"/horses/([^/]+)/stall", self.assign, True),
+            ("DELETE", r"/horses/([^/]+)/stall", self.unassign, True),
+            ("GET", r"/horses/([^/]+)/barn-mates", self.barn_mates, False),
+            ("GET", r"/barns", self.list_barns, False),
+            ("POST", r"/barns", self.add_barn, True),
+            ("GET", r"/barns/([^/]+)", self.get_barn, False),
+            ("PATCH", r"/barns/([^/]+)", self.edit_barn, True),
+            ("DELETE", r"/barns/([^/]+)", self.remove_barn, True),
+            ("GET", r"/barns/([^/]+)/history", self.barn_history, False),
+            # Jobs read what is saved and change nothing here, so they are not writes.
+            ("GET", r"/jobs", self.list_jobs, False),
+            ("POST", r"/jobs", self.submit_job, False),
+            ("GET", r"/jobs/([^/]+)", self.get_job, False),
+            ("DELETE", r"/jobs/([^/]+)", self.cancel_job, False),
+            ("GET", r"/tasks", self.list_tasks, False),
+            ("GET", r"/rules", self.list_rules, False),
+            ("POST", r"/rules", self.add_rule, True),
+            ("DELETE", r"/rules/([^/]+)", self.remove_rule, True),
+        ]
+        self.routes = [(m, re.compile(p), h, w) for m, p, h, w in self.routes]
+
+    async def handle(self, reader, writer):
+        """Serve one connection, request after request while it is kept alive."""
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HttpError as e:
+                    writer.write(encode_response(e.status, {"error": str(e)}, False))
+                    break
+                if request is None:
+                    break
+                method, target, headers, body, keep_alive = request
+                try:
+                    status, payload = await self.dispatch(method, target, headers, body)
+                except HttpError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception:
+                    traceback.print_exc()
+                    status, payload = 500, {"error": "internal server error"}
+                writer.write(encode_response(status, payload, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def dispatch(self, method, target, headers, body):
+        url = urlsplit(target)
+        if method == "POST" and url.path == "/login":
+            return await self.login(self._json(body))
+        allowed = False
+        for route_method, pattern, handler, writes in self.routes:
+            match = pattern.fullmatch(url.path)
+            if match:
+                allowed = True
+                if route_method == method:
+                    break
+        else:
+            raise HttpError(405 if allowed else 404, f"{method} {url.path} is not supported")
+        owner = self._owner(headers)
+        ranch = await self._owner_data(owner)
+        args = [unquote(g) for g in match.groups()]
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        data = self._json(body)
+        if not writes:
+            result = self._call(handler, ranch, data, query, args)
+            return await result if asyncio.iscoroutine(result) else result
+        try:
+            result = self._call(handler, ranch, data, query, args)
+            ranch.save()
+        except Exception as e:
+            if ranch.repo.dirty:
+                await self._owner_data(owner, reload=ranch)  # drop the half-applied or unsaved change
+            if isinstance(e, ConflictError):
+                raise HttpError(409, f"{e} Reloaded the latest data; retry the request.")
+            raise
+        return result
+
+    @staticmethod
+    def _call(handler, ranch, data, query, args):
+        try:
+            with metrics.timer(f"api_{handler.__name__}"):
+                return handler(ranch, data, query, *args)
+        # AttributeError comes from a field of the wrong type, as in ranch.batch.
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            raise HttpError(400, f"missing field {e}" if isinstance(e, KeyError) else str(e))
+
+    @staticmethod
+    def _json(body):
+        if not body:
+            return {}
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise HttpError(400, "request body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HttpError(400, "request body must be a JSON object")
+        return data
+
+    def _owner(self, headers):
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        owner = self.users.check_token(token.strip()) if scheme.lower() == "bearer" else None
+        if owner is None:
+            raise HttpError(401, "missing, invalid or expired session token")
+        return owner
+
+    async def _owner_data(self, owner, reload=None):
+        # The first request for an owner starts the load; concurrent ones
+        # wait for the same task. reload, the owner's OwnerData after a
+        # failed write, is loaded again the same way, off the event loop.
+        task = self.owners.get(owner)
+        if task is None or reload is not None:
+            ranch = reload or OwnerData(owner, self.open_store(), self.history_dir, self.schedule_dir)
+            loop = asyncio.get_running_loop()
+            task = self.owners[owner] = loop.create_task(self._load(loop, ranch))
+        try:
+            return await task
+        except Exception:
+            if self.owners.get(owner) is task:
+                del self.owners[owner]  # let the next request try again
+            raise
+
+    @staticmethod
+    async def _load(loop, ranch):
+        await loop.run_in_executor(None, ranch.load)
+        return ranch
+
+    async def login(self, data):
+        username, password = str(data.get("username", "")), str(data.get("password", ""))
+        loop = asyncio.get_running_loop()
+        if not await loop.run_in_executor(None, self.users.authenticate, username, password):
+            raise HttpError(401, "invalid username or password")
+        token = await loop.run_in_executor(None, self.users.issue_token, username)
+        return 200, {"token": token}
+
+    # ===============================
+    # HORSES
+    # ===============================
+    @staticmethod
+    def _horse(ranch, horse_id):
+        horse = ranch.repo.horse_by_id(horse_id)
+        if horse is None:
+            raise HttpError(404, f"horse '{horse_id}' not found")
+        return horse
+
+    def list_horses(self, ranch, data, query):
+        filters = {field: query[field] for field in ("name", "breed", "hay", "allergy", "barn") if query.get(field)}
+        for field in ("born_before", "born_after"):
+            if query.get(field):
+                filters[field] = batch.parse_date(query[field])
+        per_page = min(_whole_number(query, "per_page", 20), MAX_PER_PAGE)
+        page = ranch.search.query(fuzzy=query.get("fuzzy", "").lower() in ("1", "true", "yes"),
+                                  page=_whole_number(query, "page", 1), per_page=per_page, **filters)
+        return 200, {"horses": [h.to_dict() for h in page.horses], "total": page.total,
+                     "page": page.page, "pages": page.pages}
+
+    def get_horse(self, ranch, data, query, horse_id):
+        return 200, self._horse(ranch, horse_id).to_dict()
+
+    def add_horse(self, ranch, data, query):
+        op = dict(data, op="add_horse")
+        return 201, batch.HANDLERS["add_horse"](ranch.repo, ranch.owner, op, {}).to_dict()
+
+    def edit_horse(self, ranch, data, query, horse_id):
+        self._horse(ranch, horse_id)
+        op = {"op": "edit_horse", "id": horse_id, "set": data}
+        return 200, batch.HANDLERS["edit_horse"](ranch.repo, ranch.owner, op, {}).to_dict()
+
+    def remove_horse(self, ranch, data, query, horse_id):
+        ranch.repo.remove_horse(self._horse(ranch, horse_id))
+        return 200, {"removed": horse_id}
+
+    def assign(self, ranch, data, query, horse_id):
+        self._horse(ranch, horse_id)
+        op = {"op": "assign", "id": horse_id, "barn": data["barn"], "stall": data.get("stall")}
+        return 200, batch.HANDLERS["assign"](ranch.repo, ranch.owner, op, {}).to_dict()
+
+    def unassign(self, ranch, data, query, horse_id):
+        horse = self._horse(ranch, horse_id)
+        ranch.repo.unassign(horse)
+        return 200, horse.to_dict()
+
+    def barn_mates(self, ranch, data, query, horse_id):
+        horse = self._horse(ranch, horse_id)
+        since = datetime.datetime.now() - datetime.timedelta(days=_whole_number(query, "days", 30, minimum=0))
+        return 200, {"horse": horse_id, "since": since.isoformat(timespec="seconds"),
+                     "barn_mates": [dict(stay.to_dict(), shared_from=start.isoformat(),
+                                         shared_until=until.isoformat() if until else None)
+                                    for stay, start, until in self._history(ranch).barn_mates(horse_id, since)]}
+
+    # ===============================
+    # BARNS
+    # ===============================
+    @staticmethod
+    def _barn(ranch, name):
+        barn = ranch.repo.barn_named(name)
+        if barn is None:
+            raise HttpError(404, f"barn '{name}' not found")
+        return barn
+
+    def list_barns(self, ranch, data, query):
+        return 200, {"barns": [_barn_dict(ranch.repo, b) for b in ranch.repo.barns]}
+
+    def get_barn(self, ranch, data, query, name):
+        barn = self._barn(ranch, name)
+        result = _barn_dict(ranch.repo, barn)
+        result["horses"] = [h.to_dict() for h in ranch.repo.horses_of(barn)]
+        return 200, result
+
+    def add_barn(self, ranch, data, query):
+        barn = batch.HANDLERS["add_barn"](ranch.repo, ranch.owner, dict(data, op="add_barn"), {})
+        return 201, _barn_dict(ranch.repo, barn)
+
+    def edit_barn(self, ranch, data, query, name):
+        barn = self._barn(ranch, name)
+        ranch.repo.update_barn(barn, note=data["note"])
+        return 200, _barn_dict(ranch.repo, barn)
+
+    def remove_barn(self, ranch, data, query, name):
+        barn = self._barn(ranch, name)
+        ranch.repo.remove_barn(barn)
+        ranch.barn_removed(barn.barn_name)
+        return 200, {"removed": name}
+
+    @staticmethod
+    def _history(ranch):
+        if ranch.history is None:
+            raise HttpError(404, "stall history is not kept by this server")
+        return ranch.history
+
+    def barn_history(self, ranch, data, query, name):
+        # The barn may have been removed since, so its name is not checked.
+        start = _midnight(query["from"]) if query.get("from") else None
+        end = _midnight(query["to"], days_after=1) if query.get("to") else None
+        stall = _whole_number(query, "stall", None)
+        stays = self._history(ranch).occupants(name, stall, start, end)
+        return 200, {"barn": name, "stays": [s.to_dict() for s in stays]}
+
+
+    # ===============================
+    # JOBS
+    # ===============================
+    def _queue(self):
+        if self.jobs is None:
+            raise HttpError(404, "background jobs are not run by this server")
+        return self.jobs
+
+    def _job(self, ranch, job_id):
+        job = self._queue().get(job_id)
+        if job is None or job.owner != ranch.owner:
+            raise HttpError(404, f"job '{job_id}' not found")
+        return job
+
+    def list_jobs(self, ranch, data, query):
+        return 200, {"jobs": [j.to_dict() for j in self._queue().jobs(ranch.owner)]}
+
+    def submit_job(self, ranch, data, query):
+        if data.get("kind") != "export":
+            raise HttpError(400, "only export jobs can be started here")
+        job = self._queue().submit(ranch.owner, "export", format=str(data.get("format", "docx")).lower())
+        return 202, job.to_dict()
+
+    def get_job(self, ranch, data, query, job_id):
+        job = self._job(ranch, job_id)
+        wait = min(float(query.get("wait", 0)), MAX_WAIT)
+        if wait <= 0 or job.state in FINISHED:
+            return 200, job.to_dict()
+        return self._wait_for(job, int(query.get("done", job.done)), wait)
+
+    async def _wait_for(self, job, done, wait):
+        # Polled rather than waited for on a thread, so waiting clients
+        # do not use up the thread pool logins and loads run in.
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + wait
+        while job.state not in FINISHED and job.done == done and loop.time() < deadline:
+            await asyncio.sleep(JOB_POLL)
+            job = self.jobs.get(job.id)
+        return 200, job.to_dict()
+
+    def cancel_job(self, ranch, data, query, job_id):
+        job = self._job(ranch, job_id)
+        if not self._queue().cancel(job.id):
+            raise HttpError(409, f"job '{job_id}' has ended or is run by another session")
+        return 200, {"cancelled": job_id}
+
+    # ===============================
+    # TASKS
+    # ===============================
+    @staticmethod
+    def _schedule(ranch):
+        if ranch.schedule is None:
+            raise HttpError(404, "tasks are not kept by this server")
+        return ranch.schedule
+
+    def list_tasks(self, ranch, data, query):
+        barn = query.get("barn") or None
+        if barn is not None:
+            barn = self._barn(ranch, barn).barn_name
+        if query.get("date"):
+            start = _midnight(query["date"])
+            end = _midnight(query["date"], days_after=1)
+        else:
+            start = datetime.datetime.now().replace(second=0, microsecond=0)
+            end = start + datetime.timedelta(hours=float(query.get("hours", 1)))
+        tasks = self._schedule(ranch).due(start, end, barn)
+        return 200, {"from": start.isoformat(timespec="minutes"), "to": end.isoformat(timespec="minutes"),
+                     "tasks": [_task_dict(t) for t in tasks]}
+
+    def list_rules(self, ranch, data, query):
+        horse_id = query.get("horse") or None
+        if horse_id is not None:
+            self._horse(ranch, horse_id)
+        barn = self._barn(ranch, query["barn"]).barn_name if query.get("barn") else None
+        rules = self._schedule(ranch).rules(horse_id, barn)
+        return 200, {"rules": [r.to_dict() for r in rules]}
+
+    def add_rule(self, ranch, data, query):
+        schedule = self._schedule(ranch)
+        rule = make_rule(ranch.owner, data["kind"], data["times"], data.get("every", 1), data.get("start"),
+                         data.get("priority", 2), data.get("horse_id"), data.get("barn"), data.get("note", ""))
+        return 201, schedule.add_rule(rule).to_dict()
+
+    def remove_rule(self, ranch, data, query, rule_id):
+        schedule = self._schedule(ranch)
+        rule = schedule.rule(rule_id)
+        if rule is None:
+            raise HttpError(404, f"rule '{rule_id}' not found")
+        schedule.remove_rule(rule)
+        return 200, {"removed": rule_id}
+
+
+# ===============================
+# COMMAND LINE
+# ===============================
+async def serve(service, host, port, ready=None):
+    """Run the service until cancelled. ready, if given, is called with the bound (host, port)."""
+    server = await asyncio.start_server(service.handle, host, port)
+    address = server.sockets[0].getsockname()[:2]
+    if ready:
+        ready(address)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the ranch data as a local JSON API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--storage", default="sharded", choices=("sharded", "log", "json"))
+    parser.add_argument("--data-dir", default="ranch_data")
+    parser.add_argument("--horses", default="horses.json")
+    parser.add_argument("--barns", default="barns.json")
+    parser.add_argument("--log", default="ranch.log")
+    parser.add_argument("--users", default="users.log", help="user store (users.json is imported on first run)")
+    parser.add_argument("--history-dir", default="stall_history", help="stall history files, one per owner")
+    parser.add_argument("--jobs", default="jobs.log", help="the background job table")
+    parser.add_argument("--output-dir", default="exports", help="where exports are written")
+    parser.add_argument("--schedules-dir", default="schedules", help="care rules, one file per owner")
+    args = parser.parse_args(argv)
+
+    users = UserStore(args.users, "users.json")
+    storage_args = (args.storage, args.horses, args.barns, args.log, args.data_dir)
+    jobs = JobQueue(args.jobs, storage_args, args.output_dir)
+    service = RanchService(users, lambda: open_storage(*storage_args), args.history_dir, jobs,
+                           args.schedules_dir)
+    try:
+        asyncio.run(serve(service, args.host, args.port,
+                          lambda address: print(f"Serving on http://{address[0]}:{address[1]}", flush=True)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        jobs.close()
+
+
+if __name__ == "__main__":
+    main()
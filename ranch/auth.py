@@ -0,0 +1,159 @@
+"""Registered users: salted password hashes, an indexed user store and session tokens."""
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+import time
+
+from ranch.storage import RecordLog, read_records
+
+USER = "user"
+SESSION = "session"
+ALGORITHM = "pbkdf2_sha256"
+ITERATIONS = int(os.environ.get("HORSERANCH_HASH_ITERATIONS", 600_000))
+SESSION_TTL = 12 * 60 * 60
+
+
+# ===============================
+# PASSWORD HASHES
+# ===============================
+def hash_password(password, iterations=ITERATIONS, salt=None):
+    """A salted PBKDF2-SHA256 hash stored as 'pbkdf2_sha256$iterations$salt$hash'."""
+    salt = salt or secrets.token_bytes(16)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, iterations)
+    return f"{ALGORITHM}${iterations}${salt.hex()}${digest.hex()}"
+
+
+def verify_password(password, stored):
+    """Check a password against a stored hash.
+
+    Hashes without a '$' are the unsalted SHA-256 digests written by older
+    versions; they still verify so those users can log in and be upgraded.
+    """
+    if "$" not in stored:
+        return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+    algorithm, iterations, salt, digest = stored.split("$")
+    if algorithm != ALGORITHM:
+        return False
+    check = hashlib.pbkdf2_hmac("sha256", password.encode(), bytes.fromhex(salt), int(iterations))
+    return hmac.compare_digest(check.hex(), digest)
+
+
+def needs_rehash(stored, iterations=ITERATIONS):
+    """True for legacy hashes and hashes made with fewer iterations than wanted."""
+    parts = stored.split("$")
+    return len(parts) != 4 or parts[0] != ALGORITHM or int(parts[1]) < iterations
+
+
+def token_key(token):
+    # Only a digest of each token is stored, so the sessions file cannot be
+    # used to log in. Tokens are random enough that one SHA-256 is plenty.
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _user_entry(username, password_hash):
+    return {"op": "put", "kind": USER, "id": username, "owner": username,
+            "data": {"username": username, "password": password_hash}}
+
+
+# ===============================
+# USER STORE
+# ===============================
+class UserStore:
+    """Users and sessions kept in an append-only log, indexed by username.
+
+    The log is replayed once and then only caught up on lines other
+    sessions appended, so a lookup never rereads the whole file.
+    Registering appends a single line. On first use the users of an
+    existing users.json are imported with their hashes unchanged; each is
+    upgraded to a salted hash the next time that user logs in.
+
+    A store may be shared between threads; password hashing runs outside
+    its internal lock.
+    """
+
+    def __init__(self, path, legacy_file=None, iterations=ITERATIONS, compact_min=1000):
+        self.log = RecordLog(path)
+        self.iterations = iterations
+        self.compact_min = compact_min
+        self._dummy = None
+        self._mutex = threading.RLock()
+        if legacy_file and not os.path.exists(path) and os.path.exists(legacy_file):
+            with self.log.lock():
+                if not os.path.exists(path):
+                    self.log.append([_user_entry(u["username"], u["password"])
+                                     for u in read_records(legacy_file)])
+        self.log.replay()
+
+    def _write(self, entries, versions, partial=False):
+        """Commit entries under the lock; returns the conflicting entries."""
+        with self._mutex, self.log.lock():
+            conflicts = self.log.commit(entries, versions, partial)
+            if self.log.garbage() > max(self.compact_min, len(self.log.live)):
+                self.log.compact()
+        return conflicts
+
+    def _entry(self, kind, key):
+        with self._mutex:
+            self.log.catch_up()
+            return self.log.live.get((kind, key))
+
+    def exists(self, username):
+        return self._entry(USER, username) is not None
+
+    def register(self, username, password):
+        """Add a user. Returns False if the username is already taken."""
+        entry = _user_entry(username, hash_password(password, self.iterations))
+        return not self._write([entry], {})
+
+    def authenticate(self, username, password):
+        """Return True if the password is right, upgrading an old hash on success."""
+        entry = self._entry(USER, username)
+        if entry is None:
+            # Hash anyway, so an unknown username takes as long as a wrong password.
+            self._dummy = self._dummy or hash_password("", self.iterations)
+            verify_password(password, self._dummy)
+            return False
+        stored = entry["data"]["password"]
+        if not verify_password(password, stored):
+            return False
+        if needs_rehash(stored, self.iterations):
+            upgraded = _user_entry(username, hash_password(password, self.iterations))
+            self._write([upgraded], {(USER, username): entry.get("version", 0)})
+        return True
+
+    # ===============================
+    # SESSIONS
+    # ===============================
+    def issue_token(self, username, ttl=SESSION_TTL):
+        """A new session token for username, valid for ttl seconds.
+
+        Expired sessions are dropped from the log at the same time.
+        """
+        token = secrets.token_urlsafe(32)
+        now = time.time()
+        versions = {}
+        entries = [{"op": "put", "kind": SESSION, "id": token_key(token), "owner": username,
+                    "data": {"username": username, "expires": now + ttl}}]
+        with self._mutex:
+            self.log.catch_up()
+            for (kind, key), entry in self.log.live.items():
+                if kind == SESSION and entry["data"]["expires"] <= now:
+                    versions[(kind, key)] = entry.get("version", 0)
+                    entries.append({"op": "del", "kind": SESSION, "id": key, "owner": entry["owner"]})
+            self._write(entries, versions, partial=True)
+        return token
+
+    def check_token(self, token):
+        """The username a live session token belongs to, or None."""
+        entry = self._entry(SESSION, token_key(token))
+        if entry is None or entry["data"]["expires"] <= time.time():
+            return None
+        return entry["data"]["username"]
+
+    def revoke_token(self, token):
+        entry = self._entry(SESSION, token_key(token))
+        if entry is not None:
+            self._write([{"op": "del", "kind": SESSION, "id": entry["id"], "owner": entry["owner"]}],
+                        {(SESSION, entry["id"]): entry.get("version", 0)})
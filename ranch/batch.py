@@ -0,0 +1,287 @@
+"""Non-interactive ranch operations for scripts and bulk intake.
+
+An operation is a dict with an "op" key, for example
+{"op": "add_horse", "name": "Star", "birth_date": "2015-04-01", ...}.
+A batch is applied to the repository in order and saved once at the end
+by the caller; if any operation fails the caller drops the whole batch.
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+
+from ranch.repository import make_barn, make_horse
+from ranch.stalls import FIRST_FIT, POLICIES
+
+HORSE_FIELDS = ("name", "birth_date", "breed", "breakfast_hay", "lunch_hay", "dinner_hay", "allergies")
+
+
+class BatchError(ValueError):
+    """Raised when an operation cannot be applied; the batch must not be saved."""
+
+
+def parse_date(text):
+    return datetime.datetime.strptime(text.strip(), "%Y-%m-%d").date()
+
+
+def parse_allergies(value):
+    """Allergies as a lowercase list, from a list or a comma-separated string."""
+    if isinstance(value, str):
+        value = value.split(",")
+    return [a.strip().lower() for a in value or [] if a.strip()]
+
+
+def _text(op, field):
+    return (op.get(field) or "").strip()
+
+
+def _stall(value):
+    return int(value) if value not in (None, "") else None
+
+
+# ===============================
+# READING OPERATIONS
+# ===============================
+def read_operations(path):
+    """Load operations from a .json file or horse intake rows from a .csv file.
+
+    A JSON file holds a list of operations. Each CSV row becomes an
+    add_horse operation; its columns are the horse fields plus optional
+    barn and stall.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".json":
+        with open(path, "r") as f:
+            operations = json.load(f)
+        if not isinstance(operations, list):
+            raise BatchError(f"'{path}' must contain a list of operations.")
+        return operations
+    if ext == ".csv":
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            return [dict(row, op="add_horse") for row in csv.DictReader(f)]
+    raise BatchError(f"Unsupported import file '{path}'. Use .json or .csv.")
+
+
+# ===============================
+# APPLYING OPERATIONS
+# ===============================
+def _find_horse(repo, op):
+    horse = None
+    if op.get("id"):
+        horse = repo.horse_by_id(op["id"])
+    elif op.get("name"):
+        horse = repo.horse_named(op["name"])
+    if horse is None:
+        raise BatchError(f"horse '{op.get('id') or op.get('name')}' not found")
+    return horse
+
+
+def _find_barn(repo, name):
+    barn = repo.barn_named(name)
+    if barn is None:
+        raise BatchError(f"barn '{name}' not found")
+    return barn
+
+
+def _assign(repo, horse, barn_name, stall):
+    barn = _find_barn(repo, barn_name)
+    if stall is not None and not 1 <= stall <= barn.stalls:
+        raise BatchError(f"barn '{barn.barn_name}' has no stall {stall}")
+    if stall is not None and repo.horses_in_stall(barn.barn_name, stall):
+        raise BatchError(f"stall {stall} in barn '{barn.barn_name}' is taken")
+    if repo.assign(horse, barn, stall) is None:
+        raise BatchError(f"barn '{barn.barn_name}' is full")
+
+
+def _add_horse(repo, owner, op, unplaced):
+    horse = make_horse(owner, _text(op, "name"), parse_date(op["birth_date"]), _text(op, "breed"),
+                       _text(op, "breakfast_hay"), _text(op, "lunch_hay"), _text(op, "dinner_hay"),
+                       parse_allergies(op.get("allergies")))
+    if not horse.name:
+        raise BatchError("horse name is required")
+    repo.add_horse(horse)
+    if op.get("barn"):
+        _assign(repo, horse, op["barn"], _stall(op.get("stall")))
+    else:
+        unplaced[horse.id] = horse
+    return horse
+
+
+def _edit_horse(repo, owner, op, unplaced):
+    horse = _find_horse(repo, op)
+    changes = {}
+    for field, value in op.get("set", {}).items():
+        if field not in HORSE_FIELDS:
+            raise BatchError(f"cannot edit field '{field}'")
+        if field == "birth_date":
+            value = parse_date(value)
+        elif field == "allergies":
+            value = parse_allergies(value)
+        changes[field] = value
+    repo.update_horse(horse, **changes)
+    return horse
+
+
+def _remove_horse(repo, owner, op, unplaced):
+    horse = _find_horse(repo, op)
+    unplaced.pop(horse.id, None)
+    repo.remove_horse(horse)
+    return horse
+
+
+def _assign_horse(repo, owner, op, unplaced):
+    horse = _find_horse(repo, op)
+    unplaced.pop(horse.id, None)
+    _assign(repo, horse, op["barn"], _stall(op.get("stall")))
+    return horse
+
+
+def _add_barn(repo, owner, op, unplaced):
+    name = op["barn_name"].strip()
+    if repo.barn_named(name):
+        raise BatchError(f"a barn named '{name}' already exists")
+    stalls = int(op["stalls"])
+    if stalls <= 0:
+        raise BatchError("number of stalls must be greater than zero")
+    barn = make_barn(owner, name, stalls)
+    repo.add_barn(barn)
+    return barn
+
+
+def _edit_barn(repo, owner, op, unplaced):
+    barn = _find_barn(repo, op["barn_name"])
+    repo.update_barn(barn, note=op["note"])
+    return barn
+
+
+def _remove_barn(repo, owner, op, unplaced):
+    barn = _find_barn(repo, op["barn_name"])
+    repo.remove_barn(barn)
+    return barn
+
+
+# Each handler returns the horse or barn it changed.
+HANDLERS = {
+    "add_horse": _add_horse,
+    "edit_horse": _edit_horse,
+    "remove_horse": _remove_horse,
+    "assign": _assign_horse,
+    "add_barn": _add_barn,
+    "edit_barn": _edit_barn,
+    "remove_barn": _remove_barn,
+}
+
+
+def apply_operations(repo, owner, operations, policy=FIRST_FIT):
+    """Apply operations to repo in order and return how many were applied.
+
+    New horses added without a barn are placed together at the end using
+    the placement policy. On the first failure BatchError is raised and
+    repo is left partly changed, so the caller must discard it instead of
+    saving. operations that is not a list, or holds anything but dicts,
+    raises BatchError before anything changes.
+    """
+    if not isinstance(operations, list):
+        raise BatchError(f"Operations must be a list, not {type(operations).__name__}.")
+    for number, op in enumerate(operations, start=1):
+        if not isinstance(op, dict):
+            raise BatchError(f"Operation {number}: must be an object with an \"op\" key, not {type(op).__name__}.")
+    unplaced = {}
+    for number, op in enumerate(operations, start=1):
+        handler = HANDLERS.get(op.get("op"))
+        if handler is None:
+            raise BatchError(f"Operation {number}: unknown op '{op.get('op')}'.")
+        try:
+            handler(repo, owner, op, unplaced)
+        # AttributeError comes from a field of the wrong type, such as a number for a name.
+        except (AttributeError, KeyError, TypeError, ValueError) as e:
+            message = f"missing field {e}" if isinstance(e, KeyError) else e
+            raise BatchError(f"Operation {number} ({op['op']}): {message}.") from e
+    if unplaced:
+        repo.place(unplaced.values(), policy)
+    return len(operations)
+
+
+# ===============================
+# COMMAND LINE
+# ===============================
+def build_parser():
+    parser = argparse.ArgumentParser(prog="horseranch.py", description="Run ranch operations without the menus.")
+    parser.add_argument("--user", required=True, help="username to act as")
+    parser.add_argument("--password", help="password (default: $HORSERANCH_PASSWORD or a prompt)")
+    parser.add_argument("--token", help="session token from 'login' (default: $HORSERANCH_TOKEN)")
+    parser.add_argument("--dry-run", action="store_true", help="check the operations without saving")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("login", help="print a session token to pass as --token instead of a password")
+
+    p = commands.add_parser("import", help="apply a .json list of operations or a .csv horse intake")
+    p.add_argument("file")
+    p.add_argument("--policy", choices=POLICIES, default=FIRST_FIT,
+                   help="how to place new horses that have no barn")
+
+    p = commands.add_parser("add-horse")
+    p.add_argument("name")
+    p.add_argument("--birth-date", required=True, help="YYYY-MM-DD")
+    p.add_argument("--breed", default="")
+    p.add_argument("--breakfast-hay", default="")
+    p.add_argument("--lunch-hay", default="")
+    p.add_argument("--dinner-hay", default="")
+    p.add_argument("--allergies", default="", help="comma separated")
+    p.add_argument("--barn")
+    p.add_argument("--stall", type=int)
+
+    p = commands.add_parser("edit-horse")
+    p.add_argument("name")
+    p.add_argument("--new-name")
+    p.add_argument("--birth-date")
+    p.add_argument("--breed")
+    p.add_argument("--breakfast-hay")
+    p.add_argument("--lunch-hay")
+    p.add_argument("--dinner-hay")
+    p.add_argument("--allergies")
+
+    p = commands.add_parser("remove-horse")
+    p.add_argument("name")
+
+    p = commands.add_parser("assign")
+    p.add_argument("name")
+    p.add_argument("barn")
+    p.add_argument("--stall", type=int)
+
+    p = commands.add_parser("add-barn")
+    p.add_argument("barn_name")
+    p.add_argument("stalls", type=int)
+
+    p = commands.add_parser("edit-barn")
+    p.add_argument("barn_name")
+    p.add_argument("--note", required=True)
+
+    p = commands.add_parser("remove-barn")
+    p.add_argument("barn_name")
+    return parser
+
+
+def operations_from_args(args):
+    """Turn a parsed single-operation subcommand into an operation list."""
+    if args.command == "import":
+        return read_operations(args.file)
+    if args.command == "add-horse":
+        op = {field: getattr(args, field) for field in HORSE_FIELDS}
+        op.update(op="add_horse", barn=args.barn, stall=args.stall)
+        return [op]
+    if args.command == "edit-horse":
+        changes = {field: getattr(args, field) for field in HORSE_FIELDS[1:] if getattr(args, field) is not None}
+        if args.new_name:
+            changes["name"] = args.new_name
+        return [{"op": "edit_horse", "name": args.name, "set": changes}]
+    if args.command == "remove-horse":
+        return [{"op": "remove_horse", "name": args.name}]
+    if args.command == "assign":
+        return [{"op": "assign", "name": args.name, "barn": args.barn, "stall": args.stall}]
+    if args.command == "add-barn":
+        return [{"op": "add_barn", "barn_name": args.barn_name, "stalls": args.stalls}]
+    if args.command == "edit-barn":
+        return [{"op": "edit_barn", "barn_name": args.barn_name, "note": args.note}]
+    return [{"op": "remove_barn", "barn_name": args.barn_name}]
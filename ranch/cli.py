@@ -0,0 +1,840 @@
+"""The interactive menus and batch mode of horseranch.py.
+
+Only what the login prompt needs is imported up front; the storage
+backend, exporters and batch parser load when they are first used (see
+benchmarks/bench_startup.py). The logged-in user's data is in
+ranch.session.
+"""
+import datetime
+import os
+
+from ranch import metrics, session
+from ranch.render import DETAILS_PER_PAGE, LINES_PER_PAGE, show_pages, write_page
+
+# ===============================
+# USER
+# ===============================
+def register_user():
+    """Register a new user."""
+    username = input("Enter new username: ").strip()
+    if session.get_users().exists(username):
+        print("Username already exists.\n")
+        return False
+    password = input("Enter password: ").strip()
+    password_confirm = input("Confirm password: ").strip()
+    if password != password_confirm:
+        print("Passwords do not match.\n")
+        return False
+    if not session.get_users().register(username, password):
+        print("Username already exists.\n")
+        return False
+    print(f"User '{username}' registered successfully.\n")
+    return True
+
+def login_user():
+    username = input("Username: ").strip()
+    password = input("Password: ").strip()
+    if session.authenticate(username, password):
+        print(f"\nWelcome, {username}!\n")
+        session.current_user = username  # <-- track logged-in user
+        return True
+    print("Invalid username or password.\n")
+    return False
+
+# ===============================
+# UTILITIES
+# ===============================
+def clear_screen():
+    """Clear the terminal screen (works on Windows, Linux, Mac)."""
+    os.system('cls' if os.name == 'nt' else 'clear')
+
+def print_horse_pages(horses):
+    """Print the details of horses a page at a time, one write per page."""
+    show_pages(horses, session.get_render_cache().details, DETAILS_PER_PAGE)
+
+def print_horse_menu(horses):
+    """Print a numbered list of horses a page at a time, for picking one by number."""
+    show_pages(horses, session.get_render_cache().menu, LINES_PER_PAGE)
+
+def print_search_results(**filters):
+    """Print matching horses a page at a time, asking before each next page."""
+    page = 1
+    while True:
+        results = session.get_search_index().query(page=page, **filters)
+        if not results.total:
+            return False
+        write_page(session.get_render_cache().details(results.horses)
+                   + f"Page {results.page} of {results.pages} ({results.total} horses)\n")
+        if page >= results.pages or input("Show next page? (y/n): ").strip().lower() != "y":
+            return True
+        page += 1
+
+def ask_date(prompt):
+    """Ask for an optional YYYY-MM-DD date; blank or invalid input gives None."""
+    text = input(prompt).strip()
+    if not text:
+        return None
+    try:
+        return datetime.datetime.strptime(text, "%Y-%m-%d").date()
+    except ValueError:
+        print("Invalid date format. Ignoring it.")
+        return None
+
+
+# ===============================
+# HORSE MANAGEMENT
+# ===============================
+def new_horse():
+    print("\n=== Add a New Horse ===")
+    if not session.repo.barns:
+        print("No barns available. Please add a barn first.\n")
+        return
+
+    while True:
+        try:
+            horse_name = input("Enter horse name: ").strip()
+            date = input("Enter birth date (YYYY-MM-DD): ").strip()
+            date_horse = datetime.datetime.strptime(date, "%Y-%m-%d").date()
+            breed = input("Enter horse breed: ").strip()
+            breakfast = input("Enter breakfast hay type: ").strip()
+            lunch = input("Enter lunch hay type: ").strip()
+            dinner = input("Enter dinner hay type: ").strip()
+            allergies = [a.strip().lower() for a in input("Enter allergies (comma separated): ").split(",") if a.strip()]
+            break
+        except ValueError:
+            print("Invalid date format. Please try again.\n")
+
+    from ranch.repository import make_horse
+    horse = make_horse(session.current_user, horse_name, date_horse, breed, breakfast, lunch, dinner, allergies)
+
+    session.repo.add_horse(horse)
+    assign_horse_to_stall(horse)
+    session.save_data()
+    print(f"\nHorse '{horse_name}' added successfully.\n")
+
+def view_horse():
+    print("\n=== View Horses ===")
+    print("1. Print all horses")
+    print("2. View a specific horse")
+    print("3. Go back\n")
+    while True:
+        try:
+            choice = int(input("Enter your choice: "))
+            if choice == 1:
+                if not session.repo.horse_count():
+                    print("\nNo horses registered yet.\n")
+                else:
+                    print_horse_pages(session.repo.horses)
+
+                    export = input("\nWould you like to export all horses to a file? (y/n): ").strip().lower()
+                    if export == 'y':
+                        from ranch.export import FORMATS
+                        fmt = input("Export format (docx/xlsx/csv) [docx]: ").strip().lower() or "docx"
+                        if fmt not in FORMATS:
+                            print("\nUnknown format. Export skipped.\n")
+                            continue
+                        job = session.submit_job("export", format=fmt)
+                        print(f"\nExport started in the background as job {job.id}; "
+                              f"you will be told when the file is ready.\n")
+                    else:
+                        print("\nExport skipped.\n")
+
+            elif choice == 2:
+                print("\nSearch by:")
+                print("1. Name (partial matches allowed)")
+                print("2. Barn and Stall")
+                print("3. Filters (breed, hay, allergy, barn, birth date)")
+                search_choice = input("Enter your choice: ").strip()
+                if search_choice == "1":
+                    name_query = input("Enter horse name: ").strip().lower()
+                    if not print_search_results(name=name_query):
+                        print("\nNo horses found with that name.\n")
+                elif search_choice == "2":
+                    barn_name = input("Enter barn name: ").strip().lower()
+                    stall_number = input("Enter stall number: ").strip()
+                    try:
+                        stall_number = int(stall_number)
+                    except ValueError:
+                        print("Invalid stall number.\n")
+                        continue
+                    matches = session.repo.horses_in_stall(barn_name, stall_number)
+                    if matches:
+                        print_horse_pages(matches)
+                    else:
+                        print("No horse found in that barn/stall.\n")
+                elif search_choice == "3":
+                    print("Leave a filter blank to skip it.")
+                    filters = {
+                        "breed": input("Breed: ").strip(),
+                        "hay": input("Hay type (any meal): ").strip(),
+                        "allergy": input("Allergic to: ").strip(),
+                        "barn": input("Barn: ").strip(),
+                        "born_after": ask_date("Born after (YYYY-MM-DD): "),
+                        "born_before": ask_date("Born before (YYYY-MM-DD): "),
+                    }
+                    if not print_search_results(**filters):
+                        print("\nNo horses match those filters.\n")
+                else:
+                    print("\nInvalid choice. Please select 1, 2 or 3.\n")
+            elif choice == 3:
+                return
+            else:
+                print("\nInvalid choice. Please select 1–3.\n")
+        except ValueError:
+            print("\nInvalid input. Please enter a number.\n")
+
+def remove_horse():
+    if not session.repo.horse_count():
+        print("\nNo horses registered yet.\n")
+        return
+
+    name = input("\nEnter the name of the horse to remove: ").strip().lower()
+    horse = session.repo.horse_named(name)
+    if horse:
+        confirm = input(f"Are you sure you want to remove '{horse.name}'? (y/n): ").strip().lower()
+        if confirm == "y":
+            # Removes it from its barn too
+            session.repo.remove_horse(horse)
+            print(f"\nHorse '{horse.name}' has been removed successfully.\n")
+            session.save_data()
+        else:
+            print("\nRemoval cancelled.\n")
+        return
+    print(f"\nHorse '{name}' not found.\n")
+
+def assign_horse_to_stall(horse):
+    if not session.repo.barns:
+        print("\nNo barns available. Please add a barn first.\n")
+        return
+
+    # Show barns with empty stalls
+    available_barns = session.repo.available_barns()
+    if not available_barns:
+        print("\nAll barns are full. Cannot assign horse.\n")
+        return
+
+    print("\nAvailable barns with empty stalls:")
+    for i, barn in enumerate(available_barns, start=1):
+        print(f"{i}. {barn.barn_name} (Empty stalls: {session.repo.free_stalls(barn)})")
+
+    while True:
+        choice = input("\nEnter barn name or number to assign the horse: ").strip()
+        selected_barn = None
+
+        if choice.isdigit():
+            index = int(choice) - 1
+            if 0 <= index < len(available_barns):
+                selected_barn = available_barns[index]
+        else:
+            barn = session.repo.barn_named(choice)
+            if barn and session.repo.free_stalls(barn):
+                selected_barn = barn
+
+        if selected_barn:
+            # Assign next available stall
+            session.repo.assign(horse, selected_barn)
+            print(f"\nHorse '{horse.name}' assigned to Barn '{horse.barn}', Stall {horse.stall}.\n")
+            return
+        else:
+            print("Invalid barn choice. Please try again.\n")
+
+def edit_horse():
+    horses = session.repo.horses
+    if not horses:
+        print("\nNo horses available to edit.\n")
+        return
+
+    print("\n=== Edit a Horse ===")
+    print_horse_menu(horses)
+
+    while True:
+        choice = input("Enter horse number to edit: ").strip()
+        if choice.isdigit():
+            index = int(choice) - 1
+            if 0 <= index < len(horses):
+                selected_horse = horses[index]
+                break
+        print("Invalid choice. Try again.\n")
+
+    print(f"\nEditing '{selected_horse.name}' (leave blank to keep current value):")
+
+    new_name = input(f"New name [{selected_horse.name}]: ").strip()
+    if new_name:
+        session.repo.update_horse(selected_horse, name=new_name)
+
+    new_date = input(f"New birth date [{selected_horse.birth_date}] (YYYY-MM-DD): ").strip()
+    if new_date:
+        try:
+            session.repo.update_horse(selected_horse, birth_date=datetime.datetime.strptime(new_date, "%Y-%m-%d").date())
+        except ValueError:
+            print("Invalid date format. Keeping previous date.")
+
+    new_breed = input(f"New breed [{selected_horse.breed}]: ").strip()
+    if new_breed:
+        session.repo.update_horse(selected_horse, breed=new_breed)
+
+    new_breakfast = input(f"New breakfast hay [{selected_horse.breakfast_hay}]: ").strip()
+    if new_breakfast:
+        session.repo.update_horse(selected_horse, breakfast_hay=new_breakfast)
+
+    new_lunch = input(f"New lunch hay [{selected_horse.lunch_hay}]: ").strip()
+    if new_lunch:
+        session.repo.update_horse(selected_horse, lunch_hay=new_lunch)
+
+    new_dinner = input(f"New dinner hay [{selected_horse.dinner_hay}]: ").strip()
+    if new_dinner:
+        session.repo.update_horse(selected_horse, dinner_hay=new_dinner)
+
+    new_allergies = input(f"New allergies (comma-separated) [{', '.join(selected_horse.allergies) if selected_horse.allergies else 'None'}]: ").strip()
+    if new_allergies:
+        session.repo.update_horse(selected_horse, allergies=[a.strip().lower() for a in new_allergies.split(",") if a.strip()])
+
+    reassign = input("Do you want to reassign this horse to a different barn? (y/n): ").strip().lower()
+    if reassign == 'y':
+        session.repo.unassign(selected_horse, clear=False)
+        assign_horse_to_stall(selected_horse)
+
+    session.save_data()
+    print(f"\nHorse '{selected_horse.name}' updated successfully.\n")
+
+# ===============================
+# BARN MANAGEMENT
+# ===============================
+def barn_management():
+    print("\n=== Barn Management ===")
+    print("1. Add a barn")
+    print("2. View a barn")
+    print("3. Edit a barn")
+    print("4. Search for empty stalls")
+    print("5. Remove a barn")
+    print("6. Stall history")
+    print("7. Horses that shared a barn with a horse")
+    print("8. Rebalance barns")
+    print("9. Go back\n")
+
+    while True:
+        try:
+            choice = int(input("Enter your choice: "))
+            if choice == 1:
+                add_barn()
+            elif choice == 2:
+                view_barn()
+            elif choice == 3:
+                edit_barn()
+            elif choice == 4:
+                search_empty_stalls()
+            elif choice == 5:
+                remove_barn()
+            elif choice == 6:
+                stall_history()
+            elif choice == 7:
+                barn_contacts()
+            elif choice == 8:
+                rebalance_barns()
+            elif choice == 9:
+                return
+            else:
+                print("Invalid choice. Please select 1–9.\n")
+        except ValueError:
+            print("Invalid input. Please enter a number.\n")
+
+def add_barn():
+    print("\nAdd a Barn\n" + "-" * 20)
+    while True:
+        barn_name = input("Enter barn name: ").strip()
+        if session.repo.barn_named(barn_name):
+            print(f"A barn named '{barn_name}' already exists.\n")
+            continue
+        try:
+            stalls = int(input("Enter number of stalls: "))
+            if stalls <= 0:
+                print("Number of stalls must be greater than zero.\n")
+                continue
+            break
+        except ValueError:
+            print("Invalid number format.\n")
+
+    from ranch.repository import make_barn
+    barn = make_barn(session.current_user, barn_name, stalls)
+    session.repo.add_barn(barn)
+    print(f"\nBarn '{barn_name}' added successfully with {stalls} stalls.\n")
+    session.save_data()
+
+def view_barn():
+    print("\nView a Barn\n" + "-" * 20)
+    barns = session.repo.barns
+    if not barns:
+        print("No barns available.\n")
+        return
+
+    print("Available barns:")
+    for i, barn in enumerate(barns, start=1):
+        print(f"{i}. {barn.barn_name} (Stalls: {barn.stalls})")
+
+    choice = input("\nEnter barn name or number to view: ").strip()
+    selected_barn = None
+    if choice.isdigit():
+        index = int(choice) - 1
+        if 0 <= index < len(barns):
+            selected_barn = barns[index]
+    else:
+        selected_barn = session.repo.barn_named(choice)
+
+    if not selected_barn:
+        print("\nBarn not found.\n")
+        return
+
+    print(f"\nBarn: {selected_barn.barn_name}")
+    print(f"Total stalls: {selected_barn.stalls}")
+    print(f"Occupied stalls: {len(selected_barn.horse_ids)}")
+    print(f"Available stalls: {selected_barn.stalls - len(selected_barn.horse_ids)}\n")
+
+    if selected_barn.horse_ids:
+        print("Horses in this barn:")
+        for horse in session.repo.horses_of(selected_barn):
+            print(f" - {horse.name}")
+    else:
+        print("No horses currently assigned.\n")
+
+def edit_barn():
+    barns = session.repo.barns
+    if not barns:
+        print("\nNo barns available to edit.\n")
+        return
+
+    print("\n=== Edit Barn ===")
+    for i, barn in enumerate(barns, start=1):
+        print(f"{i}. {barn.barn_name} (Stalls: {barn.stalls})")
+
+    choice = input("\nEnter barn name or number to edit: ").strip()
+    selected_barn = None
+
+    if choice.isdigit():
+        index = int(choice) - 1
+        if 0 <= index < len(barns):
+            selected_barn = barns[index]
+    else:
+        selected_barn = session.repo.barn_named(choice)
+
+    if not selected_barn:
+        print("\nBarn not found.\n")
+        return
+
+    print(f"\nEditing Barn: {selected_barn.barn_name}")
+    note = input("Enter a note or description for this barn (leave blank to skip): ").strip()
+    if note:
+        session.repo.update_barn(selected_barn, note=note)
+        print(f"Note updated for barn '{selected_barn.barn_name}'.")
+        session.save_data()
+    else:
+        print("No changes made.")
+
+def search_empty_stalls():
+    print("\nSearch for Empty Stalls\n" + "-" * 30)
+    barns = session.repo.barns
+    if not barns:
+        print("No barns have been added yet.\n")
+        return
+
+    empty_found = False
+    for barn in barns:
+        total = barn.stalls
+        occupied = len(barn.horse_ids)
+        available = total - occupied
+        if available > 0:
+            empty_found = True
+            print(f"\nBarn: {barn.barn_name}")
+            print(f"Total stalls: {total}")
+            print(f"Occupied: {occupied}")
+            print(f"Available: {available}")
+            print("-" * 25)
+    if not empty_found:
+        print("\nNo empty stalls found in any barn.\n")
+
+def remove_barn():
+    print("\nRemove a Barn\n" + "-" * 30)
+    if not session.repo.barns:
+        print("No barns available to remove.\n")
+        return
+
+    name = input("Enter barn name to remove: ").strip().lower()
+    barn = session.repo.barn_named(name)
+    if barn:
+        confirm = input(f"Are you sure you want to remove '{barn.barn_name}'? (y/n): ").strip().lower()
+        if confirm == "y":
+            # Horses in this barn become unassigned
+            session.repo.remove_barn(barn)
+            if session.schedule is not None:
+                session.schedule.barn_removed(barn.barn_name)
+            print(f"\nBarn '{barn.barn_name}' removed successfully.\n")
+            session.save_data()
+        else:
+            print("\nRemoval canceled.\n")
+    else:
+        print(f"\nBarn '{name}' not found.\n")
+
+# ===============================
+# FEED REPORT
+# ===============================
+def feed_report():
+    print("\n=== Feed Report ===")
+    if not session.repo.horse_count():
+        print("No horses registered yet.\n")
+        return
+    for line in session.get_feed_ledger().feed_sheet():
+        print(line)
+    print()
+
+def _when(moment):
+    return moment.strftime("%Y-%m-%d %H:%M") if moment else "now"
+
+def stall_history():
+    print("\n=== Stall History ===")
+    barn_name = input("Enter barn name: ").strip()
+    stall = input("Stall number (leave blank for the whole barn): ").strip()
+    if stall and not stall.isdigit():
+        print("\nInvalid stall number.\n")
+        return
+    start = ask_date("From (YYYY-MM-DD, leave blank for the beginning): ")
+    end = ask_date("Up to and including (YYYY-MM-DD, leave blank for today): ")
+    session.report_save_errors(flush=True)
+    stays = session.history.occupants(
+        barn_name, int(stall) if stall else None,
+        datetime.datetime.combine(start, datetime.time()) if start else None,
+        datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time()) if end else None)
+    if not stays:
+        print("\nNo horses were stabled there in that period.\n")
+        return
+    for stay in stays:
+        print(f" - {stay.name} (Stall {stay.stall}): {_when(stay.start)} to {_when(stay.end)}")
+
+def barn_contacts():
+    print("\n=== Horses That Shared a Barn ===")
+    horse = session.repo.horse_named(input("Enter horse name: ").strip())
+    if not horse:
+        print("\nHorse not found.\n")
+        return
+    days = input("How many days back? [30]: ").strip() or "30"
+    if not days.isdigit():
+        print("\nInvalid number of days.\n")
+        return
+    session.report_save_errors(flush=True)
+    since = datetime.datetime.now() - datetime.timedelta(days=int(days))
+    contacts = session.history.barn_mates(horse.id, since)
+    if not contacts:
+        print(f"\nNo other horse shared a barn with {horse.name} in the last {days} days.\n")
+        return
+    print(f"\nShared a barn with {horse.name} in the last {days} days:")
+    for stay, shared_from, shared_until in contacts:
+        print(f" - {stay.name} in {stay.barn} (Stall {stay.stall}): {_when(shared_from)} to {_when(shared_until)}")
+
+def rebalance_barns():
+    from ranch.rebalance import RebalanceError, Rules, apply_plan, format_plan, plan_rebalance
+    print("\n=== Rebalance Barns ===")
+    close = [n.strip() for n in input("Barns to close (comma-separated, blank for none): ").split(",") if n.strip()]
+    groups = {}
+    for kind in ("together", "apart"):
+        text = input(f"Horses to keep {kind} (names comma-separated, groups separated by ';'): ")
+        groups[kind] = [[n.strip() for n in g.split(",") if n.strip()] for g in text.split(";") if g.strip()]
+    allergies = input("Keep horses out of barns with hay they are allergic to? (y/n): ").strip().lower() == "y"
+    unassigned = input("Also stable horses not in any barn? (y/n): ").strip().lower() == "y"
+    try:
+        plan = plan_rebalance(session.repo, Rules(close, groups["together"], groups["apart"], allergies, unassigned))
+    except RebalanceError as e:
+        print(f"\n{e}\n")
+        return
+    write_page("\n" + "\n".join(format_plan(plan)) + "\n")
+    if not plan.moves:
+        return
+    if input(f"\nApply these {len(plan.moves)} moves? (y/n): ").strip().lower() != "y":
+        print("\nNothing was moved.\n")
+        return
+    try:
+        apply_plan(session.repo, plan)
+    except RebalanceError as e:
+        print(f"\n{e}\n")
+        return
+    print(f"\nMoved {len(plan.moves)} horse(s).\n")
+    session.save_data()
+
+# ===============================
+# DAILY TASKS
+# ===============================
+def daily_tasks():
+    print("\n=== Daily Tasks ===")
+    print("1. Tasks due in the next hours")
+    print("2. Tasks for a day")
+    print("3. Add a care task")
+    print("4. Remove a care task")
+    print("5. Go back\n")
+
+    while True:
+        try:
+            choice = int(input("Enter your choice: "))
+            if choice == 1:
+                tasks_due()
+            elif choice == 2:
+                tasks_for_day()
+            elif choice == 3:
+                add_task()
+            elif choice == 4:
+                remove_task()
+            elif choice == 5:
+                return
+            else:
+                print("Invalid choice. Please select 1–5.\n")
+        except ValueError:
+            print("Invalid input. Please enter a number.\n")
+
+def _ask_barn():
+    """Ask for an optional barn; returns (found, name), with name None for every barn."""
+    name = input("Barn (leave blank for every barn): ").strip()
+    if name and not session.repo.barn_named(name):
+        print(f"\nBarn '{name}' not found.\n")
+        return False, None
+    return True, name or None
+
+def _print_tasks(tasks, empty):
+    from ranch.tasks import format_tasks
+    if not tasks:
+        print(f"\n{empty}\n")
+        return
+    write_page("\n" + "\n".join(format_tasks(tasks)) + f"\n{len(tasks)} task(s)\n")
+
+def tasks_due():
+    hours = input("How many hours ahead? [1]: ").strip() or "1"
+    if not hours.isdigit() or not int(hours):
+        print("\nInvalid number of hours.\n")
+        return
+    found, barn = _ask_barn()
+    if not found:
+        return
+    now = datetime.datetime.now().replace(second=0, microsecond=0)
+    tasks = session.get_schedule().due(now, now + datetime.timedelta(hours=int(hours)), barn)
+    _print_tasks(tasks, f"Nothing is due in the next {hours} hour(s).")
+
+def tasks_for_day():
+    day = ask_date("Day (YYYY-MM-DD, leave blank for today): ") or datetime.date.today()
+    found, barn = _ask_barn()
+    if found:
+        _print_tasks(session.get_schedule().day(day, barn), f"Nothing is scheduled on {day}.")
+
+def _task_target():
+    """Ask for the horse or barn a care task is for; returns (horse, barn), both None if not found."""
+    name = input("Horse or barn name: ").strip()
+    horse = session.repo.horse_named(name)
+    barn = None if horse else session.repo.barn_named(name)
+    if not horse and not barn:
+        print(f"\nNo horse or barn named '{name}'.\n")
+    return horse, barn
+
+def add_task():
+    from ranch.tasks import make_rule
+    print("\nAdd a Care Task\n" + "-" * 20)
+    horse, barn = _task_target()
+    if not horse and not barn:
+        return
+    try:
+        rule = make_rule(session.current_user, input("Kind of task (e.g. farrier, vet): "),
+                         input("Times of day (HH:MM, comma separated): "),
+                         input("Every how many days? [1]: ").strip() or 1,
+                         ask_date("Starting (YYYY-MM-DD, leave blank for today): "),
+                         input("Priority, 1 (high) to 3 (low) [2]: ").strip() or 2,
+                         horse.id if horse else None, barn.barn_name if barn else None,
+                         input("Note (leave blank to skip): "))
+        session.get_schedule().add_rule(rule)
+    except ValueError as e:
+        print(f"\n{e}\n")
+        return
+    session.save_data()
+    print(f"\nTask added: {rule.describe()}\n")
+
+def remove_task():
+    print("\nRemove a Care Task\n" + "-" * 20)
+    horse, barn = _task_target()
+    if not horse and not barn:
+        return
+    schedule = session.get_schedule()
+    rules = schedule.rules(horse_id=horse.id) if horse else schedule.rules(barn=barn.barn_name)
+    if not rules:
+        print(f"\n{horse.name if horse else barn.barn_name} has no care tasks.\n")
+        return
+    for i, rule in enumerate(rules, start=1):
+        print(f"{i}. {rule.describe()}")
+    choice = input("\nEnter task number to remove (blank to go back): ").strip()
+    if not choice.isdigit() or not 1 <= int(choice) <= len(rules):
+        return
+    schedule.remove_rule(rules[int(choice) - 1])
+    session.save_data()
+    print("\nTask removed.\n")
+
+# ===============================
+# BACKGROUND JOBS
+# ===============================
+def _follow(job):
+    """Show a job's progress on one line until it ends or Ctrl+C is pressed."""
+    try:
+        while job.state not in ("done", "failed", "cancelled"):
+            job = session.get_jobs().wait(job.id, job.done)
+            print(f"\r{job.describe()}", end="", flush=True)
+    except KeyboardInterrupt:
+        pass
+    print()
+
+def background_jobs():
+    print("\n=== Background Jobs ===")
+    jobs = session.get_jobs().jobs(session.current_user)
+    if not jobs:
+        print("No jobs yet.\n")
+        return
+    for i, job in enumerate(jobs, start=1):
+        print(f"{i}. {job.created} {job.describe()}")
+    choice = input("\nEnter a job number to follow it, or c and a number to cancel it (blank to go back): ")
+    choice = choice.strip().lower()
+    cancel = choice.startswith("c")
+    number = choice[1:].strip() if cancel else choice
+    if not number.isdigit() or not 1 <= int(number) <= len(jobs):
+        return
+    job = jobs[int(number) - 1]
+    if not cancel:
+        _follow(job)
+    elif session.get_jobs().cancel(job.id):
+        print("\nJob cancelled.\n")
+    else:
+        print("\nThat job has ended or is run by another session.\n")
+
+
+# ===============================
+# MAIN MENU
+# ===============================
+def main():
+    session.load_data()
+    session.save_data()  # whatever load_data() repaired
+    if os.path.exists(session.JOBS_LOG):
+        session.get_jobs()  # picks up jobs a session that ended left unfinished
+    while True:
+        session.report_save_errors()
+        session.report_jobs()
+        print("\n=== Horse & Barn Management System ===")
+        print("1. Add new horse")
+        print("2. View horses")
+        print("3. Edit a horse")
+        print("4. Remove a horse")
+        print("5. Manage barns")
+        print("6. Assign a horse to a stall")
+        print("7. Feed report")
+        print("8. Daily tasks")
+        print("9. Background jobs")
+        print("10. Exit\n")
+        try:
+            choice = int(input("Enter your choice: "))
+            if choice == 1:
+                new_horse()
+            elif choice == 2:
+                view_horse()
+            elif choice == 3:
+                edit_horse()
+            elif choice == 4:
+                remove_horse()
+            elif choice == 5:
+                barn_management()
+            elif choice == 6:
+                horses = session.repo.horses
+                if not horses:
+                    print("\nNo horses available to assign.\n")
+                else:
+                    print_horse_menu(horses)
+                    while True:
+                        horse_choice = input("Enter horse number to assign/reassign: ").strip()
+                        if horse_choice.isdigit():
+                            index = int(horse_choice) - 1
+                            if 0 <= index < len(horses):
+                                assign_horse_to_stall(horses[index])
+                                session.save_data()
+                                break
+                        print("Invalid choice. Try again.\n")
+            elif choice == 7:
+                feed_report()
+            elif choice == 8:
+                daily_tasks()
+            elif choice == 9:
+                background_jobs()
+            elif choice == 10:
+                print("\nExiting program. Goodbye!\n")
+                session.close_writer()
+                session.close_jobs()
+                break
+            else:
+                print("Invalid choice. Please select 1–10.\n")
+        except ValueError:
+            print("Invalid input. Please enter a number.\n")
+
+# ===============================
+# BATCH MODE
+# ===============================
+def run_batch(argv):
+    """Apply command-line or imported operations in one transaction and save once."""
+    import getpass
+    from ranch import batch
+    from ranch.storage import ConflictError
+    args = batch.build_parser().parse_args(argv)
+    token = args.token or os.environ.get("HORSERANCH_TOKEN")
+    if token and args.command != "login":
+        if session.get_users().check_token(token) != args.user:
+            print("Invalid or expired session token.")
+            return 1
+    else:
+        password = args.password or os.environ.get("HORSERANCH_PASSWORD") or getpass.getpass("Password: ")
+        if not session.authenticate(args.user, password):
+            print("Invalid username or password.")
+            return 1
+    if args.command == "login":
+        print(session.get_users().issue_token(args.user))
+        return 0
+    session.current_user = args.user
+    session.load_data()
+    try:
+        count = batch.apply_operations(session.repo, session.current_user, batch.operations_from_args(args),
+                                       getattr(args, "policy", batch.FIRST_FIT))
+    except (OSError, ValueError) as e:
+        print(f"Batch aborted, nothing was saved: {e}")
+        return 1
+    if args.dry_run:
+        print(f"Dry run: {count} operation(s) checked, nothing was saved.")
+        return 0
+    try:
+        with metrics.timer("save_data"):
+            session.get_storage().save(session.current_user, session.repo.horses, session.repo.barns, partial=False)
+    except ConflictError as e:
+        print(f"Batch aborted, nothing was saved: {e}")
+        return 1
+    session.history.save()
+    print("Data saved successfully.\n")
+    print(f"{count} operation(s) applied.")
+    return 0
+
+# ===============================
+# LAUNCHER
+# ===============================
+def run(argv):
+    """Run batch mode when given arguments, otherwise the login prompt and menus."""
+    if argv:
+        return run_batch(argv)
+    print("=== Welcome to Horse & Barn Management System ===")
+    while True:
+        print("1. Login")
+        print("2. Register")
+        print("3. Exit")
+        choice = input("Enter choice: ").strip()
+        if choice == "1":
+            if login_user():
+                main()  # go to main menu
+                break
+        elif choice == "2":
+            register_user()
+        elif choice == "3":
+            print("Goodbye!")
+            break
+        else:
+            print("Invalid choice.\n")
+    return 0
@@ -0,0 +1,167 @@
+"""Barn consistency checks, and repair by rebuilding barns from the horses.
+
+Usage: python -m ranch.consistency [--repair] [--data-dir DIR] [--backend sharded|log|json]
+
+Each horse's barn and stall fields are taken as the truth. One pass over an
+owner's horses and barns finds:
+
+    missing-barn      a horse names a barn the owner does not have
+    bad-stall         a stabled horse has no stall, or one its barn does not have
+    duplicate-stall   two horses in the same stall
+    over-capacity     more horses in a barn than it has stalls
+    membership        a barn's horse list differs from the horses in it
+    duplicate-barn    two barns with the same name (reported, not repaired)
+
+Repairing gives a horse in a missing barn no barn, moves a horse on a bad or
+taken stall to the barn's lowest free stall (or out of the barn when it is
+full) and rebuilds every horse list. Horses the barn already listed keep
+their stall ahead of ones it did not.
+"""
+import argparse
+from collections import namedtuple
+
+from ranch import metrics
+from ranch.storage import BARN, HORSE, open_storage
+
+MISSING_BARN = "missing-barn"
+BAD_STALL = "bad-stall"
+DUPLICATE_STALL = "duplicate-stall"
+OVER_CAPACITY = "over-capacity"
+MEMBERSHIP = "membership"
+DUPLICATE_BARN = "duplicate-barn"
+
+Problem = namedtuple("Problem", "kind message")
+
+
+def _key(name):
+    return name.lower() if name else None
+
+
+@metrics.timed("consistency_check")
+def check(horses, barns, repair=False):
+    """Check one owner's horses and barns; O(horses + barns + stalls).
+
+    Returns (problems, changed). With repair=True the records are fixed in
+    place and changed holds the (kind, id) keys of the ones that were, for
+    RanchRepository.dirty; without it nothing is modified and changed is
+    the keys that would be.
+    """
+    problems, changed = [], set()
+    by_name = {}
+    for barn in barns:
+        same = by_name.setdefault(_key(barn.barn_name), [])
+        if same:
+            problems.append(Problem(DUPLICATE_BARN, f"There are {len(same) + 1} barns named '{barn.barn_name}'."))
+        same.append(barn)
+
+    listed_in = {}
+    for barn in barns:
+        for hid in barn.horse_ids:
+            listed_in.setdefault(hid, barn)
+
+    members = {barn.id: [] for barn in barns}
+    resolved = {}  # barn field as stored -> barns of that name
+    for horse in horses:
+        if not horse.barn:
+            continue
+        same = resolved.get(horse.barn)
+        if same is None:
+            same = resolved[horse.barn] = by_name.get(_key(horse.barn), ())
+        if not same:
+            problems.append(Problem(MISSING_BARN, f"Horse '{horse.name}' is in barn '{horse.barn}', which does not exist."))
+            changed.add((HORSE, horse.id))
+            if repair:
+                horse.barn = horse.stall = None
+            continue
+        barn = listed_in.get(horse.id)
+        if barn is not same[0] and not any(b is barn for b in same):
+            barn = same[0]
+        members[barn.id].append(horse)
+
+    for barn in barns:
+        changed |= _check_barn(barn, members[barn.id], problems, repair)
+    metrics.count("records_scanned", len(horses) + len(barns))
+    return problems, changed
+
+
+def _check_barn(barn, horses, problems, repair):
+    changed = set()
+    if len(horses) > barn.stalls:
+        problems.append(Problem(OVER_CAPACITY, f"Barn '{barn.barn_name}' holds {len(horses)} horses "
+                                               f"in {barn.stalls} stalls."))
+    # Horses the barn listed claim their stalls first, in the barn's order.
+    here = {h.id: h for h in horses}
+    listed = [here[hid] for hid in dict.fromkeys(barn.horse_ids) if hid in here]
+    listed_ids = {h.id for h in listed}
+    ordered = listed + [h for h in horses if h.id not in listed_ids]
+
+    taken, misplaced, gone = {}, [], set()
+    for horse in ordered:
+        stall = horse.stall
+        if type(stall) is not int or not 1 <= stall <= barn.stalls:
+            problems.append(Problem(BAD_STALL, f"Horse '{horse.name}' is in stall {stall} of barn "
+                                               f"'{barn.barn_name}', which has stalls 1-{barn.stalls}."))
+            misplaced.append(horse)
+        elif stall in taken:
+            problems.append(Problem(DUPLICATE_STALL, f"Horses '{taken[stall].name}' and '{horse.name}' are both "
+                                                     f"in stall {stall} of barn '{barn.barn_name}'."))
+            misplaced.append(horse)
+        else:
+            taken[stall] = horse
+
+    free = 1
+    for horse in misplaced:
+        changed.add((HORSE, horse.id))
+        while free in taken:
+            free += 1
+        if free <= barn.stalls:
+            taken[free] = horse
+            if repair:
+                horse.stall = free
+        else:
+            gone.add(horse.id)
+            if repair:
+                horse.barn = horse.stall = None
+
+    horse_ids = [h.id for h in ordered if h.id not in gone]
+    if horse_ids != barn.horse_ids:
+        missing = len(set(horse_ids) - listed_ids)
+        extra = len(barn.horse_ids) - (len(horse_ids) - missing)  # counting repeated ids
+        if extra or missing:
+            problems.append(Problem(MEMBERSHIP, f"Barn '{barn.barn_name}' listed {extra} horse(s) that are not "
+                                                f"in it and left out {missing} that are."))
+        changed.add((BARN, barn.id))
+        if repair:
+            barn.horse_ids = horse_ids
+    return changed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check, and optionally repair, every owner's barns.")
+    parser.add_argument("--repair", action="store_true", help="fix what is found and save it")
+    parser.add_argument("--backend", default="sharded", choices=("sharded", "log", "json"))
+    parser.add_argument("--data-dir", default="ranch_data", help="directory of the sharded backend")
+    parser.add_argument("--horses", default="horses.json", help="horses file of the json backend")
+    parser.add_argument("--barns", default="barns.json", help="barns file of the json backend")
+    parser.add_argument("--log", default="ranch.log", help="change log of the log backend")
+    args = parser.parse_args(argv)
+
+    storage = open_storage(args.backend, args.horses, args.barns, args.log, args.data_dir)
+    found = 0
+    for owner in storage.owners():
+        horses, barns = storage.load(owner)
+        problems, changed = check(horses, barns, args.repair)
+        for problem in problems:
+            print(f"{owner}: {problem.message}")
+        found += len(problems)
+        if args.repair and changed:
+            storage.save(owner, horses, barns, changed=changed)
+    if not found:
+        print("No problems found.")
+    elif args.repair:
+        print(f"Repaired {found} problem(s).")
+    return 1 if found and not args.repair else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,42 @@
+"""Convert horse and barn files between the formats in ranch.formats.
+
+Usage: python -m ranch.convert --to jsonl horses.json barns.json [--output-dir DIR]
+
+Each file is written next to the original (or into --output-dir) with the
+extension of the new format, e.g. horses.json -> horses.jsonl. Records are
+copied as they are stored; nothing else about them changes.
+"""
+import argparse
+import os
+
+from ranch.formats import CODECS, with_format
+from ranch.storage import read_records, write_records
+
+
+def convert(source, fmt, output_dir=None):
+    """Write the records in source to a file in format fmt; returns (path, record count)."""
+    target = with_format(source, fmt)
+    if output_dir:
+        target = os.path.join(output_dir, os.path.basename(target))
+    if os.path.abspath(target) == os.path.abspath(source):
+        raise ValueError(f"'{source}' is already in {fmt} format.")
+    records = read_records(source)
+    write_records(target, records)
+    return target, len(records)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert horse and barn files to another format.")
+    parser.add_argument("files", nargs="+", help="files to convert; their format is taken from the extension")
+    parser.add_argument("--to", required=True, choices=sorted(CODECS), help="format to write")
+    parser.add_argument("--output-dir", help="directory for the converted files (default: next to each file)")
+    args = parser.parse_args(argv)
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    for source in args.files:
+        target, count = convert(source, args.to, args.output_dir)
+        print(f"{source} -> {target}: {count} record(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+"""Streaming horse-list export to .docx, .xlsx and .csv.
+
+Each writer takes any iterable of horses (a generator is fine) and writes
+rows to the file as it goes, so neither the horse list nor the document is
+ever held in memory. The .docx and .xlsx files are written as plain OOXML
+parts inside a zip archive without python-docx or openpyxl.
+"""
+import csv
+import datetime
+import html
+import io
+import os
+import re
+import zipfile
+
+from ranch import metrics
+
+COLUMNS = ["Name", "Breed", "Barn", "Stall", "Birthdate", "Breakfast", "Lunch", "Dinner"]
+FORMATS = ("docx", "xlsx", "csv")
+
+# Rows are gathered into chunks of this many before each write.
+CHUNK_ROWS = 500
+
+_INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def horse_row(horse):
+    """The export columns for one horse, as strings."""
+    return [
+        horse.name,
+        horse.breed,
+        horse.barn if horse.barn else "Unassigned",
+        str(horse.stall) if horse.stall else "-",
+        str(horse.birth_date),
+        horse.breakfast_hay,
+        horse.lunch_hay,
+        horse.dinner_hay,
+    ]
+
+
+def title_for(today=None):
+    today = today or datetime.date.today()
+    return f"Horse List – Generated on {today.strftime('%Y-%m-%d')}"
+
+
+def _xml(text):
+    return html.escape(_INVALID_XML.sub("", text), quote=False)
+
+
+def _write_chunks(out, lines):
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= CHUNK_ROWS:
+            out.write("".join(chunk))
+            chunk = []
+    if chunk:
+        out.write("".join(chunk))
+
+
+def _text_part(zf, name):
+    return io.TextIOWrapper(zf.open(name, "w", force_zip64=True), encoding="utf-8")
+
+
+# ===============================
+# CSV
+# ===============================
+def write_csv(horses, path):
+    """Write horses to a CSV file with a header row. Returns the row count."""
+    count = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(COLUMNS)
+        for horse in horses:
+            writer.writerow(horse_row(horse))
+            count += 1
+    return count
+
+
+# ===============================
+# DOCX
+# ===============================
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    '</Types>'
+)
+_DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+_DOCX_DOCUMENT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+    'Target="styles.xml"/>'
+    '</Relationships>'
+)
+_DOCX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<w:styles xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/></w:style>'
+    '<w:style w:type="paragraph" w:styleId="Heading1"><w:name w:val="heading 1"/>'
+    '<w:basedOn w:val="Normal"/><w:next w:val="Normal"/><w:qFormat/>'
+    '<w:pPr><w:keepNext/><w:spacing w:before="480"/><w:outlineLvl w:val="0"/></w:pPr>'
+    '<w:rPr><w:b/><w:color w:val="365F91"/><w:sz w:val="28"/></w:rPr></w:style>'
+    '</w:styles>'
+)
+_DOCX_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+    '<w:p><w:pPr><w:pStyle w:val="Heading1"/></w:pPr><w:r><w:t>{title}</w:t></w:r></w:p>'
+    '<w:tbl><w:tblPr><w:tblW w:w="0" w:type="auto"/><w:tblBorders>'
+    '<w:top w:val="single" w:sz="4"/><w:left w:val="single" w:sz="4"/>'
+    '<w:bottom w:val="single" w:sz="4"/><w:right w:val="single" w:sz="4"/>'
+    '<w:insideH w:val="single" w:sz="4"/><w:insideV w:val="single" w:sz="4"/>'
+    '</w:tblBorders></w:tblPr><w:tblGrid>{grid}</w:tblGrid>'
+)
+_DOCX_TAIL = '</w:tbl><w:p/><w:sectPr/></w:body></w:document>'
+
+
+def _docx_row(cells):
+    return "<w:tr>" + "".join(
+        f'<w:tc><w:p><w:r><w:t xml:space="preserve">{_xml(c)}</w:t></w:r></w:p></w:tc>' for c in cells
+    ) + "</w:tr>"
+
+
+def write_docx(horses, path, title=None):
+    """Write horses to a .docx table under a heading. Returns the row count."""
+    count = 0
+
+    def rows():
+        nonlocal count
+        yield _docx_row(COLUMNS)
+        for horse in horses:
+            count += 1
+            yield _docx_row(horse_row(horse))
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _DOCX_CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _DOCX_RELS)
+        zf.writestr("word/_rels/document.xml.rels", _DOCX_DOCUMENT_RELS)
+        zf.writestr("word/styles.xml", _DOCX_STYLES)
+        with _text_part(zf, "word/document.xml") as out:
+            grid = '<w:gridCol w:w="1200"/>' * len(COLUMNS)
+            out.write(_DOCX_HEAD.format(title=_xml(title or title_for()), grid=grid))
+            _write_chunks(out, rows())
+            out.write(_DOCX_TAIL)
+    return count
+
+
+# ===============================
+# XLSX
+# ===============================
+_XLSX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_XLSX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_XLSX_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Horses" sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+_XLSX_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_XLSX_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_XLSX_TAIL = '</sheetData></worksheet>'
+
+
+def _xlsx_row(number, cells):
+    return f'<row r="{number}">' + "".join(
+        f'<c t="inlineStr"><is><t xml:space="preserve">{_xml(c)}</t></is></c>' for c in cells
+    ) + "</row>"
+
+
+def write_xlsx(horses, path):
+    """Write horses to a single-sheet .xlsx workbook. Returns the row count."""
+    count = 0
+
+    def rows():
+        nonlocal count
+        yield _xlsx_row(1, COLUMNS)
+        for horse in horses:
+            count += 1
+            yield _xlsx_row(count + 1, horse_row(horse))
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _XLSX_CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _XLSX_RELS)
+        zf.writestr("xl/workbook.xml", _XLSX_WORKBOOK)
+        zf.writestr("xl/_rels/workbook.xml.rels", _XLSX_WORKBOOK_RELS)
+        with _text_part(zf, "xl/worksheets/sheet1.xml") as out:
+            out.write(_XLSX_HEAD)
+            _write_chunks(out, rows())
+            out.write(_XLSX_TAIL)
+    return count
+
+
+WRITERS = {"docx": write_docx, "xlsx": write_xlsx, "csv": write_csv}
+
+
+def export_horses(horses, path):
+    """Write horses to path in the format named by its extension. Returns the row count."""
+    fmt = os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt not in WRITERS:
+        raise ValueError(f"Unsupported export format '{fmt}'. Use one of: {', '.join(FORMATS)}.")
+    with metrics.timer(f"export_{fmt}"):
+        rows = WRITERS[fmt](horses, path)
+    metrics.count("export_rows", rows)
+    if metrics.ENABLED:
+        metrics.count("bytes_written", os.path.getsize(path))
+    return rows
@@ -0,0 +1,133 @@
+"""Running hay totals for the feed sheet and hay/allergy conflict checks."""
+from collections import Counter
+
+MEALS = (("breakfast", "breakfast_hay"), ("lunch", "lunch_hay"), ("dinner", "dinner_hay"))
+UNASSIGNED = "Unassigned"
+
+
+def hay_key(hay):
+    return (hay or "").strip().lower()
+
+
+def feedings(horse):
+    """(meal, hay) pairs a horse is fed each day, skipping blank hay."""
+    return [(meal, hay_key(getattr(horse, field))) for meal, field in MEALS if hay_key(getattr(horse, field))]
+
+
+def conflicts_for(horse):
+    """(meal, hay) feedings that match one of the horse's allergies.
+
+    A hay matches an allergy when they are equal or the allergy is one of
+    the words of the hay type, so "alfalfa" flags "Alfalfa mix".
+    """
+    allergies = {a.strip().lower() for a in horse.allergies}
+    if not allergies:
+        return []
+    return [(meal, hay) for meal, hay in feedings(horse) if hay in allergies or allergies & set(hay.split())]
+
+
+class FeedLedger:
+    """Daily hay counts by type, meal and barn, kept current as horses change.
+
+    Each count is a number of rations: one horse fed one hay at one meal.
+    The ledger subscribes to the repository, so every add, edit, removal or
+    stall move adjusts the counters instead of rescanning the herd.
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.by_meal = Counter()
+        self.by_barn = Counter()
+        self.barn_meals = {}  # (barn, meal) -> Counter(hay -> rations), for one barn's round
+        self.conflicts = {}
+        for horse in repo.iter_horses():
+            self._count(horse, 1)
+        repo.subscribe(self)
+
+    def _count(self, horse, sign):
+        barn = horse.barn or UNASSIGNED
+        for meal, hay in feedings(horse):
+            self.by_meal[(meal, hay)] += sign
+            self.by_barn[(barn, meal, hay)] += sign
+            if not self.by_meal[(meal, hay)]:
+                del self.by_meal[(meal, hay)]
+            if not self.by_barn[(barn, meal, hay)]:
+                del self.by_barn[(barn, meal, hay)]
+            hays = self.barn_meals.setdefault((barn, meal), Counter())
+            hays[hay] += sign
+            if not hays[hay]:
+                del hays[hay]
+                if not hays:
+                    del self.barn_meals[(barn, meal)]
+        if sign > 0:
+            found = conflicts_for(horse)
+            if found:
+                self.conflicts[horse.id] = found
+        else:
+            self.conflicts.pop(horse.id, None)
+
+    def horse_changed(self, before, after):
+        if before is not None:
+            self._count(before, -1)
+        if after is not None:
+            self._count(after, 1)
+
+    # ===============================
+    # TOTALS
+    # ===============================
+    def daily_by_hay(self):
+        """Rations per day for each hay type."""
+        totals = Counter()
+        for (meal, hay), count in self.by_meal.items():
+            totals[hay] += count
+        return totals
+
+    def daily_by_meal(self):
+        """{meal: Counter(hay -> rations)} for one day."""
+        meals = {meal: Counter() for meal, _ in MEALS}
+        for (meal, hay), count in self.by_meal.items():
+            meals[meal][hay] += count
+        return meals
+
+    def daily_by_barn(self):
+        """{barn: {meal: Counter(hay -> rations)}} for one day."""
+        barns = {}
+        for (barn, meal, hay), count in self.by_barn.items():
+            barns.setdefault(barn, {m: Counter() for m, _ in MEALS})[meal][hay] += count
+        return barns
+
+    def rations(self, barn, meal):
+        """Counter(hay -> rations) of one meal in one barn (by name as horses record it)."""
+        return self.barn_meals.get((barn, meal), Counter())
+
+    def weekly_by_hay(self, days=7):
+        return Counter({hay: count * days for hay, count in self.daily_by_hay().items()})
+
+    def conflict_list(self):
+        """(horse, meal, hay) for every feeding that clashes with an allergy."""
+        return [(self.repo.horse_by_id(hid), meal, hay)
+                for hid, found in self.conflicts.items() for meal, hay in found]
+
+    def feed_sheet(self):
+        """The morning feed sheet as a list of lines."""
+        lines = ["Daily rations by hay type:"]
+        daily = self.daily_by_hay()
+        weekly = self.weekly_by_hay()
+        if not daily:
+            lines.append("  No hay recorded.")
+        for hay in sorted(daily):
+            lines.append(f"  {hay}: {daily[hay]} per day, {weekly[hay]} per week")
+        for meal, hays in self.daily_by_meal().items():
+            if hays:
+                lines.append(f"{meal.capitalize()}: " + ", ".join(f"{h} x{c}" for h, c in sorted(hays.items())))
+        for barn, meals in sorted(self.daily_by_barn().items()):
+            lines.append(f"Barn {barn}:")
+            for meal, hays in meals.items():
+                if hays:
+                    lines.append(f"  {meal}: " + ", ".join(f"{h} x{c}" for h, c in sorted(hays.items())))
+        conflicts = self.conflict_list()
+        if conflicts:
+            lines.append("Allergy conflicts:")
+            for horse, meal, hay in conflicts:
+                lines.append(f"  {horse.name} is allergic to {hay} ({meal})")
+        return lines
@@ -0,0 +1,119 @@
+"""File formats for lists of stored records: pretty JSON, JSON Lines and msgpack.
+
+A codec turns a list of records in their stored form (Horse.to_dict(), with
+birth dates as YYYY-MM-DD strings that Horse.from_dict() reads back with
+date.fromisoformat) into bytes and back. The format of a file is picked
+from its extension:
+
+    .json     one indented JSON list, the original layout
+    .jsonl    one compact JSON object per line
+    .msgpack  one msgpack array; needs the optional msgpack package
+
+JSON Lines keeps other owners' lines as they are when an owner's records
+are replaced, and skips parsing lines that cannot belong to the owner being
+loaded, so loads and saves cost little more than the owner's own records.
+"""
+import json
+import os
+
+
+class JsonCodec:
+    name = "json"
+    extension = ".json"
+
+    def dumps(self, records):
+        return json.dumps(records, indent=4).encode()
+
+    def loads(self, data):
+        return json.loads(data) if data.strip() else []
+
+    def load_owner(self, data, owner):
+        """The records in data that belong to owner."""
+        return [r for r in self.loads(data) if r.get("owner") == owner]
+
+    def replace_owner(self, data, owner, records):
+        """data with owner's records replaced by records, encoded again."""
+        kept = [r for r in self.loads(data) if r.get("owner") != owner]
+        kept.extend(records)
+        return self.dumps(kept)
+
+
+class JsonLinesCodec(JsonCodec):
+    name = "jsonl"
+    extension = ".jsonl"
+
+    def dumps(self, records):
+        return "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records).encode()
+
+    @staticmethod
+    def _parse(lines):
+        # One json.loads() over the lines joined into an array is about twice
+        # as fast as one call per line.
+        return json.loads(b"[" + b",".join(lines) + b"]")
+
+    def loads(self, data):
+        return self._parse([line for line in data.splitlines() if line.strip()])
+
+    def _split(self, data, owner):
+        # Returns (owner's records, every other line in file order). A line
+        # is only parsed if it holds owner's name as a JSON string; for names
+        # JSON would escape, every line is parsed.
+        lines = [line for line in data.splitlines() if line.strip()]
+        needle = json.dumps(owner).encode()
+        if isinstance(owner, str) and owner.isascii() and json.dumps(owner)[1:-1] == owner:
+            candidates = [i for i, line in enumerate(lines) if needle in line]
+        else:
+            candidates = range(len(lines))
+        records, mine = [], set()
+        for i, record in zip(candidates, self._parse([lines[i] for i in candidates])):
+            if record.get("owner") == owner:
+                records.append(record)
+                mine.add(i)
+        return records, [line for i, line in enumerate(lines) if i not in mine]
+
+    def load_owner(self, data, owner):
+        return self._split(data, owner)[0]
+
+    def replace_owner(self, data, owner, records):
+        others = self._split(data, owner)[1]
+        return b"".join(line + b"\n" for line in others) + self.dumps(records)
+
+
+class MsgpackCodec(JsonCodec):
+    name = "msgpack"
+    extension = ".msgpack"
+
+    @staticmethod
+    def _msgpack():
+        try:
+            import msgpack
+        except ImportError:
+            raise ImportError("The msgpack format needs the msgpack package (pip install msgpack).") from None
+        return msgpack
+
+    def dumps(self, records):
+        return self._msgpack().packb(records)
+
+    def loads(self, data):
+        return self._msgpack().unpackb(data) if data else []
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec(), JsonLinesCodec(), MsgpackCodec())}
+_BY_EXTENSION = {codec.extension: codec for codec in CODECS.values()}
+
+
+def codec_named(name):
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"Unknown file format '{name}'; choose from {', '.join(CODECS)}.") from None
+
+
+def codec_for(path):
+    """The codec for a file, by extension; pretty JSON for anything unknown."""
+    return _BY_EXTENSION.get(os.path.splitext(path)[1].lower(), CODECS["json"])
+
+
+def with_format(path, name):
+    """path with its extension changed to that of the format called name."""
+    return os.path.splitext(path)[0] + codec_named(name).extension
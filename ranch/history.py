@@ -0,0 +1,267 @@
+"""Stall occupancy history: which horse was in which stall, and when.
+
+Every move into or out of a stall is appended to a per-owner file as one
+JSON line, and nothing in the file is ever rewritten:
+
+    {"at": "2026-03-04T09:15:00", "event": "in", "horse": id, "name": ..., "barn": ..., "stall": 4}
+    {"at": "2026-03-09T17:40:00", "event": "out", "horse": id, "name": ..., "barn": ..., "stall": 4}
+
+Replaying the file gives each horse's stays, (barn, stall, from, to)
+intervals, and an IntervalIndex per barn and per stall answers "who was in
+Barn X stall 4 during March" and "who shared a barn with this horse in the
+last 30 days" without scanning years of history.
+
+History starts when an owner's file is first created: horses already
+stabled then get an "in" event at that moment.
+"""
+import bisect
+import datetime
+import json
+import os
+from dataclasses import dataclass
+
+from ranch import metrics
+from ranch.locking import FileLock
+from ranch.storage import shard_name
+
+FOREVER = datetime.datetime.max
+
+
+def history_path(directory, owner):
+    """File holding owner's stall history under directory."""
+    return os.path.join(directory, os.path.splitext(shard_name(owner))[0] + ".jsonl")
+
+
+def now():
+    return datetime.datetime.now().replace(microsecond=0)
+
+
+@dataclass(slots=True)
+class Stay:
+    """One horse's time in one stall; end is None while it is still there."""
+
+    horse_id: str
+    name: str
+    barn: str
+    stall: int
+    start: datetime.datetime
+    end: datetime.datetime = None
+
+    def to_dict(self):
+        return {"horse": self.horse_id, "name": self.name, "barn": self.barn, "stall": self.stall,
+                "from": self.start.isoformat(), "to": self.end.isoformat() if self.end else None}
+
+
+class IntervalIndex:
+    """Finds the stays that overlap a time range.
+
+    Stays are sorted by start, and a tree over that order holds the latest
+    end within each run of it, so runs that were all over before the range
+    are skipped whole: a query costs O(log n + matches).
+    """
+
+    def __init__(self, stays):
+        self.stays = sorted(stays, key=lambda s: s.start)
+        self.starts = [s.start for s in self.stays]
+        self.size = 1
+        while self.size < len(self.stays):
+            self.size *= 2
+        tree = [datetime.datetime.min] * (2 * self.size)
+        for i, stay in enumerate(self.stays):
+            tree[self.size + i] = stay.end or FOREVER
+        for node in range(self.size - 1, 0, -1):
+            tree[node] = max(tree[2 * node], tree[2 * node + 1])
+        self.tree = tree
+
+    def overlapping(self, start, end):
+        """Stays that began before end and had not ended by start, by start time."""
+        hi = bisect.bisect_left(self.starts, end)
+        found = []
+        stack = [(1, 0, self.size)]  # (node, first stay it covers, stays it covers)
+        while stack:
+            node, lo, width = stack.pop()
+            if lo >= hi or self.tree[node] <= start:
+                continue
+            if width == 1:
+                found.append(self.stays[lo])
+                continue
+            half = width // 2
+            stack.append((2 * node + 1, lo + half, half))
+            stack.append((2 * node, lo, half))
+        return found
+
+
+def _key(barn):
+    return barn.lower()
+
+
+class StallHistory:
+    """One owner's stall history, recording moves as the repository makes them.
+
+    follow() subscribes to a repository. New events wait in pending until
+    save(), or prepare() and commit() (the interface BackgroundWriter
+    uses), append them to the file. The file is read on the first query,
+    so anything handed to prepare() must be committed by then; moves this
+    session makes afterwards are added to what was read, moves other
+    sessions make are not.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pending = []
+        self._stays = None
+        self._open = {}
+        self._by_horse = {}
+        self._by_place = {}  # lowercase barn name, and (that, stall) -> stays
+        self._indexes = {}
+
+    def follow(self, repo):
+        """Record every stall move repo makes from now on."""
+        if not os.path.exists(self.path) and not self.pending:
+            at = now()
+            for horse in repo.iter_horses():
+                if horse.barn:
+                    self._record(at, "in", horse)
+        repo.subscribe(self)
+
+    def horse_changed(self, before, after):
+        was = (before.barn, before.stall) if before is not None and before.barn else None
+        is_now = (after.barn, after.stall) if after is not None and after.barn else None
+        if was == is_now:
+            return
+        at = now()
+        if was:
+            self._record(at, "out", before)
+        if is_now:
+            self._record(at, "in", after)
+
+    def _record(self, at, kind, horse):
+        event = {"at": at.isoformat(), "event": kind, "horse": horse.id, "name": horse.name,
+                 "barn": horse.barn, "stall": horse.stall}
+        self.pending.append(event)
+        if self._stays is not None:
+            self._apply(event)
+
+    # ===============================
+    # WRITING
+    # ===============================
+    def prepare(self):
+        """Take the events recorded since the last call; None if there are none."""
+        events, self.pending = self.pending, []
+        return events or None
+
+    def merge(self, older, newer):
+        return older + newer
+
+    def commit(self, events):
+        """Append events to the file."""
+        text = "".join(json.dumps(e, separators=(",", ":")) + "\n" for e in events)
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with FileLock(self.path + ".lock"), metrics.timer("storage_write"), open(self.path, "a") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        metrics.count("bytes_written", len(text))
+
+    def save(self):
+        events = self.prepare()
+        if events:
+            self.commit(events)
+
+    # ===============================
+    # READING
+    # ===============================
+    def _apply(self, event):
+        at = datetime.datetime.fromisoformat(event["at"])
+        stay = self._open.pop(event["horse"], None)
+        if stay is not None:
+            stay.end = at
+            self._changed(stay)
+        if event["event"] == "in":
+            stay = Stay(event["horse"], event["name"], event["barn"], event["stall"], at)
+            self._open[stay.horse_id] = stay
+            self._stays.append(stay)
+            self._by_horse.setdefault(stay.horse_id, []).append(stay)
+            self._by_place.setdefault(_key(stay.barn), []).append(stay)
+            self._by_place.setdefault((_key(stay.barn), stay.stall), []).append(stay)
+            self._changed(stay)
+
+    def _changed(self, stay):
+        self._indexes.pop(_key(stay.barn), None)
+        self._indexes.pop((_key(stay.barn), stay.stall), None)
+
+    def _load(self):
+        if self._stays is not None:
+            return
+        self._stays = []
+        if os.path.exists(self.path):
+            with metrics.timer("storage_read"), open(self.path, "rb") as f:
+                data = f.read()
+            metrics.count("bytes_read", len(data))
+            # A last line without a newline is still being written; it is left
+            # out. One json.loads() over all lines is faster than one per line.
+            lines = [line for line in data.split(b"\n")[:-1] if line.strip()]
+            for event in json.loads(b"[" + b",".join(lines) + b"]"):
+                self._apply(event)
+        for event in self.pending:
+            self._apply(event)
+        metrics.count("records_scanned", len(self._stays))
+
+    def _index(self, key):
+        index = self._indexes.get(key)
+        if index is None:
+            self._load()
+            index = self._indexes[key] = IntervalIndex(self._by_place.get(key, []))
+        return index
+
+    def stays(self):
+        """Every stay, in the order they began."""
+        self._load()
+        return list(self._stays)
+
+    def stays_of(self, horse_id):
+        """Every stay of one horse, oldest first."""
+        self._load()
+        return list(self._by_horse.get(horse_id, []))
+
+    def occupants(self, barn, stall=None, start=None, end=None):
+        """Stays in a barn, or one stall of it, overlapping [start, end).
+
+        barn is a name, matched ignoring case, so the history of a removed
+        barn can still be looked up. start and end default to all time.
+        """
+        key = (_key(barn), stall) if stall is not None else _key(barn)
+        return self._index(key).overlapping(start or datetime.datetime.min, end or FOREVER)
+
+    def barn_mates(self, horse_id, start=None, end=None):
+        """(stay, shared from, shared until) for every other horse in the same
+        barn as horse_id at the same time within [start, end).
+
+        shared until is None while both horses are still there. Moves
+        between stalls of one barn, by either horse, do not split the time
+        they shared: each mate is listed once for it, with the stay it
+        ended that time in.
+        """
+        start, end = start or datetime.datetime.min, end or FOREVER
+        periods = []  # [barn, from, until] of horse_id's time in each barn
+        for own in self.stays_of(horse_id):
+            if periods and _key(periods[-1][0]) == _key(own.barn) and periods[-1][2] >= own.start:
+                periods[-1][2] = max(periods[-1][2], own.end or FOREVER)
+            else:
+                periods.append([own.barn, own.start, own.end or FOREVER])
+        found, latest = [], {}  # [stay, from, until], and each mate's latest of them
+        for barn, own_start, own_end in periods:
+            lo, hi = max(own_start, start), min(own_end, end)
+            if lo >= hi:
+                continue
+            for other in self.occupants(barn, start=lo, end=hi):
+                if other.horse_id == horse_id:
+                    continue
+                shared_from, until = max(other.start, lo), min(other.end or FOREVER, hi)
+                last = latest.get(other.horse_id)
+                if last and last[2] >= shared_from and _key(last[0].barn) == _key(barn):
+                    last[0], last[2] = other, max(last[2], until)  # the mate changed stalls
+                else:
+                    latest[other.horse_id] = last = [other, shared_from, until]
+                    found.append(last)
+        return [(stay, shared_from, None if until == FOREVER else until) for stay, shared_from, until in found]
@@ -0,0 +1,451 @@
+"""Background jobs for exports and reports, with a persisted job table.
+
+Usage: python -m ranch.jobs [--owner NAME] [--jobs jobs.log]     list jobs
+       python -m ranch.jobs report [--by-barn] [--backend ...]   run the ranch-wide report as a job
+
+A JobQueue runs jobs on a few worker threads, so the menus and the API go
+on answering while a long export is written. Each job loads what it needs
+from storage itself, writes its file under a name no other job uses and
+renames it into place only when it is complete. A job has a kind:
+
+    export   one owner's horse list (params: format, one of ranch.export.FORMATS)
+    report   the ranch-wide report of ranch.report (params: by_barn)
+
+Jobs are kept in an append-only record log (see ranch.storage.RecordLog):
+a line when a job is submitted, starts and ends, and about once a second
+while it runs, with how far it has got. Any session sharing the log sees
+every job. A session holds a lock for as long as it runs jobs; jobs left
+queued or running by a session that is gone are picked up and started
+again by the next queue to open the log.
+"""
+import argparse
+import datetime
+import os
+import re
+import secrets
+import threading
+import time
+from collections import deque
+from dataclasses import asdict, dataclass
+
+from ranch import metrics
+from ranch.locking import FileLock, LockTimeout
+from ranch.storage import RecordLog
+
+JOB = "job"
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+KINDS = ("export", "report")
+
+PROGRESS_ROWS = 1000     # rows exported between progress updates
+PROGRESS_INTERVAL = 1.0  # seconds between progress lines in the log
+KEEP_FINISHED = 100      # finished jobs kept in the table per owner
+
+
+class JobCancelled(Exception):
+    """Raised inside a running job once it has been cancelled."""
+
+
+@dataclass
+class Job:
+    """One job as kept in the table; done and total count rows or owners."""
+
+    id: str
+    owner: str
+    kind: str
+    params: dict
+    state: str = QUEUED
+    created: str = None
+    started: str = None
+    finished: str = None
+    done: int = 0
+    total: int = 0
+    path: str = None
+    error: str = None
+    runner: str = None
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def describe(self):
+        """A one-line summary: kind, state and how far it got."""
+        what = f"{self.kind} {self.params.get('format', '')}".strip()
+        if self.state == RUNNING:
+            progress = f" {self.done} of {self.total}" if self.total else ""
+            return f"{what}: running{progress}"
+        if self.state == DONE:
+            return f"{what}: done, {self.path}"
+        if self.state == FAILED:
+            return f"{what}: failed, {self.error}"
+        return f"{what}: {self.state}"
+
+
+def _now():
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def _slug(text):
+    return re.sub(r"[^A-Za-z0-9_-]+", "_", text).strip("_")[:40] or "owner"
+
+
+def output_path(directory, job, ext):
+    """A file name for job's output that no other job can have."""
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    name = "ranch-report" if job.kind == "report" else f"{_slug(job.owner)}-horses"
+    return os.path.join(directory, f"{name}-{stamp}-{job.id}.{ext}")
+
+
+# ===============================
+# RUNNERS
+# ===============================
+def run_export(job, storage_args, directory, progress):
+    """Write job.owner's horses to a new file; returns its path."""
+    from ranch.export import FORMATS, export_horses
+    from ranch.storage import open_storage
+    fmt = job.params.get("format", "docx")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}'. Use one of: {', '.join(FORMATS)}.")
+    storage = open_storage(*storage_args)
+    try:
+        horses, _ = storage.load(job.owner)
+    finally:
+        storage.close()
+    path = output_path(directory, job, fmt)
+    part = f"{os.path.splitext(path)[0]}.part.{fmt}"  # export_horses goes by the extension
+
+    def rows():
+        for count, horse in enumerate(horses, 1):
+            if count % PROGRESS_ROWS == 0:
+                progress(count, len(horses))
+            yield horse
+
+    progress(0, len(horses))
+    try:
+        export_horses(rows(), part)
+        os.replace(part, path)
+    finally:
+        if os.path.exists(part):
+            os.remove(part)
+    progress(len(horses), len(horses))
+    return path
+
+
+def run_report(job, storage_args, directory, progress):
+    """Write the ranch-wide report to a new text file; returns its path."""
+    from ranch.locking import atomic_write
+    from ranch.report import collect, format_report
+    totals = collect(storage_args, job.params.get("workers"), progress)
+    path = output_path(directory, job, "txt")
+    atomic_write(path, "\n".join(format_report(totals, job.params.get("by_barn", False))) + "\n")
+    return path
+
+
+RUNNERS = {"export": run_export, "report": run_report}
+
+
+# ===============================
+# QUEUE
+# ===============================
+class JobQueue:
+    """Runs submitted jobs on worker threads and keeps the job table.
+
+    storage_args are the arguments of ranch.storage.open_storage(); every
+    job opens a storage of its own, so a job never touches a repository a
+    session is changing. Jobs that finish are kept for take_finished(), the
+    way BackgroundWriter keeps errors for take_errors(). close() stops the
+    workers after the running jobs end; jobs still queued stay in the table
+    for the next queue. With resume=False the queue leaves jobs of sessions
+    that are gone alone.
+    """
+
+    def __init__(self, path, storage_args, directory="exports", workers=2, resume=True, compact_min=1000):
+        self.log = RecordLog(path)
+        self.storage_args = storage_args
+        self.directory = directory
+        self.compact_min = compact_min
+        self.runner = f"{os.getpid()}-{secrets.token_hex(4)}"
+        self._alive = FileLock(self._runner_lock(self.runner), timeout=0)
+        self._alive.__enter__()
+        self._cond = threading.Condition()
+        self._jobs = {}      # id -> Job submitted or claimed by this queue
+        self._versions = {}  # (JOB, id) -> log version, for RecordLog.commit
+        self._saved = {}     # id -> time its progress was last written
+        self._cancel = set()
+        self._waiting = deque()
+        self._finished = []
+        self._closed = False
+        with self.log.lock():
+            self.log.replay()
+            if resume:
+                self._claim_orphans()
+        self._threads = [threading.Thread(target=self._work, name=f"ranch-job-{n}", daemon=True)
+                         for n in range(workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def _runner_lock(self, runner):
+        return f"{self.log.path}.{runner}.lock"
+
+    def _gone(self, runner):
+        # A runner is gone when nobody holds its lock any more.
+        try:
+            with FileLock(self._runner_lock(runner), timeout=0):
+                pass
+        except LockTimeout:
+            return False
+        os.remove(self._runner_lock(runner))
+        return True
+
+    def _claim_orphans(self):
+        """Take over the unfinished jobs of runners that are gone; the caller holds the log lock.
+
+        The lock files of runners that are gone are removed, whether they
+        left jobs or not.
+        """
+        prefix = os.path.basename(self.log.path) + "."
+        runners = [name[len(prefix):-len(".lock")] for name in os.listdir(os.path.dirname(self.log.path) or ".")
+                   if name.startswith(prefix) and name.endswith(".lock") and name != prefix + "lock"]
+        gone = {r: self._gone(r) for r in runners if r != self.runner}
+        claimed = []
+        for entry in list(self.log.entries()):
+            job = Job.from_dict(entry["data"])
+            if job.state in FINISHED or job.runner == self.runner:
+                continue
+            if job.runner not in gone:
+                gone[job.runner] = job.runner is None or self._gone(job.runner)
+            if gone[job.runner]:
+                job.state, job.done, job.total, job.started, job.runner = QUEUED, 0, 0, None, self.runner
+                self._versions[(JOB, job.id)] = entry.get("version", 0)
+                claimed.append(job)
+        conflicts = self.log.commit([self._entry(j) for j in claimed], self._versions)
+        lost = {e["id"] for e in conflicts}
+        for job in claimed:
+            if job.id not in lost:
+                self._jobs[job.id] = job
+                self._waiting.append(job)
+
+    @staticmethod
+    def _entry(job):
+        return {"op": "put", "kind": JOB, "id": job.id, "owner": job.owner, "data": job.to_dict()}
+
+    def _write(self, jobs, removed=()):
+        """Write jobs and remove finished ones from the table; the caller holds self._cond.
+
+        A job another session changed first (claimed it as an orphan, or
+        removed it) is dropped from this queue, as _claim_orphans() drops
+        the jobs it loses: get() then answers from the table, and a running
+        one is stopped at its next progress report.
+        """
+        entries = [self._entry(j) for j in jobs]
+        entries += [{"op": "del", "kind": JOB, "id": j.id, "owner": j.owner} for j in removed]
+        with self.log.lock():
+            conflicts = self.log.commit(entries, self._versions)
+            if self.log.garbage() > max(self.compact_min, len(self.log.live)):
+                self.log.compact()
+        for entry in conflicts:
+            self._versions.pop((JOB, entry["id"]), None)
+            job = self._jobs.pop(entry["id"], None)
+            if job is None:
+                continue
+            if job in self._waiting:
+                self._waiting.remove(job)
+            elif job.state == RUNNING:
+                self._cancel.add(job.id)
+
+    # ===============================
+    # SUBMITTING AND WATCHING
+    # ===============================
+    def submit(self, owner, kind, **params):
+        """Queue a job and return it; raises ValueError for an unknown kind."""
+        if kind not in RUNNERS:
+            raise ValueError(f"Unknown job kind '{kind}'. Use one of: {', '.join(KINDS)}.")
+        job = Job(secrets.token_hex(4), owner, kind, params, created=_now(), runner=self.runner)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("The job queue is closed.")
+            self._jobs[job.id] = job
+            self._write([job])
+            self._waiting.append(job)
+            self._cond.notify_all()
+        metrics.count("jobs_submitted")
+        return job
+
+    def get(self, job_id):
+        """A copy of the job, as this queue knows it or as the table has it; None if unknown."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return Job.from_dict(job.to_dict())
+            with self.log.lock():
+                self.log.catch_up()
+            entry = self.log.get((JOB, job_id))
+            return Job.from_dict(entry["data"]) if entry else None
+
+    def jobs(self, owner=None):
+        """Copies of every job in the table (or owner's), newest first."""
+        with self._cond:
+            with self.log.lock():
+                self.log.catch_up()
+            found = {e["id"]: Job.from_dict(e["data"]) for e in self.log.entries()
+                     if owner is None or e["owner"] == owner}
+            for job in self._jobs.values():
+                if owner is None or job.owner == owner:
+                    found[job.id] = Job.from_dict(job.to_dict())
+        return sorted(found.values(), key=lambda j: (j.created or "", j.id), reverse=True)
+
+    def wait(self, job_id, done=None, timeout=None):
+        """Wait until the job finishes or its progress passes done; returns get(job_id).
+
+        Jobs another session runs are only seen as the table is written,
+        about once a second.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job.state in FINISHED or (done is not None and job.done != done):
+                return job
+            left = None if deadline is None else deadline - time.monotonic()
+            if left is not None and left <= 0:
+                return job
+            with self._cond:
+                self._cond.wait(min(left, PROGRESS_INTERVAL) if left is not None else PROGRESS_INTERVAL)
+
+    def cancel(self, job_id):
+        """Cancel a job this queue runs; returns False if it is not queued or running here."""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.state in FINISHED:
+                return False
+            if job.state == QUEUED:
+                self._waiting.remove(job)
+                self._finish(job, CANCELLED)
+            else:
+                self._cancel.add(job_id)
+            return True
+
+    def idle(self):
+        """True when this queue is running no job."""
+        with self._cond:
+            return not any(j.state == RUNNING for j in self._jobs.values())
+
+    def take_finished(self, owner=None):
+        """Jobs of this queue (or owner's) that ended since the last call, oldest first."""
+        with self._cond:
+            taken = [j for j in self._finished if owner is None or j.owner == owner]
+            self._finished = [j for j in self._finished if j not in taken]
+            return [Job.from_dict(j.to_dict()) for j in taken]
+
+    def close(self):
+        """Let running jobs end and stop the workers; queued jobs wait for the next queue."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._alive.__exit__(None, None, None)
+        os.remove(self._alive.path)
+
+    # ===============================
+    # WORKER THREADS
+    # ===============================
+    def _next(self):
+        with self._cond:
+            while True:
+                while not self._waiting and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return None
+                job = self._waiting.popleft()
+                job.state, job.started = RUNNING, _now()
+                self._write([job])
+                self._cond.notify_all()
+                if job.id in self._jobs:
+                    self._saved[job.id] = time.monotonic()
+                    return job
+                self._cancel.discard(job.id)  # another session took it first
+
+    def _progress(self, job, done, total):
+        with self._cond:
+            if job.id in self._cancel:
+                raise JobCancelled()
+            job.done, job.total = done, total
+            if time.monotonic() - self._saved[job.id] >= PROGRESS_INTERVAL:
+                self._write([job])
+                self._saved[job.id] = time.monotonic()
+            self._cond.notify_all()
+
+    def _finish(self, job, state, path=None, error=None):
+        # The caller holds self._cond.
+        self._cancel.discard(job.id)
+        self._saved.pop(job.id, None)
+        if job.id not in self._jobs:
+            self._cond.notify_all()
+            return  # another session took it over; the table has its state
+        job.state, job.finished, job.path, job.error = state, _now(), path, error
+        done = sorted((j for j in self.jobs(job.owner) if j.state in FINISHED and j.id != job.id),
+                      key=lambda j: (j.finished or "", j.id), reverse=True)
+        self._write([job], removed=[j for j in done[KEEP_FINISHED - 1:] if (JOB, j.id) in self.log.live])
+        self._finished.append(job)
+        self._cond.notify_all()
+
+    def _work(self):
+        while True:
+            job = self._next()
+            if job is None:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            try:
+                with metrics.timer(f"job_{job.kind}"):
+                    path = RUNNERS[job.kind](job, self.storage_args, self.directory,
+                                             lambda done, total: self._progress(job, done, total))
+                result = (DONE, path, None)
+            except JobCancelled:
+                result = (CANCELLED, None, None)
+            except Exception as e:  # reported through the job
+                result = (FAILED, None, str(e) or type(e).__name__)
+            with self._cond:
+                self._finish(job, *result)
+
+
+# ===============================
+# COMMAND LINE
+# ===============================
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List background jobs, or run the ranch-wide report as one.")
+    parser.add_argument("command", nargs="?", default="list", choices=("list", "report"))
+    parser.add_argument("--owner", help="only this owner's jobs")
+    parser.add_argument("--by-barn", action="store_true", help="report every barn, not just the fullest")
+    parser.add_argument("--jobs", default="jobs.log", help="the job table")
+    parser.add_argument("--output-dir", default="exports", help="where job output is written")
+    parser.add_argument("--backend", default="sharded", choices=("sharded", "log", "json"))
+    parser.add_argument("--data-dir", default="ranch_data", help="directory of the sharded backend")
+    parser.add_argument("--horses", default="horses.json", help="horses file of the json backend")
+    parser.add_argument("--barns", default="barns.json", help="barns file of the json backend")
+    parser.add_argument("--log", default="ranch.log", help="change log of the log backend")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        log = RecordLog(args.jobs)
+        jobs = [Job.from_dict(e["data"]) for e in log.replay().values() if args.owner in (None, e["owner"])]
+        for job in sorted(jobs, key=lambda j: (j.created or "", j.id), reverse=True):
+            print(f"{job.id}  {job.created}  {job.owner}  {job.describe()}")
+        return 0
+    queue = JobQueue(args.jobs, (args.backend, args.horses, args.barns, args.log, args.data_dir),
+                     args.output_dir, workers=1, resume=False)
+    try:
+        job = queue.submit(args.owner or "manager", "report", by_barn=args.by_barn)
+        while job.state not in FINISHED:
+            job = queue.wait(job.id, job.done)
+            print(f"\r{job.describe()}", end="", flush=True)
+        print()
+        return 0 if job.state == DONE else 1
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
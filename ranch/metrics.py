@@ -0,0 +1,166 @@
+"""Opt-in timings and counters for the hot paths, and a cProfile switch.
+
+Set HORSERANCH_METRICS to a file name to record how long loads, saves,
+stall assignments, exports and searches take, broken down into storage
+reads (JSON parsing), filtering, diffing and disk writes, along with bytes
+read and written and records scanned. The file is written when the program
+exits: Prometheus text format, or JSON if the name ends in ".json".
+
+Set HORSERANCH_PROFILE to a file name to run the whole program under
+cProfile and write the stats there on exit (read them with pstats or
+snakeviz).
+
+When metrics are off, timer() hands back a shared do-nothing object and
+timed() and count() cost a single flag check. When they are on, updates
+and reads take a lock, as the background writer, job workers and thread
+pool record from their own threads.
+"""
+import atexit
+import functools
+import os
+import threading
+import time
+
+ENABLED = False
+timings = {}   # name -> [calls, total seconds, slowest call]
+counters = {}  # name -> total
+_lock = threading.Lock()  # guards timings and counters
+_profiler = None
+
+
+def enable(metrics_path=None, profile_path=None):
+    """Start recording metrics and/or profiling; results are written at exit."""
+    global ENABLED, _profiler
+    if metrics_path:
+        ENABLED = True
+        atexit.register(dump, metrics_path)
+    if profile_path and _profiler is None:
+        import cProfile
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+        atexit.register(_write_profile, profile_path)
+
+
+def reset():
+    with _lock:
+        timings.clear()
+        counters.clear()
+
+
+def record(name, seconds):
+    with _lock:
+        entry = timings.get(name)
+        if entry is None:
+            timings[name] = [1, seconds, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+            if seconds > entry[2]:
+                entry[2] = seconds
+
+
+def count(name, value=1):
+    """Add value to the counter name."""
+    if ENABLED:
+        with _lock:
+            counters[name] = counters.get(name, 0) + value
+
+
+def _copies():
+    """(timings, counters) as they are now, sorted by name, for output."""
+    with _lock:
+        return sorted((name, tuple(entry)) for name, entry in timings.items()), sorted(counters.items())
+
+
+class _Timer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+
+
+class _NoTimer:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+def timer(name):
+    """Context manager that times its block under name."""
+    return _Timer(name) if ENABLED else _NO_TIMER
+
+
+def timed(name):
+    """Decorator that times every call of a function under name."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+# ===============================
+# OUTPUT
+# ===============================
+def prometheus_text():
+    timed_ops, counted = _copies()
+    lines = ["# HELP horseranch_duration_seconds Wall time of instrumented operations.",
+             "# TYPE horseranch_duration_seconds summary"]
+    for name, (calls, total, _) in timed_ops:
+        lines.append(f'horseranch_duration_seconds_count{{op="{name}"}} {calls}')
+        lines.append(f'horseranch_duration_seconds_sum{{op="{name}"}} {total:.6f}')
+    lines += ["# HELP horseranch_duration_seconds_max Slowest single call of each operation.",
+              "# TYPE horseranch_duration_seconds_max gauge"]
+    for name, (_, _, slowest) in timed_ops:
+        lines.append(f'horseranch_duration_seconds_max{{op="{name}"}} {slowest:.6f}')
+    for name, value in counted:
+        metric = f"horseranch_{name}_total"
+        lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+    return "\n".join(lines) + "\n"
+
+
+def as_dict():
+    timed_ops, counted = _copies()
+    return {
+        "timings": {name: {"calls": calls, "seconds": total, "max_seconds": slowest}
+                    for name, (calls, total, slowest) in timed_ops},
+        "counters": dict(counted),
+    }
+
+
+def dump(path):
+    """Write the metrics to path: JSON for a .json name, Prometheus text otherwise."""
+    import json
+    from ranch.locking import atomic_write
+    text = json.dumps(as_dict(), indent=2) if path.endswith(".json") else prometheus_text()
+    atomic_write(path, text)
+
+
+def _write_profile(path):
+    _profiler.disable()
+    _profiler.dump_stats(path)
+
+
+if os.environ.get("HORSERANCH_METRICS") or os.environ.get("HORSERANCH_PROFILE"):
+    enable(os.environ.get("HORSERANCH_METRICS"), os.environ.get("HORSERANCH_PROFILE"))
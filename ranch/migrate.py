@@ -0,0 +1,90 @@
+"""Convert horses.json/barns.json (or ranch.log) into per-owner shards.
+
+Usage: python -m ranch.migrate [--data-dir DIR] [--horses FILE] [--barns FILE] [--log FILE] [--force]
+
+A data directory that already has a manifest is left alone unless --force
+is given: its shards hold everything written since the migration, which
+migrating again would replace with the legacy files' older records.
+"""
+import argparse
+import os
+
+from ranch.locking import FileLock
+from ranch.storage import (BARN, HORSE, MANIFEST_FILE, RECORD_TYPES, ShardedStorage, SnapshotLog, put_entry,
+                           read_legacy_records, shard_name)
+
+
+def read_legacy(horses_file, barns_file, log_file):
+    """Return every owner's (horses, barns) from the old single-file layouts.
+
+    The append-only log is preferred when it exists since it is newer
+    than the JSON files it was imported from.
+    """
+    if log_file and os.path.exists(log_file):
+        log = SnapshotLog(log_file)
+        log.replay()
+        records = [RECORD_TYPES[e["kind"]].from_dict(e["data"]) for e in log.entries()]
+        return ([r for r in records if isinstance(r, RECORD_TYPES[HORSE])],
+                [r for r in records if isinstance(r, RECORD_TYPES[BARN])])
+    return read_legacy_records(horses_file, barns_file)
+
+
+def migrate(data_dir, horses_file, barns_file, log_file=None, force=False):
+    """Write one shard per owner under data_dir and then the manifest.
+
+    The manifest is written last, so an interrupted run leaves no manifest
+    and can simply be repeated. Once there is one, FileExistsError is
+    raised unless force is set. Returns the number of owners migrated.
+    """
+    if not force and os.path.exists(os.path.join(data_dir, MANIFEST_FILE)):
+        raise FileExistsError(f"'{data_dir}' has already been migrated; migrating again would overwrite "
+                              f"its shards with the older legacy records. Use --force to do it anyway.")
+    horses, barns = read_legacy(horses_file, barns_file, log_file)
+    by_owner = {}
+    for kind, records in ((HORSE, horses), (BARN, barns)):
+        for record in records:
+            by_owner.setdefault(record.owner, []).append(put_entry(kind, record, record.owner))
+
+    store = ShardedStorage(data_dir)
+    os.makedirs(data_dir, exist_ok=True)
+    for owner, entries in by_owner.items():
+        if owner is None:
+            continue
+        log = SnapshotLog(os.path.join(data_dir, shard_name(owner)))
+        for entry in entries:
+            entry.setdefault("version", 1)
+        log.live = {(e["kind"], e["id"]): e for e in entries}
+        with log.lock():
+            log.compact()
+        store.manifest["owners"][owner] = {
+            "shard": os.path.basename(log.path),
+            "horses": sum(1 for e in entries if e["kind"] == HORSE),
+            "barns": sum(1 for e in entries if e["kind"] == BARN),
+        }
+    with FileLock(store.manifest_path + ".lock"):
+        store.write_manifest()
+    return len(store.manifest["owners"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Split ranch data into per-owner shards.")
+    parser.add_argument("--data-dir", default="ranch_data", help="directory for the shards and manifest")
+    parser.add_argument("--horses", default="horses.json", help="legacy horses file")
+    parser.add_argument("--barns", default="barns.json", help="legacy barns file")
+    parser.add_argument("--log", default="ranch.log", help="append-only log written by the 'log' backend")
+    parser.add_argument("--force", action="store_true",
+                        help="migrate even if the data directory already has a manifest, replacing its shards")
+    args = parser.parse_args(argv)
+    os.makedirs(args.data_dir, exist_ok=True)
+    try:
+        with FileLock(os.path.join(args.data_dir, "migrate.lock")):  # as open_storage() takes it
+            owners = migrate(args.data_dir, args.horses, args.barns, args.log, args.force)
+    except FileExistsError as e:
+        print(e)
+        return 1
+    print(f"Migrated {owners} owner(s) into '{args.data_dir}'.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
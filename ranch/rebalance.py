@@ -0,0 +1,545 @@
+"""Barn rebalancing: a plan of few horse moves that meets capacity and placement rules.
+
+Usage: python -m ranch.rebalance --owner NAME [--close BARN] [--together A,B] [--apart A,B]
+                                 [--allergies] [--place-unassigned] [--apply] [--data-dir DIR]
+
+The rules (see Rules) are:
+
+    close             barns that must end up empty
+    together          groups of horses that must share a barn
+    apart             groups of horses no two of which may share a barn
+    allergies         no horse shares a barn with one fed a hay it is allergic to
+    place_unassigned  also find stalls for horses that are in no barn
+
+Along with them every barn must fit its horses in its stalls.
+plan_rebalance() works out the moves without changing anything and
+apply_plan() makes all of them or none. A horse that stays in its barn
+keeps its stall; one that moves gets the lowest free stall of its new barn.
+
+Keep-together groups are handled as one unit, and a unit costs one move
+per horse not already in the barn it ends up in. Every unit starts in the
+barn holding most of it. Barns that break a rule then shed units: for a
+conflict, the unit in the most conflicts per horse moved goes first, and
+for capacity, the cheapest units that free enough stalls. The shed units
+go, largest first, to the barn where they cost the fewest moves, then to
+the fullest barn they fit (best fit). A unit that fits nowhere pushes the
+fewest horses it can out of some barn, and they are queued to be placed
+in turn (an ejection chain, with a limit so it always ends). Finally,
+moved units go back towards their own barns wherever there is now room.
+
+With capacity and closures alone the number of moves is the minimum.
+Conflicts make the problem NP-hard in general, so the plan is then a
+greedy one. benchmarks/bench_rebalance.py compares it with a lower bound.
+"""
+import argparse
+from collections import Counter, deque, namedtuple
+from dataclasses import dataclass, field
+
+from ranch import metrics
+from ranch.stalls import FreeStalls
+
+PUSH_LIMIT = 3    # times one unit may be pushed out of a barn
+EJECT_TRIES = 20  # barns looked at in full for each push
+
+Move = namedtuple("Move", "horse from_barn from_stall to_barn to_stall")
+
+
+class RebalanceError(ValueError):
+    """Raised when the rules cannot be met or the plan no longer applies; nothing has changed."""
+
+
+@dataclass
+class Rules:
+    """What a rebalanced ranch must look like; horses and barns are given by name."""
+
+    close: list = field(default_factory=list)
+    together: list = field(default_factory=list)  # lists of horse names
+    apart: list = field(default_factory=list)     # lists of horse names
+    allergies: bool = False
+    place_unassigned: bool = False
+
+
+@dataclass
+class Plan:
+    """The moves of a rebalance, what was wrong before it and each barn's count before and after."""
+
+    moves: list
+    broken: list    # lines describing the rule breaks found
+    barns: list     # [barn name, stalls, horses before, horses after, closed]
+    lower_bound: int = 0  # no plan can make fewer moves than this
+
+
+def _words(text):
+    text = (text or "").strip().lower()
+    return {text, *text.split()} if text else set()
+
+
+def _allergies(horse):
+    return {a.strip().lower() for a in horse.allergies} - {""}
+
+
+def _hays(horse):
+    return _words(horse.breakfast_hay) | _words(horse.lunch_hay) | _words(horse.dinner_hay)
+
+
+class _Unit:
+    """One horse, or a keep-together group, placed as a whole."""
+
+    __slots__ = ("horses", "size", "at", "home", "allergies", "hays", "apart", "barn", "pushed_by",
+                 "pushes")
+
+    def __init__(self, horses, repo, apart_of, allergies):
+        self.horses = horses
+        self.size = len(horses)
+        self.at = Counter(b.id for b in map(repo.barn_of, horses) if b is not None)
+        self.home = max(self.at, key=self.at.get) if self.at else None
+        self.allergies = set()
+        self.hays = set()
+        if allergies:
+            for horse in horses:
+                self.allergies |= _allergies(horse)
+                self.hays |= _hays(horse)
+        self.apart = set()
+        for horse in horses:
+            for group in apart_of.get(horse.id, ()):
+                if group in self.apart:
+                    raise RebalanceError(f"Horses of keep-apart group {group + 1} must also be kept together.")
+                self.apart.add(group)
+        self.barn = None
+        self.pushed_by = None
+        self.pushes = 0
+
+    def name(self):
+        return " + ".join(h.name for h in self.horses)
+
+    def cost(self, barn):
+        return self.size - self.at.get(barn.barn.id, 0)
+
+
+def _clash(a, b):
+    return bool(a.allergies & b.hays or b.allergies & a.hays or a.apart & b.apart)
+
+
+class _Barn:
+    __slots__ = ("barn", "closed", "room", "units", "allergies", "hays", "apart")
+
+    def __init__(self, barn, closed):
+        self.barn = barn
+        self.closed = closed
+        self.room = barn.stalls
+        self.units = {}  # unit -> None, a set in a stable order
+        self.allergies = Counter()
+        self.hays = Counter()
+        self.apart = Counter()
+
+    def add(self, unit):
+        unit.barn = self
+        self.units[unit] = None
+        self.room -= unit.size
+        self.allergies.update(unit.allergies)
+        self.hays.update(unit.hays)
+        self.apart.update(unit.apart)
+
+    def remove(self, unit):
+        unit.barn = None
+        self.units.pop(unit, None)
+        self.room += unit.size
+        self.allergies.subtract(unit.allergies)
+        self.hays.subtract(unit.hays)
+        self.apart.subtract(unit.apart)
+
+    def clashes(self, unit):
+        """True if unit, which is not in this barn, breaks a rule with anything that is."""
+        return (any(self.hays[w] for w in unit.allergies) or any(self.allergies[w] for w in unit.hays)
+                or any(self.apart[g] for g in unit.apart))
+
+    def takes(self, unit):
+        return not self.closed and self.room >= unit.size and not self.clashes(unit)
+
+
+# ===============================
+# PLANNING
+# ===============================
+def _find(repo, name):
+    horse = repo.horse_named(name.strip())
+    if horse is None:
+        raise RebalanceError(f"Horse '{name.strip()}' not found.")
+    return horse
+
+
+def _units(repo, rules):
+    """The units to place: keep-together groups merged where they overlap, and single horses."""
+    parent = {}
+
+    def root(hid):
+        while parent.setdefault(hid, hid) != hid:
+            parent[hid] = hid = parent[parent[hid]]
+        return hid
+
+    for names in rules.together:
+        horses = [_find(repo, n) for n in names]
+        for horse in horses[1:]:
+            parent[root(horse.id)] = root(horses[0].id)
+    apart_of = {}
+    for group, names in enumerate(rules.apart):
+        for name in names:
+            apart_of.setdefault(_find(repo, name).id, set()).add(group)
+
+    grouped = {}
+    for horse in repo.iter_horses():
+        if horse.id in parent:
+            grouped.setdefault(root(horse.id), []).append(horse)
+        elif repo.barn_of(horse) is not None or rules.place_unassigned:
+            grouped[horse.id] = [horse]
+    units = [_Unit(horses, repo, apart_of, rules.allergies) for horses in grouped.values()]
+    if rules.allergies:
+        for unit in units:
+            for a in unit.horses if unit.size > 1 else ():
+                for b in unit.horses:
+                    if b is not a and _allergies(a) & _hays(b):
+                        raise RebalanceError(f"{unit.name()} must share a barn, but '{b.name}' is fed "
+                                             f"a hay '{a.name}' is allergic to.")
+    return units
+
+
+def _shed(barn, broken):
+    """Take units out of barn until it breaks no rule; returns them."""
+    if barn.closed:
+        shed = list(barn.units)
+        for unit in shed:
+            barn.remove(unit)
+        return shed
+    shed = []
+    conflicts = {u: set() for u in barn.units}
+    checked = [u for u in barn.units if u.allergies or u.apart]
+    for unit in checked:
+        for other in barn.units:
+            if other is not unit and _clash(unit, other):
+                conflicts[unit].add(other)
+                conflicts[other].add(unit)
+    pairs = sum(map(len, conflicts.values())) // 2
+    if pairs:
+        broken.append(f"Barn '{barn.barn.barn_name}' has {pairs} pair(s) of horses that may not share it.")
+    while True:
+        worst = max(conflicts, key=lambda u: (len(conflicts[u]) / max(u.at.get(barn.barn.id, 0), 1), -u.size),
+                    default=None)
+        if worst is None or not conflicts[worst]:
+            break
+        for other in conflicts.pop(worst):
+            conflicts[other].discard(worst)
+        barn.remove(worst)
+        shed.append(worst)
+    if barn.room < 0:
+        broken.append(f"Barn '{barn.barn.barn_name}' holds {barn.barn.stalls - barn.room} horses "
+                      f"in {barn.barn.stalls} stalls.")
+    bid = barn.barn.id
+    while barn.room < 0:
+        covering = [u for u in barn.units if u.size >= -barn.room]
+        if covering:
+            unit = min(covering, key=lambda u: (u.at.get(bid, 0), u.size))
+        else:
+            unit = max(barn.units, key=lambda u: (u.size / max(u.at.get(bid, 0), 1), u.size))
+        barn.remove(unit)
+        shed.append(unit)
+    return shed
+
+
+def _best_barn(unit, barns, exclude=None):
+    """The open barn that takes unit for the fewest moves; None if none does.
+
+    Ties go to the barn with most horses sharing unit's allergies, so they
+    gather in a few barns rather than keeping hay out of all of them, and
+    then to the fullest.
+    """
+    best, best_key = None, None
+    for barn in barns:
+        if barn is exclude or barn.room < unit.size or not barn.takes(unit):
+            continue
+        key = (unit.cost(barn), -sum(barn.allergies[w] for w in unit.allergies), barn.room)
+        if best_key is None or key < best_key:
+            best, best_key = barn, key
+    return best
+
+
+def _make_room(unit, barns):
+    """The barn that takes unit after pushing out the fewest horses, and the units pushed.
+
+    Barns are ranked by how many residents clash with unit, counted from
+    their word counters with those that are hard to place again first, and
+    the best EJECT_TRIES are looked at in full. The
+    unit that pushed unit out is never pushed back, nor is one already pushed
+    PUSH_LIMIT times. (None, None) if no barn can take it at all.
+    """
+    def estimate(barn):
+        # Residents allergic to what unit eats or kept apart from it are hard
+        # to place again; those that only eat what unit is allergic to are not.
+        hard = sum(barn.allergies[w] for w in unit.hays) + sum(barn.apart[g] for g in unit.apart)
+        return hard, hard + sum(barn.hays[w] for w in unit.allergies) + max(0, unit.size - barn.room)
+
+    open_barns = [b for b in barns if not b.closed and b.barn.stalls >= unit.size]
+    best, best_key = (None, None), None
+    for barn in sorted(open_barns, key=estimate)[:EJECT_TRIES]:
+        blockers = [u for u in barn.units if _clash(unit, u)]
+        if any(u is unit.pushed_by or u.pushes >= PUSH_LIMIT for u in blockers):
+            continue
+        room = barn.room + sum(u.size for u in blockers)
+        if room < unit.size:
+            rest = sorted((u for u in barn.units
+                           if u not in blockers and u is not unit.pushed_by and u.pushes < PUSH_LIMIT),
+                          key=lambda u: (u.at.get(barn.barn.id, 0), u.size))
+            for other in rest:
+                if room >= unit.size:
+                    break
+                blockers.append(other)
+                room += other.size
+        if room < unit.size:
+            continue
+        # Units with rules of their own are hard to place again, so push them last.
+        key = (sum(u.size for u in blockers if u.allergies or u.apart), sum(u.size for u in blockers),
+               sum(u.at.get(barn.barn.id, 0) for u in blockers), unit.cost(barn))
+        if best_key is None or key < best_key:
+            best, best_key = (barn, blockers), key
+    return best
+
+
+def _place(pending, barns):
+    """Place every pending unit, pushing others out where none fits; returns the units left over.
+
+    Pushed units go back in the queue. No unit is pushed out more than
+    PUSH_LIMIT times, so units that keep pushing each other out end up left
+    over instead of going round for ever.
+    """
+    queue = deque(pending)
+    failed = []
+    while queue:
+        unit = queue.popleft()
+        barn = _best_barn(unit, barns)
+        if barn is None:
+            barn, blockers = _make_room(unit, barns)
+            if barn is not None:
+                for other in blockers:
+                    barn.remove(other)
+                    other.pushed_by = unit
+                    other.pushes += 1
+                queue.extend(blockers)
+        if barn is None:
+            failed.append(unit)
+        else:
+            barn.add(unit)
+    return failed
+
+
+def _lower_bound(units, barns):
+    """Moves no plan can avoid.
+
+    Each unit moves every horse outside the open barn holding most of it,
+    and each barn loses every horse when closing or its excess when over
+    capacity; the larger of the two counts is a bound.
+    """
+    grouped = sum(u.size - max((n for bid, n in u.at.items() if not barns[bid].closed), default=0)
+                  for u in units)
+    placed = sum(u.size - sum(u.at.values()) for u in units)  # horses in no barn
+    held = Counter()
+    for unit in units:
+        held.update(unit.at)
+    leaving = sum(n if barns[bid].closed else max(0, n - barns[bid].barn.stalls) for bid, n in held.items())
+    return max(grouped, leaving + placed)
+
+
+@metrics.timed("rebalance_plan")
+def plan_rebalance(repo, rules):
+    """Work out the moves that make repo meet rules; repo is not changed.
+
+    Raises RebalanceError when a named horse or barn does not exist or no
+    placement meeting the rules was found for some horses.
+    """
+    closing = set()
+    for name in rules.close:
+        barn = repo.barn_named(name.strip())
+        if barn is None:
+            raise RebalanceError(f"Barn '{name.strip()}' not found.")
+        closing.add(barn.id)
+    barns = {b.id: _Barn(b, b.id in closing) for b in repo.barns}
+    units = _units(repo, rules)
+    for unit in units:
+        if unit.home is not None:
+            barns[unit.home].add(unit)
+    order = list(barns.values())
+
+    broken = []
+    in_closed = sum(u.at.get(b, 0) for u in units for b in closing)
+    if in_closed:
+        broken.append(f"{in_closed} horse(s) are in barns being closed.")
+    split = sum(1 for u in units if u.size > 1 and (len(u.at) > 1 or sum(u.at.values()) < u.size))
+    if split:
+        broken.append(f"{split} keep-together group(s) are split up or not all stabled.")
+    unassigned = [u for u in units if u.home is None]
+    if unassigned:
+        broken.append(f"{sum(u.size for u in unassigned)} horse(s) are in no barn.")
+    bound = _lower_bound(units, barns)
+
+    pending = unassigned
+    for barn in order:
+        pending += _shed(barn, broken)
+    pending.sort(key=lambda u: (-u.size, -len(u.allergies) - len(u.apart)))
+    failed = _place(pending, order)
+    if failed:
+        free = sum(b.room for b in order if not b.closed)
+        names = ", ".join(u.name() for u in failed[:5]) + (" ..." if len(failed) > 5 else "")
+        raise RebalanceError(f"No barn meeting the rules has room for {sum(u.size for u in failed)} horse(s) "
+                             f"({names}); {free} stall(s) are free in open barns.")
+
+    _return_home(units, barns)
+    return Plan(_moves(repo, units), broken, _capacity(repo, barns), bound)
+
+
+def _return_home(units, barns):
+    """Move units back towards the barn holding most of them wherever that is now allowed."""
+    changed = True
+    while changed:
+        changed = False
+        for unit in units:
+            if unit.barn is None:
+                continue
+            current = unit.cost(unit.barn)
+            for bid, _ in unit.at.most_common():
+                barn = barns[bid]
+                if barn is unit.barn or unit.cost(barn) >= current:
+                    continue
+                if barn.takes(unit):
+                    unit.barn.remove(unit)
+                    barn.add(unit)
+                    changed = True
+                    break
+
+
+def _moves(repo, units):
+    staying = {}
+    movers = {}
+    for unit in units:
+        target = unit.barn.barn
+        for horse in unit.horses:
+            now = repo.barn_of(horse)
+            if now is not None and now.id == target.id:
+                staying.setdefault(target.id, []).append(horse.stall)
+            else:
+                movers.setdefault(target.id, (target, []))[1].append(horse)
+    moves = []
+    for barn_id, (barn, horses) in movers.items():
+        free = FreeStalls(barn.stalls, staying.get(barn_id, ()))
+        for horse in horses:
+            now = repo.barn_of(horse)
+            moves.append(Move(horse, now.barn_name if now else None, horse.stall if now else None,
+                              barn.barn_name, free.take()))
+    metrics.count("horses_moved", len(moves))
+    return moves
+
+
+def _capacity(repo, barns):
+    return [[b.barn.barn_name, b.barn.stalls, len(b.barn.horse_ids), b.barn.stalls - b.room, b.closed]
+            for b in barns.values()]
+
+
+# ===============================
+# APPLYING
+# ===============================
+def apply_plan(repo, plan):
+    """Make every move of plan in repo, or none of them.
+
+    Raises RebalanceError without changing anything if the repository no
+    longer matches the plan, for example because a horse was moved since.
+    """
+    moving = {move.horse.id for move in plan.moves}
+    targets = {}
+    for move in plan.moves:
+        horse = move.horse
+        now = repo.barn_of(horse)
+        if repo.horse_by_id(horse.id) is not horse or (now.barn_name if now else None) != move.from_barn \
+                or (horse.stall if now else None) != move.from_stall:
+            raise RebalanceError(f"Horse '{horse.name}' has changed since the plan was made.")
+        barn = targets[move.to_barn] = targets.get(move.to_barn) or repo.barn_named(move.to_barn)
+        if barn is None or not 1 <= move.to_stall <= barn.stalls:
+            raise RebalanceError(f"Barn '{move.to_barn}' has changed since the plan was made.")
+        if any(h.id not in moving for h in repo.horses_in_stall(move.to_barn, move.to_stall)):
+            raise RebalanceError(f"Stall {move.to_stall} of barn '{move.to_barn}' has been taken.")
+
+    done = []
+    try:
+        for move in plan.moves:
+            repo.unassign(move.horse, clear=False)
+            done.append(move)
+        for move in plan.moves:
+            repo.assign(move.horse, targets[move.to_barn], move.to_stall)
+    except Exception:
+        for move in done:
+            repo.unassign(move.horse, clear=False)
+        for move in done:
+            if move.from_barn:
+                repo.assign(move.horse, repo.barn_named(move.from_barn), move.from_stall)
+            else:
+                repo.update_horse(move.horse, barn=None, stall=None)
+        raise
+    return len(plan.moves)
+
+
+def format_plan(plan):
+    """The plan as lines of text: what was wrong, the moves and the barns before and after."""
+    lines = list(plan.broken) or ["No rule is broken."]
+    lines.append(f"{len(plan.moves)} move(s) (at least {plan.lower_bound} needed):" if plan.moves
+                 else "Nothing needs to move.")
+    for move in plan.moves:
+        source = f"{move.from_barn} stall {move.from_stall}" if move.from_barn else "no barn"
+        lines.append(f"  {move.horse.name}: {source} -> {move.to_barn} stall {move.to_stall}")
+    lines.append("Barns (horses before -> after, of stalls):")
+    for name, stalls, before, after, closed in plan.barns:
+        lines.append(f"  {name}: {before} -> {after} of {stalls}{' (closing)' if closed else ''}")
+    return lines
+
+
+def _names(text):
+    return [n.strip() for n in text.split(",") if n.strip()]
+
+
+def main(argv=None):
+    from ranch.history import StallHistory, history_path
+    from ranch.repository import RanchRepository
+    from ranch.storage import open_storage
+
+    parser = argparse.ArgumentParser(description="Plan, and optionally apply, a barn rebalance for one owner.")
+    parser.add_argument("--owner", required=True)
+    parser.add_argument("--close", action="append", default=[], help="barn to empty (repeatable)")
+    parser.add_argument("--together", action="append", default=[], help="comma-separated horses to keep together")
+    parser.add_argument("--apart", action="append", default=[], help="comma-separated horses to keep apart")
+    parser.add_argument("--allergies", action="store_true", help="keep horses from barns with hay they are allergic to")
+    parser.add_argument("--place-unassigned", action="store_true", help="also stable horses in no barn")
+    parser.add_argument("--apply", action="store_true", help="make the moves and save them")
+    parser.add_argument("--backend", default="sharded", choices=("sharded", "log", "json"))
+    parser.add_argument("--data-dir", default="ranch_data", help="directory of the sharded backend")
+    parser.add_argument("--horses", default="horses.json", help="horses file of the json backend")
+    parser.add_argument("--barns", default="barns.json", help="barns file of the json backend")
+    parser.add_argument("--log", default="ranch.log", help="change log of the log backend")
+    parser.add_argument("--history-dir", default="stall_history", help="where stall history is kept")
+    args = parser.parse_args(argv)
+
+    storage = open_storage(args.backend, args.horses, args.barns, args.log, args.data_dir)
+    repo = RanchRepository(*storage.load(args.owner))
+    rules = Rules(args.close, [_names(t) for t in args.together], [_names(a) for a in args.apart],
+                  args.allergies, args.place_unassigned)
+    try:
+        plan = plan_rebalance(repo, rules)
+    except RebalanceError as e:
+        print(e)
+        return 1
+    print("\n".join(format_plan(plan)))
+    if args.apply and plan.moves:
+        history = StallHistory(history_path(args.history_dir, args.owner))
+        history.follow(repo)
+        apply_plan(repo, plan)
+        storage.save(args.owner, repo.horses, repo.barns, changed=repo.take_dirty())
+        history.save()
+        print(f"Moved {len(plan.moves)} horse(s).")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
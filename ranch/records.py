@@ -0,0 +1,89 @@
+"""Slotted record types for horses and barns and their stored form."""
+import datetime
+from dataclasses import dataclass, field, fields, replace
+
+
+@dataclass(slots=True)
+class Horse:
+    id: str
+    name: str
+    birth_date: datetime.date = None
+    breed: str = ""
+    breakfast_hay: str = ""
+    lunch_hay: str = ""
+    dinner_hay: str = ""
+    allergies: list = field(default_factory=list)
+    barn: str = None
+    stall: int = None
+    owner: str = None
+
+    def copy(self):
+        return replace(self, allergies=list(self.allergies))
+
+    def to_dict(self):
+        """The stored form, with the birth date as YYYY-MM-DD."""
+        data = {f.name: getattr(self, f.name) for f in fields(self)}
+        if data["birth_date"] is not None:
+            data["birth_date"] = data["birth_date"].isoformat()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a horse from its stored form, ignoring unknown keys."""
+        birth_date = data.get("birth_date")
+        if isinstance(birth_date, str):
+            birth_date = datetime.date.fromisoformat(birth_date)
+        return cls(
+            id=data["id"],
+            name=data.get("name", ""),
+            birth_date=birth_date,
+            breed=data.get("breed") or "",
+            breakfast_hay=data.get("breakfast_hay") or "",
+            lunch_hay=data.get("lunch_hay") or "",
+            dinner_hay=data.get("dinner_hay") or "",
+            allergies=list(data.get("allergies") or []),
+            barn=data.get("barn"),
+            stall=data.get("stall"),
+            owner=data.get("owner"),
+        )
+
+
+@dataclass(slots=True)
+class Barn:
+    """A barn and the ids of the horses stabled in it, in arrival order."""
+
+    id: str
+    barn_name: str
+    stalls: int
+    horse_ids: list = field(default_factory=list)
+    owner: str = None
+    note: str = None
+
+    def copy(self):
+        return replace(self, horse_ids=list(self.horse_ids))
+
+    def to_dict(self):
+        data = {f.name: getattr(self, f.name) for f in fields(self)}
+        if data["note"] is None:
+            del data["note"]
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a barn from its stored form.
+
+        Barns saved before records had their own types embed full copies of
+        their horses under "horses"; only the ids of those copies are kept.
+        """
+        if "horse_ids" in data:
+            horse_ids = list(data["horse_ids"])
+        else:
+            horse_ids = [h["id"] for h in data.get("horses", []) if h.get("id")]
+        return cls(
+            id=data["id"],
+            barn_name=data["barn_name"],
+            stalls=int(data["stalls"]),
+            horse_ids=horse_ids,
+            owner=data.get("owner"),
+            note=data.get("note"),
+        )
@@ -0,0 +1,96 @@
+"""Cached, buffered and paged rendering of horse lists for the terminal.
+
+Each horse's detail block and menu line is formatted once and kept until
+the horse changes. A page of output is joined into one string and written
+with a single write and flush rather than a print per line, which over a
+slow terminal (SSH) is most of the time a long listing takes.
+"""
+import math
+import sys
+
+from ranch import metrics
+
+DETAILS_PER_PAGE = 20  # detail blocks are ten lines each
+LINES_PER_PAGE = 100   # numbered one-line menus
+
+
+def details_text(horse):
+    """All details of a horse, as print_horse_details() showed them."""
+    return (f"\nName: {horse.name}\n"
+            f"Breed: {horse.breed}\n"
+            f"Barn: {horse.barn}, Stall: {horse.stall}\n"
+            f"Birthdate: {horse.birth_date}\n"
+            f"Breakfast hay: {horse.breakfast_hay}\n"
+            f"Lunch hay: {horse.lunch_hay}\n"
+            f"Dinner hay: {horse.dinner_hay}\n"
+            f"Allergies: {', '.join(horse.allergies) if horse.allergies else 'None'}\n"
+            f"{'-' * 40}\n")
+
+
+def menu_label(horse):
+    """A horse's name and where it is, for numbered menus."""
+    barn_info = f"{horse.barn} (Stall {horse.stall})" if horse.barn else "Unassigned"
+    return f"{horse.name} - {barn_info}"
+
+
+class RenderCache:
+    """The rendered text of one repository's horses, by horse id.
+
+    The cache subscribes to the repository and drops a horse's text on any
+    change to it, so what is shown is never stale.
+    """
+
+    def __init__(self, repo):
+        self._details = {}
+        self._labels = {}
+        repo.subscribe(self)
+
+    def horse_changed(self, before, after):
+        horse_id = (after or before).id
+        self._details.pop(horse_id, None)
+        self._labels.pop(horse_id, None)
+
+    @staticmethod
+    def _cached(cache, render, horse):
+        text = cache.get(horse.id)
+        if text is None:
+            text = cache[horse.id] = render(horse)
+            metrics.count("rows_rendered")
+        return text
+
+    def details(self, horses, start=1):
+        """The detail blocks of horses, as one string (start is unused; see show_pages)."""
+        return "".join([self._cached(self._details, details_text, h) for h in horses])
+
+    def menu(self, horses, start=1):
+        """Numbered menu lines for horses, counting from start, as one string."""
+        return "".join([f"{i}. {self._cached(self._labels, menu_label, h)}\n"
+                        for i, h in enumerate(horses, start)])
+
+
+def write_page(text, out=None):
+    """Write a rendered page in one go and flush it."""
+    out = out or sys.stdout
+    out.write(text)
+    out.flush()
+
+
+def show_pages(horses, render, per_page, out=None, ask=input):
+    """Write horses a page at a time, asking before each next page.
+
+    render(chunk, start) gives the text of a page, start being the 1-based
+    position of its first horse. Each page is one write and flush. Returns
+    how many horses were shown.
+    """
+    pages = max(1, math.ceil(len(horses) / per_page))
+    shown = 0
+    for page in range(pages):
+        chunk = horses[shown:shown + per_page]
+        text = render(chunk, shown + 1)
+        if pages > 1:
+            text += f"Page {page + 1} of {pages} ({len(horses)} horses)\n"
+        write_page(text, out)
+        shown += len(chunk)
+        if page + 1 < pages and ask("Show next page? (y/n): ").strip().lower() != "y":
+            break
+    return shown
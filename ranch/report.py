@@ -0,0 +1,165 @@
+"""Ranch-wide numbers across every owner: occupancy, breeds and allergies.
+
+Usage: python -m ranch.report [--workers N] [--by-barn] [--json FILE] [--data-dir DIR] [--backend sharded|log|json]
+
+Owners are summarised in parallel by a pool of worker processes, each
+loading one owner at a time and returning a Totals of counts only. The
+partial totals are then merged, so the parent never holds more than one
+owner's numbers per worker. Owners are handed out largest first (by the
+manifest's counts when there is one) so one big owner does not start last.
+"""
+import argparse
+import json
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+from ranch.storage import ShardedStorage, open_storage
+
+NONE = "(none)"
+
+
+def _key(text):
+    return (text or "").strip().lower()
+
+
+@dataclass
+class Totals:
+    """Counts over any number of owners; merge() adds another Totals in."""
+
+    owners: int = 0
+    horses: int = 0
+    stabled: int = 0
+    stalls: int = 0
+    allergic: int = 0
+    breeds: Counter = field(default_factory=Counter)
+    allergies: Counter = field(default_factory=Counter)
+    barns: list = field(default_factory=list)  # [owner, barn name, stalls, horses]
+
+    def merge(self, other):
+        self.owners += other.owners
+        self.horses += other.horses
+        self.stabled += other.stabled
+        self.stalls += other.stalls
+        self.allergic += other.allergic
+        self.breeds.update(other.breeds)
+        self.allergies.update(other.allergies)
+        self.barns.extend(other.barns)
+        return self
+
+
+def owner_totals(owner, horses, barns):
+    """Totals for one owner's horses and barns."""
+    totals = Totals(owners=1, horses=len(horses), stalls=sum(b.stalls for b in barns))
+    in_barn = Counter()
+    for horse in horses:
+        totals.breeds[_key(horse.breed) or NONE] += 1
+        allergies = {_key(a) for a in horse.allergies} - {""}
+        if allergies:
+            totals.allergic += 1
+            totals.allergies.update(allergies)
+        if horse.barn:
+            in_barn[_key(horse.barn)] += 1
+    for barn in barns:
+        count = in_barn.pop(_key(barn.barn_name), 0)
+        totals.stabled += count
+        totals.barns.append([owner, barn.barn_name, barn.stalls, count])
+    return totals
+
+
+# ===============================
+# WORKERS
+# ===============================
+_storage = None
+
+
+def _open(args):
+    global _storage
+    _storage = open_storage(*args)
+
+
+def _summarise(owner):
+    return owner_totals(owner, *_storage.load(owner))
+
+
+def _largest_first(storage):
+    owners = storage.owners()
+    if isinstance(storage, ShardedStorage):
+        sizes = storage.manifest["owners"]
+        owners.sort(key=lambda o: -(sizes[o].get("horses", 0) + sizes[o].get("barns", 0)))
+    return owners
+
+
+def _merge_all(totals, parts, count, progress):
+    for done, part in enumerate(parts, 1):
+        totals.merge(part)
+        if progress:
+            progress(done, count)
+
+
+def collect(storage_args, workers=None, progress=None):
+    """Totals over every owner of the storage open_storage(*storage_args) opens.
+
+    workers defaults to the number of CPUs; with 1 everything runs here.
+    progress, if given, is called with (owners done, owners) as each owner
+    is added in.
+    """
+    _open(storage_args)
+    owners = _largest_first(_storage)
+    totals = Totals()
+    if (workers or os.cpu_count()) <= 1 or len(owners) <= 1:
+        _merge_all(totals, map(_summarise, owners), len(owners), progress)
+        return totals
+    with ProcessPoolExecutor(workers, initializer=_open, initargs=(storage_args,)) as pool:
+        _merge_all(totals, pool.map(_summarise, owners), len(owners), progress)
+    return totals
+
+
+# ===============================
+# OUTPUT
+# ===============================
+def _percent(part, whole):
+    return f"{100 * part / whole:.1f}%" if whole else "-"
+
+
+def format_report(totals, by_barn=False, top=10):
+    """The report as lines of text."""
+    lines = [f"{totals.owners} owners, {totals.horses} horses, {len(totals.barns)} barns",
+             f"Occupancy: {totals.stabled} of {totals.stalls} stalls ({_percent(totals.stabled, totals.stalls)}), "
+             f"{totals.horses - totals.stabled} horses unassigned",
+             f"Barns full: {sum(1 for b in totals.barns if b[3] >= b[2])}", ""]
+    barns = sorted(totals.barns, key=lambda b: (-(b[3] / b[2]) if b[2] else 0, b[0], b[1].lower()))
+    lines.append("Occupancy by barn:" if by_barn else f"Fullest {min(top, len(barns))} barns:")
+    for owner, name, stalls, count in barns if by_barn else barns[:top]:
+        lines.append(f"  {owner} / {name}: {count} of {stalls} ({_percent(count, stalls)})")
+    lines += ["", "Horses by breed:"]
+    for breed, count in totals.breeds.most_common():
+        lines.append(f"  {breed}: {count} ({_percent(count, totals.horses)})")
+    lines += ["", f"Allergies: {totals.allergic} horses ({_percent(totals.allergic, totals.horses)}) have at least one"]
+    for allergy, count in totals.allergies.most_common():
+        lines.append(f"  {allergy}: {count} ({_percent(count, totals.horses)})")
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report occupancy, breeds and allergies across every owner.")
+    parser.add_argument("--workers", type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument("--by-barn", action="store_true", help="list every barn, not just the fullest")
+    parser.add_argument("--json", help="also write the totals to this file")
+    parser.add_argument("--backend", default="sharded", choices=("sharded", "log", "json"))
+    parser.add_argument("--data-dir", default="ranch_data", help="directory of the sharded backend")
+    parser.add_argument("--horses", default="horses.json", help="horses file of the json backend")
+    parser.add_argument("--barns", default="barns.json", help="barns file of the json backend")
+    parser.add_argument("--log", default="ranch.log", help="change log of the log backend")
+    args = parser.parse_args(argv)
+
+    totals = collect((args.backend, args.horses, args.barns, args.log, args.data_dir), args.workers)
+    print("\n".join(format_report(totals, args.by_barn)))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(asdict(totals), f, indent=4)
+
+
+if __name__ == "__main__":
+    main()
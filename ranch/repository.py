@@ -0,0 +1,307 @@
+"""In-memory horses and barns with hash indexes for the common lookups."""
+import bisect
+
+from ranch import metrics
+from ranch.records import Barn, Horse
+from ranch.stalls import FIRST_FIT, FreeStalls, plan_placement
+from ranch.storage import BARN, HORSE, new_id
+
+
+def make_horse(owner, name, birth_date, breed, breakfast_hay, lunch_hay, dinner_hay, allergies):
+    """A new, unassigned horse record."""
+    return Horse(new_id(), name, birth_date, breed, breakfast_hay, lunch_hay, dinner_hay, allergies, owner=owner)
+
+
+def make_barn(owner, barn_name, stalls):
+    """A new, empty barn record."""
+    return Barn(new_id(), barn_name, stalls, owner=owner)
+
+
+def _key(name):
+    return name.lower() if name else None
+
+
+class RanchRepository:
+    """Holds one owner's horses and barns and keeps lookup indexes current.
+
+    Indexes are kept by lowercase horse name, by (barn, stall), by
+    lowercase barn name and from each horse to the barn holding it, along
+    with the free stalls of every barn and the barns that still have room.
+    Every change must go through the methods below so the indexes stay
+    right.
+
+    Other indexes can follow along with subscribe(): their
+    horse_changed(before, after) method is called after every horse change
+    with a copy of the horse as it was (None when added) and the horse
+    itself (None when removed).
+
+    dirty holds the (kind, id) keys of the horses and barns changed since
+    the last take_dirty(), for Storage.save(changed=...) and prepare().
+    """
+
+    def __init__(self, horses=(), barns=()):
+        self._horses = {}
+        self._barns = {}
+        self._by_name = {}
+        self._by_stall = {}
+        self._barn_by_name = {}
+        self._barn_of = {}
+        self._free = {}
+        self._seq = {}
+        self._next_seq = 0
+        self._barns_by_seq = {}
+        self._open = []
+        self._listeners = []
+        self.dirty = set()
+        # _index_horse() inlined, with each barn name lowered once, as this
+        # loop is most of the time it takes to log in.
+        by_name, by_stall, barn_keys = self._by_name, self._by_stall, {}
+        for horse in horses:
+            self._horses[horse.id] = horse
+            by_name.setdefault(_key(horse.name), []).append(horse)
+            if horse.barn:
+                key = barn_keys.get(horse.barn)
+                if key is None:
+                    key = barn_keys[horse.barn] = _key(horse.barn)
+                by_stall.setdefault((key, horse.stall), []).append(horse)
+        cleaned = set()
+        for barn in barns:
+            if self._link_barn(barn):
+                cleaned.add((BARN, barn.id))
+            self.add_barn(barn)
+        # Loading is not a change, except for barns _link_barn cleaned up.
+        self.dirty = cleaned
+
+    def _link_barn(self, barn):
+        # Ids of horses that no longer exist are dropped from the barn.
+        # Returns True if any were.
+        kept = [hid for hid in barn.horse_ids if hid in self._horses]
+        dropped = len(kept) != len(barn.horse_ids)
+        barn.horse_ids = kept
+        for hid in barn.horse_ids:
+            self._barn_of[hid] = barn
+        return dropped
+
+    def _index_horse(self, horse):
+        self._by_name.setdefault(_key(horse.name), []).append(horse)
+        if horse.barn:
+            self._by_stall.setdefault((_key(horse.barn), horse.stall), []).append(horse)
+
+    def _unindex_horse(self, horse):
+        self._drop(self._by_name, _key(horse.name), horse)
+        if horse.barn:
+            self._drop(self._by_stall, (_key(horse.barn), horse.stall), horse)
+
+    def _update_open(self, barn):
+        # _open holds the insertion numbers of barns with a free stall, sorted,
+        # so available_barns() lists them in the same order as barns.
+        seq = self._seq[barn.id]
+        i = bisect.bisect_left(self._open, seq)
+        listed = i < len(self._open) and self._open[i] == seq
+        if len(self._free[barn.id]) and not listed:
+            self._open.insert(i, seq)
+        elif not len(self._free[barn.id]) and listed:
+            del self._open[i]
+
+    def _notify(self, before, after):
+        self.dirty.add((HORSE, (after or before).id))
+        for listener in self._listeners:
+            listener.horse_changed(before, after)
+
+    @staticmethod
+    def _drop(index, key, horse):
+        bucket = index.get(key, [])
+        for i, other in enumerate(bucket):
+            if other is horse:
+                del bucket[i]
+                break
+        if not bucket:
+            index.pop(key, None)
+
+    # ===============================
+    # READS
+    # ===============================
+    @property
+    def horses(self):
+        """All horses, oldest first."""
+        return list(self._horses.values())
+
+    @property
+    def barns(self):
+        """All barns, oldest first."""
+        return list(self._barns.values())
+
+    def iter_horses(self):
+        """Iterate over horses without copying the list."""
+        return iter(self._horses.values())
+
+    def horse_count(self):
+        return len(self._horses)
+
+    def horse_by_id(self, horse_id):
+        return self._horses.get(horse_id)
+
+    def horse_named(self, name):
+        """First horse whose name matches, ignoring case, or None."""
+        bucket = self._by_name.get(_key(name))
+        return bucket[0] if bucket else None
+
+    def horses_in_stall(self, barn_name, stall):
+        """Horses recorded in the given barn and stall."""
+        return list(self._by_stall.get((_key(barn_name), stall), []))
+
+    def barn_named(self, name):
+        """Barn whose name matches, ignoring case, or None."""
+        return self._barn_by_name.get(_key(name))
+
+    def barn_of(self, horse):
+        """Barn whose horse list holds this horse, or None."""
+        return self._barn_of.get(horse.id)
+
+    def horses_of(self, barn):
+        """Horses stabled in a barn, in arrival order."""
+        return [self._horses[hid] for hid in barn.horse_ids]
+
+    def free_stalls(self, barn):
+        """Number of empty stalls in a barn."""
+        return len(self._free[barn.id])
+
+    def next_free_stall(self, barn):
+        """Lowest empty stall number in a barn, or None if it is full."""
+        return self._free[barn.id].peek()
+
+    def available_barns(self):
+        """Barns with at least one empty stall, in barn order."""
+        by_seq = self._barns_by_seq
+        return [by_seq[seq] for seq in self._open]
+
+    # ===============================
+    # CHANGES
+    # ===============================
+    def subscribe(self, listener):
+        """Call listener.horse_changed(before, after) on every horse change."""
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    def take_dirty(self):
+        """The keys changed since the last call, clearing them."""
+        dirty, self.dirty = self.dirty, set()
+        return dirty
+
+    def add_horse(self, horse):
+        self._horses[horse.id] = horse
+        self._index_horse(horse)
+        self._notify(None, horse)
+
+    def update_horse(self, horse, **fields):
+        """Change fields of a horse, keeping the name and stall indexes current."""
+        before = horse.copy()
+        self._unindex_horse(horse)
+        for field, value in fields.items():
+            setattr(horse, field, value)
+        self._index_horse(horse)
+        self._notify(before, horse)
+
+    def remove_horse(self, horse):
+        self.unassign(horse)
+        self._unindex_horse(horse)
+        del self._horses[horse.id]
+        self._notify(horse, None)
+
+    @metrics.timed("assign")
+    def assign(self, horse, barn, stall=None):
+        """Move a horse into a barn, leaving any barn it was in.
+
+        The lowest empty stall is used unless a stall is given. Returns the
+        stall, or None if the barn is full, in which case nothing changes.
+        """
+        full = stall is None and not len(self._free[barn.id])
+        if full:
+            if self._barn_of.get(horse.id) is not barn:
+                return None
+            position = barn.horse_ids.index(horse.id)  # its own stall may come free
+        self.unassign(horse, clear=False)
+        stall = self._free[barn.id].take(stall)
+        if stall is None:
+            # Its stall did not come free (it shares it, or is past the last
+            # stall), so it goes back where it was.
+            barn.horse_ids.insert(position, horse.id)
+            self._barn_of[horse.id] = barn
+            if horse.stall is not None:
+                self._free[barn.id].take(horse.stall)
+            self._update_open(barn)
+            return None
+        before = horse.copy()
+        self._unindex_horse(horse)
+        horse.barn = barn.barn_name
+        horse.stall = stall
+        barn.horse_ids.append(horse.id)
+        self._barn_of[horse.id] = barn
+        self._index_horse(horse)
+        self._update_open(barn)
+        self.dirty.add((BARN, barn.id))
+        self._notify(before, horse)
+        return stall
+
+    def place(self, horses, policy=FIRST_FIT, barns=None):
+        """Assign many horses at once following a placement policy.
+
+        barns limits the candidate barns (all barns by default). Either every
+        horse is placed or, when there is not enough room, PlacementError is
+        raised and nothing changes. Returns the (horse, barn, stall) plan.
+        """
+        candidates = [b for b in (barns or self.barns) if len(self._free[b.id])]
+        plan = plan_placement(horses, candidates, self._free, policy)
+        for horse, barn, stall in plan:
+            self.assign(horse, barn, stall)
+        return plan
+
+    def unassign(self, horse, clear=True):
+        """Take a horse out of its barn's horse list and free its stall.
+
+        With clear=False the horse keeps its barn and stall fields, the same
+        as the old behavior of only removing it from the barn's horse list.
+        """
+        barn = self._barn_of.pop(horse.id, None)
+        if barn is not None:
+            barn.horse_ids.remove(horse.id)
+            self.dirty.add((BARN, barn.id))
+            if horse.stall is not None:
+                self._free[barn.id].release(horse.stall)
+            self._update_open(barn)
+        if clear and horse.barn:
+            self.update_horse(horse, barn=None, stall=None)
+
+    def add_barn(self, barn):
+        self._barns[barn.id] = barn
+        self._barn_by_name[_key(barn.barn_name)] = barn
+        self._free[barn.id] = FreeStalls(barn.stalls, [self._horses[hid].stall for hid in barn.horse_ids])
+        self._next_seq += 1
+        self._seq[barn.id] = self._next_seq
+        self._barns_by_seq[self._seq[barn.id]] = barn
+        self._update_open(barn)
+        self.dirty.add((BARN, barn.id))
+
+    def update_barn(self, barn, **fields):
+        """Change fields of a barn other than its name, stalls and horses."""
+        for field, value in fields.items():
+            setattr(barn, field, value)
+        self.dirty.add((BARN, barn.id))
+
+    def remove_barn(self, barn):
+        """Remove a barn and mark its horses unassigned."""
+        for hid in barn.horse_ids:
+            self._barn_of.pop(hid, None)
+            self.update_horse(self._horses[hid], barn=None, stall=None)
+        barn.horse_ids = []
+        self.dirty.add((BARN, barn.id))
+        del self._barns[barn.id]
+        self._barn_by_name.pop(_key(barn.barn_name), None)
+        seq = self._seq.pop(barn.id)
+        i = bisect.bisect_left(self._open, seq)
+        if i < len(self._open) and self._open[i] == seq:
+            del self._open[i]
+        del self._barns_by_seq[seq]
+        del self._free[barn.id]
@@ -0,0 +1,221 @@
+"""Prebuilt indexes for searching horses by name and by field filters."""
+import bisect
+import math
+from collections import namedtuple
+
+from ranch import metrics
+
+HAY_FIELDS = ("breakfast_hay", "lunch_hay", "dinner_hay")
+
+Page = namedtuple("Page", "horses total page pages")
+
+
+def trigrams(text):
+    """The three-letter slices of text, padded so short names still have some."""
+    text = f"  {text.lower()} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _inner_trigrams(text):
+    # Unpadded trigrams: every one of them appears in any name containing text.
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def tokens(text):
+    """Lowercase words of a free-text field such as a breed or hay type."""
+    return set(str(text or "").lower().replace(",", " ").split())
+
+
+def _born(horse):
+    date = horse.birth_date
+    return date.toordinal() if date is not None else None
+
+
+class SearchIndex:
+    """Name trigrams and field postings over one repository's horses.
+
+    Name search uses a trigram index for substring and fuzzy matches and a
+    sorted name list for prefixes. Breed, hay (any meal), allergy and barn
+    map each lowercase token to the ids holding it, and birth dates are
+    kept sorted for range queries. The index subscribes to the repository
+    and updates itself on every horse change.
+    """
+
+    def __init__(self, repo):
+        self.repo = repo
+        self.names = {}
+        self.grams = {}
+        self.sorted_names = []
+        self.fields = {"breed": {}, "hay": {}, "allergy": {}, "barn": {}}
+        self.births = []
+        for horse in repo.iter_horses():
+            self._add(horse, bulk=True)
+        self.sorted_names.sort()
+        self.births.sort()
+        repo.subscribe(self)
+
+    # ===============================
+    # MAINTENANCE
+    # ===============================
+    def _field_tokens(self, horse):
+        hay = set()
+        for field in HAY_FIELDS:
+            hay |= tokens(getattr(horse, field))
+        return {
+            "breed": tokens(horse.breed),
+            "hay": hay,
+            "allergy": {a.lower() for a in horse.allergies},
+            "barn": {horse.barn.lower()} if horse.barn else set(),
+        }
+
+    def _add(self, horse, bulk=False):
+        # bulk=True appends to the sorted lists; the caller sorts them after.
+        insert = list.append if bulk else bisect.insort
+        hid = horse.id
+        name = horse.name.lower()
+        self.names[hid] = name
+        for gram in trigrams(name):
+            self.grams.setdefault(gram, set()).add(hid)
+        insert(self.sorted_names, (name, hid))
+        for field, values in self._field_tokens(horse).items():
+            postings = self.fields[field]
+            for value in values:
+                postings.setdefault(value, set()).add(hid)
+        born = _born(horse)
+        if born is not None:
+            insert(self.births, (born, hid))
+
+    def _remove(self, horse):
+        hid = horse.id
+        name = self.names.pop(hid)
+        for gram in trigrams(name):
+            self._discard(self.grams, gram, hid)
+        i = bisect.bisect_left(self.sorted_names, (name, hid))
+        del self.sorted_names[i]
+        for field, values in self._field_tokens(horse).items():
+            for value in values:
+                self._discard(self.fields[field], value, hid)
+        born = _born(horse)
+        if born is not None:
+            i = bisect.bisect_left(self.births, (born, hid))
+            del self.births[i]
+
+    @staticmethod
+    def _discard(index, key, hid):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(hid)
+            if not ids:
+                del index[key]
+
+    def horse_changed(self, before, after):
+        if before is not None:
+            self._remove(before)
+        if after is not None:
+            self._add(after)
+
+    # ===============================
+    # QUERIES
+    # ===============================
+    def name_contains(self, text):
+        """Ids of horses whose name contains text, ignoring case."""
+        text = text.lower()
+        grams = _inner_trigrams(text)
+        if not grams:
+            return {hid for hid, name in self.names.items() if text in name}
+        postings = sorted((self.grams.get(g, set()) for g in grams), key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return {hid for hid in candidates if text in self.names[hid]}
+
+    def name_prefix(self, text):
+        """Ids of horses whose name starts with text, ignoring case."""
+        text = text.lower()
+        i = bisect.bisect_left(self.sorted_names, (text,))
+        found = set()
+        while i < len(self.sorted_names) and self.sorted_names[i][0].startswith(text):
+            found.add(self.sorted_names[i][1])
+            i += 1
+        return found
+
+    def name_fuzzy(self, text, threshold=0.3):
+        """Ids of horses whose name shares enough trigrams with text, best first."""
+        grams = trigrams(text)
+        shared = {}
+        for gram in grams:
+            for hid in self.grams.get(gram, ()):
+                shared[hid] = shared.get(hid, 0) + 1
+        scored = []
+        for hid, count in shared.items():
+            score = count / len(grams | trigrams(self.names[hid]))
+            if score >= threshold:
+                scored.append((-score, self.names[hid], hid))
+        return [hid for _, _, hid in sorted(scored)]
+
+    def _postings(self, field, text):
+        # Every word of the query must be present.
+        words = tokens(text) if field in ("breed", "hay") else {text.strip().lower()}
+        sets = [self.fields[field].get(w, set()) for w in words]
+        if not sets:
+            return None
+        return set(min(sets, key=len)).intersection(*sets)
+
+    def _birth_range(self, born_after, born_before):
+        lo = bisect.bisect_left(self.births, (born_after.toordinal() + 1,)) if born_after else 0
+        hi = bisect.bisect_left(self.births, (born_before.toordinal(),)) if born_before else len(self.births)
+        return lo, max(lo, hi)
+
+    @metrics.timed("search")
+    def query(self, name=None, fuzzy=False, breed=None, hay=None, allergy=None, barn=None,
+              born_before=None, born_after=None, page=1, per_page=20):
+        """Horses matching every given filter, one page at a time.
+
+        name matches anywhere in the name (or by similarity with fuzzy=True),
+        breed and hay match whole words, allergy and barn match exactly, and
+        born_before/born_after are exclusive dates. The smallest matching set
+        is intersected with the others, and the birth-date range is only
+        expanded when it is smaller than the rest. Results are sorted by name
+        unless fuzzy, which sorts by similarity. Pages count from 1; a page
+        or per_page below 1 raises ValueError.
+        """
+        if page < 1 or per_page < 1:
+            raise ValueError(f"page and per_page must be at least 1, not {page} and {per_page}.")
+        sets = []
+        ranked = None
+        if name:
+            if fuzzy:
+                ranked = self.name_fuzzy(name)
+                sets.append(set(ranked))
+            else:
+                sets.append(self.name_contains(name))
+        for field, value in (("breed", breed), ("hay", hay), ("allergy", allergy), ("barn", barn)):
+            if value:
+                postings = self._postings(field, value)
+                if postings is not None:
+                    sets.append(postings)
+
+        if born_before or born_after:
+            lo, hi = self._birth_range(born_after, born_before)
+            if not sets or hi - lo < min(len(s) for s in sets):
+                sets.append({hid for _, hid in self.births[lo:hi]})
+            else:
+                low = born_after.toordinal() if born_after else -math.inf
+                high = born_before.toordinal() if born_before else math.inf
+                sets.append({hid for hid in min(sets, key=len)
+                             if (b := _born(self.repo.horse_by_id(hid))) is not None and low < b < high})
+
+        if sets:
+            sets.sort(key=len)
+            matched = sets[0].intersection(*sets[1:])
+        else:
+            matched = set(self.names)
+
+        if ranked is not None:
+            ordered = [hid for hid in ranked if hid in matched]
+        else:
+            ordered = sorted(matched, key=lambda hid: (self.names[hid], hid))
+        metrics.count("search_results", len(ordered))
+        pages = max(1, math.ceil(len(ordered) / per_page))
+        start = (page - 1) * per_page
+        horses = [self.repo.horse_by_id(hid) for hid in ordered[start:start + per_page]]
+        return Page(horses, len(ordered), page, pages)
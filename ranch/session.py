@@ -0,0 +1,238 @@
+"""The logged-in user's data for the command-line tool, and loading and saving it.
+
+The menus in ranch.cli read and change repo and call save_data() after
+every change. Everything that is not needed to show the login prompt is
+imported or built on first use.
+"""
+import atexit
+import os
+
+from ranch import metrics
+from ranch.formats import with_format
+
+# ===============================
+# FILES
+# ===============================
+FILE_FORMAT = os.environ.get("HORSERANCH_FORMAT", "json")  # files of the json backend: json, jsonl or msgpack
+HORSES_FILE = with_format("horses.json", FILE_FORMAT)
+BARNS_FILE = with_format("barns.json", FILE_FORMAT)
+USERS_FILE = "users.json"
+USERS_LOG = "users.log"
+LOG_FILE = "ranch.log"
+DATA_DIR = "ranch_data"
+HISTORY_DIR = "stall_history"
+JOBS_LOG = "jobs.log"
+SCHEDULE_DIR = "schedules"
+EXPORT_DIR = "exports"  # where background jobs write their files
+STORAGE_BACKEND = os.environ.get("HORSERANCH_STORAGE", "sharded")
+SAVE_DELAY = 1.0  # seconds without changes before they are written
+
+# ===============================
+# STATE
+# ===============================
+current_user = None
+users = None
+repo = None
+search_index = None
+feed_ledger = None
+render_cache = None
+history = None
+schedule = None
+storage = None
+writer = None
+jobs = None
+
+
+def get_users():
+    """The user store, opened on first use (importing users.json if needed)."""
+    global users
+    if users is None:
+        from ranch.auth import UserStore
+        users = UserStore(USERS_LOG, USERS_FILE)
+    return users
+
+
+def authenticate(username, password):
+    """Return True if the username and password match a registered user."""
+    return get_users().authenticate(username, password)
+
+
+def get_search_index():
+    """The search index over repo, built on first use so logging in does not wait for it."""
+    global search_index
+    if search_index is None:
+        from ranch.search import SearchIndex
+        search_index = SearchIndex(repo)
+    return search_index
+
+
+def get_feed_ledger():
+    """The feed ledger over repo, built on first use like the search index."""
+    global feed_ledger
+    if feed_ledger is None:
+        from ranch.feed import FeedLedger
+        feed_ledger = FeedLedger(repo)
+    return feed_ledger
+
+
+def get_render_cache():
+    """The rendered text of repo's horses, kept on first use like the search index."""
+    global render_cache
+    if render_cache is None:
+        from ranch.render import RenderCache
+        render_cache = RenderCache(repo)
+    return render_cache
+
+
+def get_schedule():
+    """current_user's feeding and care tasks, loaded on first use like the search index."""
+    global schedule
+    if schedule is None:
+        from ranch.tasks import Schedule, schedule_path
+        schedule = Schedule(schedule_path(SCHEDULE_DIR, current_user), current_user)
+        schedule.follow(repo, get_feed_ledger())
+    return schedule
+
+
+# ===============================
+# SAVING
+# ===============================
+def get_storage():
+    """Open the configured storage backend on first use."""
+    global storage
+    if storage is None:
+        from ranch.storage import open_storage
+        storage = open_storage(STORAGE_BACKEND, HORSES_FILE, BARNS_FILE, LOG_FILE, DATA_DIR)
+    return storage
+
+
+def get_writer():
+    """Start the background writer on first use; it is flushed at exit."""
+    global writer
+    if writer is None:
+        from ranch.writer import BackgroundWriter
+        writer = BackgroundWriter(get_storage(), delay=SAVE_DELAY)
+        atexit.register(close_writer)
+    return writer
+
+
+@metrics.timed("save_data")
+def save_data():
+    """Hand the horses and barns changed since the last call to the writer.
+
+    Only the changed records are compared and copied here; the disk write
+    happens on the writer thread, merged with any other recent changes.
+    """
+    if repo.dirty:
+        get_writer().submit(get_storage().prepare(current_user, repo.horses, repo.barns, repo.take_dirty()))
+    if history.pending:
+        get_writer().submit(history.prepare(), history)
+    if schedule is not None and schedule.pending:
+        get_writer().submit(schedule.prepare(), schedule)
+
+
+def report_save_errors(flush=False):
+    """Print failed background saves; reload after a conflict.
+
+    With flush=True everything waiting is written first.
+    """
+    from ranch.storage import ConflictError
+    conflict = False
+    if writer is None:
+        errors = []
+    else:
+        errors = writer.flush() if flush else writer.take_errors()
+    for e in errors:
+        if isinstance(e, ConflictError):
+            # Another session saved first; our other changes were still written.
+            print(f"\n{e}")
+            conflict = True
+        else:
+            print(f"\nCould not save changes: {e}. They will be retried.")
+    if conflict:
+        print("Reloading the latest data.\n")
+        load_data()
+
+
+def close_writer():
+    """Write any unsaved changes and stop the writer."""
+    global writer
+    if writer is None:
+        return
+    save_data()
+    current, writer = writer, None
+    wrote = not current.idle() or current.commits
+    errors = current.close()
+    for e in errors:
+        print(f"\nCould not save changes: {e}")
+    if wrote and not errors:
+        print("Data saved successfully.\n")
+
+
+# ===============================
+# BACKGROUND JOBS
+# ===============================
+def get_jobs():
+    """Start the job queue on first use; running jobs are waited for at exit."""
+    global jobs
+    if jobs is None:
+        from ranch.jobs import JobQueue
+        jobs = JobQueue(JOBS_LOG, (STORAGE_BACKEND, HORSES_FILE, BARNS_FILE, LOG_FILE, DATA_DIR), EXPORT_DIR)
+        atexit.register(close_jobs)
+    return jobs
+
+
+def submit_job(kind, **params):
+    """Queue a job on current_user's data once every change is on disk, as jobs read it from there."""
+    report_save_errors(flush=True)
+    return get_jobs().submit(current_user, kind, **params)
+
+
+def report_jobs():
+    """Print current_user's jobs that ended since the last call."""
+    if jobs is None:
+        return
+    for job in jobs.take_finished(current_user):
+        print(f"\nJob {job.id} ({job.describe()})")
+
+
+def close_jobs():
+    """Wait for running jobs to end; queued ones are left for the next session."""
+    global jobs
+    if jobs is None:
+        return
+    current, jobs = jobs, None
+    if not current.idle():
+        print("Waiting for background jobs to finish...")
+    current.close()
+
+
+# ===============================
+# LOADING
+# ===============================
+@metrics.timed("load_data")
+def load_data():
+    """Load current_user's horses and barns, repairing their barns (see ranch.consistency)."""
+    global repo, search_index, feed_ledger, render_cache, history, schedule
+    from ranch.consistency import check
+    from ranch.history import StallHistory, history_path
+    from ranch.repository import RanchRepository
+    if writer is not None:
+        if history.pending:
+            writer.submit(history.prepare(), history)
+        if schedule is not None and schedule.pending:
+            writer.submit(schedule.prepare(), schedule)
+        for e in writer.flush():
+            print(f"\nCould not save changes: {e}")
+    horses, barns = get_storage().load(current_user)
+    problems, repaired = check(horses, barns, repair=True)
+    if problems:
+        print(f"\nRepaired {len(problems)} problem(s) with the barns:")
+        for problem in problems:
+            print(f" - {problem.message}")
+        print()
+    repo = RanchRepository(horses, barns)
+    repo.dirty |= repaired
+    search_index = feed_ledger = render_cache = schedule = None
+    history = StallHistory(history_path(HISTORY_DIR, current_user))
+    history.follow(repo)
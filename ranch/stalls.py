@@ -0,0 +1,114 @@
+"""Free-stall tracking per barn and bulk placement of horses."""
+import heapq
+from collections import Counter
+
+FIRST_FIT = "first-fit"
+KEEP_TOGETHER = "keep-together"
+SPREAD = "spread"
+POLICIES = (FIRST_FIT, KEEP_TOGETHER, SPREAD)
+
+
+class PlacementError(ValueError):
+    """Raised when horses cannot be placed; nothing has been assigned."""
+
+
+class FreeStalls:
+    """The free stall numbers of one barn, handed out lowest first.
+
+    Free stalls sit in a min-heap. Taking a specific stall only drops it
+    from the free set and the heap entry is skipped later, so take() and
+    release() are both O(log n).
+    """
+
+    def __init__(self, stalls, occupied=()):
+        self.stalls = stalls
+        self.occupants = Counter(s for s in occupied if s is not None)
+        self.free = {s for s in range(1, stalls + 1) if s not in self.occupants}
+        self.heap = sorted(self.free)
+
+    def __len__(self):
+        return len(self.free)
+
+    def peek(self):
+        """Lowest free stall without taking it, or None if the barn is full."""
+        while self.heap and self.heap[0] not in self.free:
+            heapq.heappop(self.heap)
+        return self.heap[0] if self.heap else None
+
+    def take(self, stall=None):
+        """Mark a stall occupied and return it; the lowest free one by default."""
+        if stall is None:
+            stall = self.peek()
+            if stall is None:
+                return None
+        self.free.discard(stall)
+        self.occupants[stall] += 1
+        return stall
+
+    def release(self, stall):
+        """A horse left this stall; it is free again once nobody else is in it."""
+        if self.occupants[stall] > 1:
+            self.occupants[stall] -= 1
+            return
+        self.occupants.pop(stall, None)
+        if 1 <= stall <= self.stalls and stall not in self.free:
+            self.free.add(stall)
+            heapq.heappush(self.heap, stall)
+
+
+def plan_placement(horses, barns, free, policy=FIRST_FIT):
+    """Work out (horse, barn, stall) for every horse without changing anything.
+
+    barns is the list of candidate barns in preference order and free maps
+    a barn id to its FreeStalls. The stalls are only peeked at here, so the
+    caller applies the plan with repository.assign().
+
+    first-fit fills barns in order, keep-together puts the whole group in
+    the fullest barn that still fits it (splitting across the emptiest
+    barns if none does) and spread sends each horse to the barn with the
+    most free stalls.
+    """
+    if policy not in POLICIES:
+        raise PlacementError(f"Unknown placement policy '{policy}'.")
+    horses = list(horses)
+    room = {b.id: len(free[b.id]) for b in barns}
+    if sum(room.values()) < len(horses):
+        raise PlacementError(f"Only {sum(room.values())} empty stalls for {len(horses)} horses.")
+
+    if policy == SPREAD:
+        heap = [(-room[b.id], i) for i, b in enumerate(barns) if room[b.id]]
+        heapq.heapify(heap)
+        order = []
+        for _ in horses:
+            count, i = heapq.heappop(heap)
+            order.append(barns[i])
+            if count + 1:
+                heapq.heappush(heap, (count + 1, i))
+    else:
+        if policy == KEEP_TOGETHER:
+            fits = [b for b in barns if room[b.id] >= len(horses)]
+            if fits:
+                candidates = [min(fits, key=lambda b: room[b.id])]
+            else:
+                candidates = sorted(barns, key=lambda b: -room[b.id])
+        else:
+            candidates = barns
+        order = []
+        for barn in candidates:
+            take = min(room[barn.id], len(horses) - len(order))
+            order.extend([barn] * take)
+            if len(order) == len(horses):
+                break
+
+    plan = []
+    taken = {}
+    for horse, barn in zip(horses, order):
+        stalls = taken.setdefault(barn.id, [])
+        stall = free[barn.id].take()
+        stalls.append(stall)
+        plan.append((horse, barn, stall))
+    # Hand the stalls back; assign() takes them for real.
+    for barn_id, stalls in taken.items():
+        for stall in stalls:
+            free[barn_id].release(stall)
+    return plan
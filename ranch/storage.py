@@ -0,0 +1,809 @@
+"""Storage backends that load_data() and save_data() sit on."""
+import hashlib
+import json
+import os
+import uuid
+from collections import Counter
+
+from ranch import metrics
+from ranch.formats import codec_for
+from ranch.locking import FileLock, atomic_write
+from ranch.records import Barn, Horse
+from ranch.snapshot import Snapshot, write_snapshot
+
+HORSE = "horse"
+BARN = "barn"
+RECORD_TYPES = {HORSE: Horse, BARN: Barn}
+
+
+class ConflictError(RuntimeError):
+    """Another session changed records this session was about to overwrite.
+
+    records holds (kind, name) for each record that was not saved.
+    """
+
+    def __init__(self, records):
+        self.records = records
+        names = ", ".join(f"{kind} '{name}'" for kind, name in records)
+        super().__init__(f"Changed by another session and not saved: {names}.")
+
+
+def new_id():
+    """Return a new unique record id."""
+    return uuid.uuid4().hex
+
+
+def assign_ids(horses, barns):
+    """Give ids to stored horse and barn dicts written before ids existed.
+
+    Old barns keep copies of their horses, so each copy gets the id of the
+    horse in the same barn and stall.
+    """
+    by_place = {}
+    for horse in horses:
+        if not horse.get("id"):
+            horse["id"] = new_id()
+        by_place[(horse.get("owner"), horse.get("barn"), horse.get("stall"))] = horse["id"]
+    for barn in barns:
+        if not barn.get("id"):
+            barn["id"] = new_id()
+        for copy in barn.get("horses", []):
+            if not copy.get("id"):
+                key = (copy.get("owner"), copy.get("barn"), copy.get("stall"))
+                copy["id"] = by_place.get(key) or new_id()
+
+
+def _read_bytes(path):
+    if not os.path.exists(path):
+        return b""
+    with open(path, "rb") as f:
+        data = f.read()
+    metrics.count("bytes_read", len(data))
+    return data
+
+
+def read_records(path, owner=None):
+    """Records stored in a file in any format from ranch.formats, or [] if it does not exist.
+
+    With owner, only that owner's records are returned.
+    """
+    codec = codec_for(path)
+    with metrics.timer("storage_read"):
+        data = _read_bytes(path)
+        records = codec.loads(data) if owner is None else codec.load_owner(data, owner)
+    metrics.count("records_scanned", len(records))
+    return records
+
+
+def write_records(path, records):
+    """Write records to path in the format of its extension, atomically."""
+    _write_atomic(path, codec_for(path).dumps(records))
+
+
+def replace_owner_records(path, owner, records):
+    """Rewrite path with owner's records replaced by records."""
+    codec = codec_for(path)
+    with metrics.timer("storage_read"):
+        data = _read_bytes(path)
+    _write_atomic(path, codec.replace_owner(data, owner, records))
+
+
+def _write_atomic(path, data):
+    with metrics.timer("storage_write"):
+        atomic_write(path, data)
+    metrics.count("bytes_written", len(data))
+
+
+def write_json_atomic(path, data):
+    """Write data to path through a temporary file so readers never see half a file."""
+    text = json.dumps(data, default=str, indent=4)
+    with metrics.timer("storage_write"):
+        atomic_write(path, text)
+    metrics.count("bytes_written", len(text))
+
+
+def read_legacy_records(horses_file, barns_file):
+    """Every owner's horses and barns from a horses.json/barns.json pair, as records."""
+    horses = read_records(horses_file)
+    barns = read_records(barns_file)
+    assign_ids(horses, barns)
+    return [Horse.from_dict(h) for h in horses], [Barn.from_dict(b) for b in barns]
+
+
+def encode(data):
+    """Serialize a dict the same way every time so changes can be compared."""
+    return json.dumps(data, default=str, sort_keys=True, separators=(",", ":"))
+
+
+class Storage:
+    """Interface for loading and saving one owner's horses and barns."""
+
+    def load(self, owner):
+        """Return (horses, barns) belonging to owner."""
+        raise NotImplementedError
+
+    def owners(self):
+        """Every owner with records stored."""
+        raise NotImplementedError
+
+    def save(self, owner, horses, barns, partial=True, changed=None):
+        """Persist owner's horses and barns.
+
+        Backends that detect concurrent edits raise ConflictError for records
+        another session changed first. With partial=True everything else is
+        still saved; with partial=False nothing is. changed, when given, holds
+        the (kind, id) keys of the only records that may differ from the
+        last save, so backends can skip comparing the others.
+        """
+        raise NotImplementedError
+
+    def prepare(self, owner, horses, barns, changed=None):
+        """Capture what save() would write so commit() can write it later.
+
+        The result shares nothing with the records passed in, so commit()
+        may run on another thread while they keep changing. Returns None
+        when there is nothing to write.
+        """
+        if changed is not None and not changed:
+            return None
+        return owner, [h.copy() for h in horses], [b.copy() for b in barns]
+
+    def merge(self, older, newer):
+        """Combine two prepared batches into one; newer wins."""
+        return newer
+
+    def commit(self, prepared, partial=True):
+        """Write a batch from prepare(), raising ConflictError like save()."""
+        owner, horses, barns = prepared
+        self.save(owner, horses, barns, partial)
+
+    def close(self):
+        """Release anything held by the backend."""
+
+
+# ===============================
+# JSON FILES
+# ===============================
+class JsonStorage(Storage):
+    """The original layout: one file each for horses and barns.
+
+    The files are pretty-printed JSON unless their names end in .jsonl or
+    .msgpack (see ranch.formats). Every save reads both files under their
+    lock and rewrites the owner's records in full.
+
+    The files hold no versions, so a record's stored form as this session
+    loaded it stands in for one: a record this session changed or removed
+    is only written if the file still holds it as loaded, and otherwise
+    reported through ConflictError like LogStorage does. Records only
+    other sessions changed are kept as they wrote them. Saving an owner
+    this storage has not loaded, or whose records have no ids yet, replaces
+    the owner's records outright.
+    """
+
+    def __init__(self, horses_file, barns_file):
+        self.horses_file = horses_file
+        self.barns_file = barns_file
+        self.saved = {}  # owner -> {(kind, id): stored dict as last loaded or saved}
+
+    def load(self, owner):
+        horses = read_records(self.horses_file, owner)
+        barns = read_records(self.barns_file, owner)
+        assign_ids(horses, barns)
+        horses, barns = [Horse.from_dict(h) for h in horses], [Barn.from_dict(b) for b in barns]
+        self.saved[owner] = {key: record.copy().to_dict() for key, record in _keyed(horses, barns)}
+        return horses, barns
+
+    def owners(self):
+        records = read_records(self.horses_file) + read_records(self.barns_file)
+        return sorted({r["owner"] for r in records if r.get("owner") is not None})
+
+    def save(self, owner, horses, barns, partial=True, changed=None):
+        ours = {key: record.copy().to_dict() for key, record in _keyed(horses, barns)}  # sharing no lists
+        with FileLock(self.horses_file + ".lock"):
+            stored_horses, stored_barns = read_records(self.horses_file, owner), read_records(self.barns_file, owner)
+            saved = self.saved.get(owner)
+            if saved is None or not all(r.get("id") for r in stored_horses + stored_barns):
+                self._replace(owner, ours)
+                self.saved[owner] = ours
+                return
+            current = {key: record.to_dict() for key, record in _keyed(
+                [Horse.from_dict(h) for h in stored_horses], [Barn.from_dict(b) for b in stored_barns])}
+            result, conflicts, written = dict(current), [], {}
+            for key in (saved.keys() | ours.keys()) if changed is None else changed:
+                mine, loaded = ours.get(key), saved.get(key)
+                if mine == loaded:
+                    continue
+                theirs = current.get(key)
+                if theirs != loaded and theirs != mine:
+                    data = mine or loaded or theirs
+                    conflicts.append((key[0], data.get("name") or data.get("barn_name") or key[1]))
+                    continue
+                written[key] = mine
+                if mine is None:
+                    result.pop(key, None)
+                else:
+                    result[key] = mine
+            if conflicts and not partial:
+                raise ConflictError(conflicts)
+            if written:
+                self._replace(owner, result)
+        for key, data in written.items():
+            if data is None:
+                saved.pop(key, None)
+            else:
+                saved[key] = data
+        if conflicts:
+            raise ConflictError(conflicts)
+
+    def _replace(self, owner, records):
+        """Write records, (kind, id) -> stored dict, as all of owner's; the caller holds the lock."""
+        replace_owner_records(self.horses_file, owner, [d for (kind, _), d in records.items() if kind == HORSE])
+        replace_owner_records(self.barns_file, owner, [d for (kind, _), d in records.items() if kind == BARN])
+
+
+def _keyed(horses, barns):
+    """((kind, id), record) for every horse and barn."""
+    return [((HORSE, h.id), h) for h in horses] + [((BARN, b.id), b) for b in barns]
+
+
+# ===============================
+# APPEND-ONLY LOG
+# ===============================
+class RecordLog:
+    """An append-only file of record changes, one JSON object per line.
+
+    A line is either {"op": "put", "kind", "id", "owner", "version", "data"}
+    or {"op": "del", "kind", "id", "owner", "version"}. Replaying the file
+    from the top gives the current records; compact() rewrites it with only
+    those, under a first line {"op": "start", "generation"} with a new
+    generation each time. Several sessions may share a log: writes happen
+    under its lock and each session catches up on lines others appended
+    before writing.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.live = {}
+        self.lines = 0
+        self.offset = 0
+        self.header = {}
+        self.counts = Counter()
+
+    def lock(self):
+        return FileLock(self.path + ".lock")
+
+    def get(self, key):
+        """The live put entry for (kind, id), or None."""
+        return self.live.get(key)
+
+    def entries(self):
+        """Every live put entry."""
+        return self.live.values()
+
+    def _apply(self, entry):
+        key = (entry["kind"], entry["id"])
+        if entry["op"] == "put":
+            if key not in self.live:
+                self.counts[key[0]] += 1
+            self.live[key] = entry
+        elif self.live.pop(key, None) is not None:
+            self.counts[key[0]] -= 1
+        self.lines += 1
+
+    def _read(self, f):
+        start, lines = self.offset, self.lines
+        with metrics.timer("storage_read"):
+            complete = []
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # a write still in progress; pick it up next time
+                self.offset += len(raw)
+                if raw.strip():
+                    complete.append(raw)
+            # One json.loads() over the lines joined into an array, as in ranch.formats.
+            for entry in json.loads(b"[" + b",".join(complete) + b"]"):
+                if entry["op"] == "start":
+                    self.header = entry
+                else:
+                    self._apply(entry)
+        metrics.count("bytes_read", self.offset - start)
+        metrics.count("records_scanned", self.lines - lines)
+
+    def _reset(self):
+        self.live = {}
+        self.lines = 0
+        self.offset = 0
+        self.header = {}
+        self.counts = Counter()
+
+    def replay(self):
+        """Read the whole log into self.live, keyed by (kind, id)."""
+        self._reset()
+        if not os.path.exists(self.path):
+            return self.live
+        with open(self.path, "rb") as f:
+            self._read(f)
+        return self.live
+
+    def catch_up(self):
+        """Apply lines other sessions appended since the last read.
+
+        A compaction by another session replaces the file, which shows up as
+        a different generation in its first line, and is handled by
+        replaying it from the top. (Inode numbers are no use for this: the
+        filesystem hands a freed one to the next file it creates.)
+        """
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return self.live
+        with f:
+            size = os.fstat(f.fileno()).st_size
+            if _generation(f.readline()) != self.header.get("generation") or size < self.offset:
+                return self.replay()
+            if size > self.offset:
+                f.seek(self.offset)
+                self._read(f)
+        return self.live
+
+    def append(self, entries):
+        """Write entries to the end of the log and apply them to self.live.
+
+        The caller holds the lock and has caught up first.
+        """
+        if not entries:
+            return
+        data = "".join(encode(e) + "\n" for e in entries).encode()
+        with metrics.timer("storage_write"), open(self.path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            self.offset = f.tell()
+        metrics.count("bytes_written", len(data))
+        for entry in entries:
+            self._apply(entry)
+
+    def commit(self, entries, versions, partial=True):
+        """Append entries whose records nobody else changed since we read them.
+
+        versions maps (kind, id) to the version this session last saw and is
+        updated for what gets written. The caller holds the lock. Returns the
+        entries that conflicted; with partial=False a conflict means nothing
+        is written.
+        """
+        self.catch_up()
+        accepted, conflicts = [], []
+        for entry in entries:
+            key = (entry["kind"], entry["id"])
+            existing = self.get(key)
+            current = existing.get("version", 0) if existing is not None else None
+            if entry["op"] == "del" and current is None:
+                versions.pop(key, None)  # someone else already removed it
+                continue
+            if current != versions.get(key):
+                conflicts.append(entry)
+                continue
+            entry["version"] = (current or 0) + 1
+            accepted.append(entry)
+        if conflicts and not partial:
+            return conflicts
+        self.append(accepted)
+        for entry in accepted:
+            key = (entry["kind"], entry["id"])
+            if entry["op"] == "put":
+                versions[key] = entry["version"]
+            else:
+                versions.pop(key, None)
+        return conflicts
+
+    def garbage(self):
+        """Number of lines that no longer describe a live record."""
+        return self.lines - len(self.live)
+
+    def compact_due(self, minimum):
+        """True once compact() would drop more than minimum lines and half the log."""
+        return self.garbage() > max(minimum, len(self.live))
+
+    def compact(self):
+        """Rewrite the log with one line per live record. The caller holds the lock."""
+        header = {"op": "start", "generation": new_id()}
+        data = "".join(encode(e) + "\n" for e in [header, *self.live.values()]).encode()
+        with metrics.timer("storage_compact"):
+            atomic_write(self.path, data)
+        metrics.count("bytes_written", len(data))
+        self.header = header
+        self.offset = len(data)
+        self.lines = len(self.live)
+
+
+def _generation(line):
+    """The generation named by a log's first line, or None for a log never compacted."""
+    if not line.endswith(b"\n") or b'"op":"start"' not in line:
+        return None
+    entry = json.loads(line)
+    return entry.get("generation") if entry.get("op") == "start" else None
+
+
+class SnapshotLog(RecordLog):
+    """A RecordLog whose compact() writes a snapshot instead of a shorter log.
+
+    compact() writes every live record to <path>.snap (see ranch.snapshot)
+    and leaves the log with only a first line naming the snapshot's
+    generation, so replay() maps the snapshot and parses only the lines
+    appended since. live holds the records of those lines and dead the
+    snapshot records they removed; get() and entries() look through to the
+    snapshot for the rest. A log with no snapshot yet reads like a plain
+    RecordLog and gets one at its next compaction.
+
+    The snapshot is replaced before the log is emptied. A crash between the
+    two leaves the new snapshot under the old log, and replaying the old
+    lines over it gives the same records again; the snapshot records which
+    log it was made from, so this is told apart from a log that follows a
+    newer snapshot. A snapshot that is swapped out is detached rather than
+    left mapped, since a SavedData may still build records from it;
+    close() unmaps the current one.
+    """
+
+    def __init__(self, path):
+        self.snapshot_path = path + ".snap"
+        self.base = None
+        self.dead = set()
+        super().__init__(path)
+
+    def _reset(self):
+        super()._reset()
+        self.dead = set()
+        if self.base is not None:
+            self.base.detach()
+        self.base = Snapshot(self.snapshot_path) if os.path.exists(self.snapshot_path) else None
+        if self.base is not None:
+            self.counts.update(self.base.counts())
+
+    def _in_base(self, key):
+        return self.base is not None and key not in self.dead and key in self.base.index()
+
+    def get(self, key):
+        entry = self.live.get(key)
+        if entry is None and self._in_base(key):
+            return self.base.entry(key)
+        return entry
+
+    def entries(self):
+        if self.base is not None:
+            for key in self.base.keys():
+                if key not in self.live and key not in self.dead:
+                    yield self.base.entry(key)
+        yield from self.live.values()
+
+    def live_count(self):
+        return sum(self.counts.values())
+
+    def _apply(self, entry):
+        key = (entry["kind"], entry["id"])
+        exists = key in self.live or self._in_base(key)
+        if entry["op"] == "put":
+            if not exists:
+                self.counts[key[0]] += 1
+            self.live[key] = entry
+            self.dead.discard(key)
+        else:
+            if exists:
+                self.counts[key[0]] -= 1
+            self.live.pop(key, None)
+            if self.base is not None and key in self.base.index():
+                self.dead.add(key)
+        self.lines += 1
+
+    def replay(self):
+        while True:
+            super().replay()
+            # Another session may compact between mapping the snapshot and
+            # opening the log; an older snapshot under a newer log is retried.
+            # A log that names the snapshot the mapped one follows is the
+            # old log of a compaction still under way, or cut short.
+            follows = self.header.get("snapshot")
+            if self.base is None:
+                if follows is None:
+                    return self.live
+                raise FileNotFoundError(f"'{self.path}' follows a snapshot, but '{self.snapshot_path}' is missing.")
+            if follows in (self.base.generation, self.base.follows):
+                return self.live
+
+    def garbage(self):
+        return self.lines
+
+    def compact_due(self, minimum):
+        """True once the log holds more than minimum lines and a twentieth of the records."""
+        return self.lines > max(minimum, self.live_count() // 20)
+
+    def compact(self):
+        """Write a snapshot of every live record and empty the log. The caller holds the lock."""
+        with metrics.timer("storage_compact"):
+            entries = list(self.entries())
+            if self.base is not None:
+                self.base.detach()  # a mapped file cannot be replaced on Windows
+            generation = new_id()
+            size = write_snapshot(self.snapshot_path, entries, generation, self.header.get("snapshot"))
+            header = {"op": "start", "generation": generation, "snapshot": generation}
+            atomic_write(self.path, encode(header) + "\n")
+        metrics.count("bytes_written", size)
+        self.replay()
+
+    def close(self):
+        if self.base is not None:
+            self.base.close()
+
+
+def put_entry(kind, record, owner):
+    """Log entry that stores a Horse or Barn, sharing no lists with it."""
+    return {"op": "put", "kind": kind, "id": record.id, "owner": owner, "data": record.copy().to_dict()}
+
+
+class SavedData(dict):
+    """(kind, id) -> stored data as last saved, for diff_entries().
+
+    Records read from a snapshot are entered with the Snapshot itself in
+    place of their data, which is only built if get() asks for it.
+    """
+
+    def get(self, key, default=None):
+        value = dict.get(self, key, default)
+        if isinstance(value, Snapshot):
+            value = self[key] = value.entry(key)["data"]
+        return value
+
+
+def read_owner(log, owner, saved, versions):
+    """Return (horses, barns) for owner from a replayed log.
+
+    saved (a SavedData) is filled with the stored form of every record
+    returned and versions with the version each was read at. Horses in a
+    SnapshotLog's snapshot are built straight from its columns.
+    """
+    horses, barns = [], []
+    entries = log.live.items()
+    scanned = len(log.live)
+    with metrics.timer("storage_filter"):
+        base = getattr(log, "base", None)
+        if base is not None:
+            skip = log.live.keys() | log.dead
+            horses, row_versions = base.owner_horses(owner, skip)
+            keys = [(HORSE, h.id) for h in horses]
+            versions.update(zip(keys, row_versions))
+            saved.update(dict.fromkeys(keys, base))
+            entries = [(key, e) for key, e in base.entries().items() if key not in skip] + list(entries)
+            scanned += base.count + len(base.entries())
+        for key, entry in entries:
+            if entry["owner"] != owner:
+                continue
+            saved[key] = entry["data"]
+            versions[key] = entry.get("version", 0)
+            record = RECORD_TYPES[key[0]].from_dict(entry["data"])
+            (horses if key[0] == HORSE else barns).append(record)
+    metrics.count("records_scanned", scanned)
+    return horses, barns
+
+
+@metrics.timed("storage_diff")
+def diff_entries(owner, saved, horses, barns, changed=None):
+    """Build log entries for records that differ from what was last saved.
+
+    saved maps (kind, id) to the stored record as last saved for this
+    owner. When changed is given, records whose (kind, id) is not in it
+    are taken to be unchanged.
+    """
+    entries = []
+    seen = set()
+    for kind, records in ((HORSE, horses), (BARN, barns)):
+        for record in records:
+            key = (kind, record.id)
+            if changed is not None and key not in changed:
+                continue
+            seen.add(key)
+            entry = put_entry(kind, record, owner)
+            if saved.get(key) != entry["data"]:
+                entries.append(entry)
+    for key in saved if changed is None else changed:
+        if key not in seen and key in saved:
+            entries.append({"op": "del", "kind": key[0], "id": key[1], "owner": owner})
+    metrics.count("records_compared", len(seen))
+    return entries
+
+
+def _record_name(entry, log):
+    data = entry.get("data") or (log.get((entry["kind"], entry["id"])) or {}).get("data", {})
+    return entry["kind"], data.get("name") or data.get("barn_name") or entry["id"]
+
+
+class LogStorage(Storage):
+    """Stores changes in an append-only log and only writes what changed.
+
+    Every record carries a version number. A save only writes records that
+    are still at the version this session loaded; anything another session
+    changed in the meantime is reported through ConflictError instead of
+    being overwritten. Once more than compact_min lines have built up the
+    log is folded into a snapshot (see SnapshotLog). On first use an
+    existing horses.json/barns.json pair is imported.
+    """
+
+    def __init__(self, path, horses_file=None, barns_file=None, compact_min=1000):
+        self.log = SnapshotLog(path)
+        self.compact_min = compact_min
+        self.saved = SavedData()
+        self.versions = {}
+        if horses_file and barns_file and not os.path.exists(path):
+            with self.log.lock():
+                if not os.path.exists(path):
+                    self._import(horses_file, barns_file)
+        self.log.replay()
+
+    def _import(self, horses_file, barns_file):
+        horses, barns = read_legacy_records(horses_file, barns_file)
+        if not horses and not barns:
+            return
+        entries = [put_entry(HORSE, h, h.owner) for h in horses]
+        entries.extend(put_entry(BARN, b, b.owner) for b in barns)
+        for entry in entries:
+            entry["version"] = 1
+        self.log.append(entries)
+
+    def load(self, owner):
+        self.log.catch_up()
+        self.saved = SavedData()
+        self.versions = {}
+        return read_owner(self.log, owner, self.saved, self.versions)
+
+    def owners(self):
+        self.log.catch_up()
+        return sorted({e["owner"] for e in self.log.entries() if e["owner"] is not None})
+
+    def _write(self, entries, partial):
+        with self.log.lock():
+            conflicts = self.log.commit(entries, self.versions, partial)
+            if self.log.compact_due(self.compact_min):
+                self.log.compact()
+        return conflicts
+
+    def close(self):
+        if self.log is not None:
+            self.log.close()
+
+    def _mark_saved(self, entries, rejected=()):
+        for entry in entries:
+            key = (entry["kind"], entry["id"])
+            if key in rejected:
+                continue
+            if entry["op"] == "put":
+                self.saved[key] = entry["data"]
+            else:
+                self.saved.pop(key, None)
+
+    def _commit(self, entries, partial):
+        conflicts = self._write(entries, partial)
+        if conflicts and not partial:
+            raise ConflictError([_record_name(e, self.log) for e in conflicts])
+        self._mark_saved(entries, {(e["kind"], e["id"]) for e in conflicts})
+        if conflicts:
+            raise ConflictError([_record_name(e, self.log) for e in conflicts])
+
+    def save(self, owner, horses, barns, partial=True, changed=None):
+        self._commit(diff_entries(owner, self.saved, horses, barns, changed), partial)
+
+    # prepare() runs on the caller's thread and is the only one to touch
+    # saved; commit() may run on a writer thread and is the only one to
+    # touch the log and versions until the next load().
+    def prepare(self, owner, horses, barns, changed=None):
+        """The log entries save() would append, taken as written from now on.
+
+        If commit() then fails, load() again to get back in step.
+        """
+        entries = diff_entries(owner, self.saved, horses, barns, changed)
+        self._mark_saved(entries)
+        return entries or None
+
+    def merge(self, older, newer):
+        merged = {(e["kind"], e["id"]): e for e in older}
+        merged.update(((e["kind"], e["id"]), e) for e in newer)
+        return list(merged.values())
+
+    def commit(self, prepared, partial=True):
+        conflicts = self._write(prepared, partial)
+        if conflicts:
+            raise ConflictError([_record_name(e, self.log) for e in conflicts])
+
+
+# ===============================
+# PER-OWNER SHARDS
+# ===============================
+MANIFEST_FILE = "manifest.json"
+
+
+def shard_name(owner):
+    """File name of the shard holding owner's records."""
+    return hashlib.sha1(owner.encode()).hexdigest()[:16] + ".log"
+
+
+class ShardedStorage(LogStorage):
+    """One append-only log per owner plus a small manifest.
+
+    Logging in only reads the manifest and the caller's own shard, so it
+    costs the same no matter how many other owners share the data
+    directory. The manifest maps each owner to their shard and record
+    counts. Shards use the same versioned, locked writes as LogStorage.
+    """
+
+    def __init__(self, root, compact_min=1000):
+        self.root = root
+        self.compact_min = compact_min
+        self.manifest_path = os.path.join(root, MANIFEST_FILE)
+        self.manifest = self._read_manifest()
+        self.log = None
+        self.saved = SavedData()
+        self.versions = {}
+
+    def _read_manifest(self):
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                return json.load(f)
+        return {"version": 1, "owners": {}}
+
+    def write_manifest(self):
+        os.makedirs(self.root, exist_ok=True)
+        write_json_atomic(self.manifest_path, self.manifest)
+
+    def shard_path(self, owner):
+        info = self.manifest["owners"].get(owner)
+        return os.path.join(self.root, info["shard"] if info else shard_name(owner))
+
+    def load(self, owner):
+        self.close()  # load() starts a new SavedData, so nothing reads the old snapshot again
+        self.log = SnapshotLog(self.shard_path(owner))
+        return super().load(owner)
+
+    def owners(self):
+        self.manifest = self._read_manifest()
+        return sorted(self.manifest["owners"])
+
+    def save(self, owner, horses, barns, partial=True, changed=None):
+        if self.log is None:
+            self.log = SnapshotLog(self.shard_path(owner))
+        os.makedirs(self.root, exist_ok=True)
+        try:
+            super().save(owner, horses, barns, partial, changed)
+        finally:
+            self._update_manifest(owner)
+
+    def commit(self, prepared, partial=True):
+        if self.log is None:
+            self.log = SnapshotLog(self.shard_path(prepared[0]["owner"]))
+        os.makedirs(self.root, exist_ok=True)
+        try:
+            super().commit(prepared, partial)
+        finally:
+            self._update_manifest(prepared[0]["owner"])
+
+    def _update_manifest(self, owner):
+        info = {"shard": os.path.basename(self.log.path),
+                "horses": self.log.counts[HORSE], "barns": self.log.counts[BARN]}
+        if self.manifest["owners"].get(owner) == info:
+            return
+        with FileLock(self.manifest_path + ".lock"):
+            self.manifest = self._read_manifest()
+            self.manifest["owners"][owner] = info
+            self.write_manifest()
+
+
+def open_storage(kind, horses_file, barns_file, log_file, data_dir):
+    """Return the storage backend named kind ("sharded", "log" or "json")."""
+    if kind == "json":
+        return JsonStorage(horses_file, barns_file)
+    if kind == "log":
+        return LogStorage(log_file, horses_file, barns_file)
+    if kind == "sharded":
+        if not os.path.exists(os.path.join(data_dir, MANIFEST_FILE)):
+            with FileLock(os.path.join(data_dir, "migrate.lock")):
+                if not os.path.exists(os.path.join(data_dir, MANIFEST_FILE)):
+                    from ranch.migrate import migrate
+                    migrate(data_dir, horses_file, barns_file, log_file)
+        return ShardedStorage(data_dir)
+    raise ValueError(f"Unknown storage backend '{kind}'.")
@@ -0,0 +1,443 @@
+"""Recurring feeding and care tasks for horses and barns, and what is due when.
+
+Two kinds of task are scheduled:
+
+- feeding rounds: every barn with horses in it gets one per meal, at the
+  times in MEAL_TIMES, listing the rations the feed ledger
+  (ranch.feed.FeedLedger) counts for that barn and meal;
+- care rules: a task of any kind (farrier, vet, worming...) for one horse
+  or one barn, at one or more times of day, every so many days from a
+  start date. A horse's rules follow it from barn to barn and are dropped
+  when it is removed.
+
+Rules are kept per owner in an append-only record log (see
+ranch.storage.RecordLog) under schedules/. Changes wait in pending until
+save(), or prepare() and commit() (the interface BackgroundWriter uses).
+
+Each barn has a priority queue (a heap) of its rules, keyed by the next
+time each is due. "What is due in Barn A in the next hour" only looks at
+the top of Barn A's heap: entries due after the hour, and everything below
+them, are never visited. Every feeding round has the same times, so those
+are worked out per barn rather than queued. Times before the queue's
+earliest query are worked out from each rule instead, as are past days.
+"""
+import contextlib
+import datetime
+import functools
+import gc
+import heapq
+import itertools
+import os
+from collections import namedtuple
+from dataclasses import dataclass
+
+from ranch import metrics
+from ranch.feed import UNASSIGNED as NO_BARN
+from ranch.storage import RecordLog, new_id, shard_name
+
+RULE = "rule"
+MEAL_TIMES = {"breakfast": datetime.time(7), "lunch": datetime.time(12), "dinner": datetime.time(18)}
+PRIORITIES = {1: "high", 2: "normal", 3: "low"}
+FEEDING_PRIORITY = 1
+UNASSIGNED = None  # the queue of horses in no barn
+
+Task = namedtuple("Task", "due priority kind barn horse note rule_id")
+
+
+def schedule_path(directory, owner):
+    """File holding owner's care rules under directory."""
+    return os.path.join(directory, shard_name(owner))
+
+
+def _key(barn):
+    return barn.lower() if barn else UNASSIGNED
+
+
+def parse_times(text):
+    """Sorted times of day, as a tuple, from "HH:MM" strings or one string of them separated by commas."""
+    if isinstance(text, str):
+        text = text.split(",")
+    try:
+        times = sorted({datetime.time.fromisoformat(t.strip()) for t in text if t.strip()})
+    except ValueError:
+        raise ValueError("Times must be given as HH:MM, separated by commas.")
+    if not times:
+        raise ValueError("A task needs at least one time of day.")
+    return tuple(times)
+
+
+@functools.lru_cache(maxsize=1024)
+def _stored_times(times):
+    # A ranch's rules share a handful of time lists; parse each once when loading.
+    return parse_times(times)
+
+
+@dataclass(slots=True)
+class Rule:
+    """A recurring task: at each of times, every every days from start.
+
+    horse_id is set for a horse's rule, barn for a barn's.
+    """
+
+    id: str
+    kind: str
+    times: tuple
+    every: int = 1
+    start: datetime.date = None
+    priority: int = 2
+    horse_id: str = None
+    barn: str = None
+    note: str = ""
+    owner: str = None
+
+    def to_dict(self):
+        return {"id": self.id, "kind": self.kind, "times": [t.strftime("%H:%M") for t in self.times],
+                "every": self.every, "start": self.start.isoformat(), "priority": self.priority,
+                "horse_id": self.horse_id, "barn": self.barn, "note": self.note, "owner": self.owner}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(id=data["id"], kind=data["kind"], times=_stored_times(tuple(data["times"])),
+                   every=int(data["every"]), start=datetime.date.fromisoformat(data["start"]),
+                   priority=int(data.get("priority", 2)),
+                   horse_id=data.get("horse_id"), barn=data.get("barn"), note=data.get("note") or "",
+                   owner=data.get("owner"))
+
+    def describe(self):
+        """One line about the rule, without its horse or barn."""
+        times = ", ".join(t.strftime("%H:%M") for t in self.times)
+        every = "daily" if self.every == 1 else f"every {self.every} days"
+        note = f" - {self.note}" if self.note else ""
+        return f"{self.kind} at {times}, {every} from {self.start} [{PRIORITIES[self.priority]}]{note}"
+
+    def next_due(self, moment):
+        """The first time this rule is due at or after moment."""
+        day = max(moment.date(), self.start)
+        behind = (day - self.start).days % self.every
+        if behind:
+            day += datetime.timedelta(days=self.every - behind)
+        for at in self.times:
+            due = datetime.datetime.combine(day, at)
+            if due >= moment:
+                return due
+        return datetime.datetime.combine(day + datetime.timedelta(days=self.every), self.times[0])
+
+    def due_between(self, start, end):
+        """Every time this rule is due in [start, end)."""
+        found = []
+        day = self.next_due(start).date()
+        step = datetime.timedelta(days=self.every)
+        while True:
+            for at in self.times:
+                due = datetime.datetime.combine(day, at)
+                if due >= end:
+                    return found
+                if due >= start:
+                    found.append(due)
+            day += step
+
+
+def make_rule(owner, kind, times, every=1, start=None, priority=2, horse_id=None, barn=None, note=""):
+    """A new rule for one horse or one barn; raises ValueError for bad values."""
+    kind = (kind or "").strip().lower()
+    if not kind:
+        raise ValueError("A task needs a kind, such as farrier or vet.")
+    if (horse_id is None) == (barn is None):
+        raise ValueError("A task belongs to either a horse or a barn.")
+    every, priority = int(every), int(priority)
+    if every < 1:
+        raise ValueError("A task repeats every 1 or more days.")
+    if priority not in PRIORITIES:
+        raise ValueError("Priority is 1 (high), 2 (normal) or 3 (low).")
+    if isinstance(start, str):
+        start = datetime.date.fromisoformat(start)
+    return Rule(new_id(), kind, parse_times(times), every, start or datetime.date.today(), priority,
+                horse_id, barn, (note or "").strip(), owner)
+
+
+@contextlib.contextmanager
+def _collector_paused():
+    # As in ranch.snapshot: rules, log entries and heap entries form no
+    # cycles, and the collector's passes over them would double the time.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class _BarnQueue:
+    """One barn's rules in a heap of [next due, priority, sequence, rule].
+
+    Every entry is due at or after cursor, the start of the earliest query
+    since the queue was built. A removed or moved rule's entry is left in
+    place with its rule set to None.
+    """
+
+    __slots__ = ("heap", "cursor")
+
+    def __init__(self, cursor):
+        self.heap = []
+        self.cursor = cursor
+
+    def advance(self, moment):
+        """Move the cursor on to moment, requeueing the rules that fell due before it."""
+        if moment <= self.cursor:
+            return
+        heap = self.heap
+        while heap and heap[0][0] < moment:
+            entry = heapq.heappop(heap)
+            rule = entry[3]
+            if rule is not None:
+                entry[0] = rule.next_due(moment)
+                heapq.heappush(heap, entry)
+        self.cursor = moment
+
+    def due_before(self, end):
+        """The rules of entries due before end, visiting no entry below one that is not."""
+        heap, found, stack = self.heap, [], [0] if self.heap else []
+        while stack:
+            i = stack.pop()
+            if heap[i][0] >= end:
+                continue
+            if heap[i][3] is not None:
+                found.append(heap[i][3])
+            stack.extend(c for c in (2 * i + 1, 2 * i + 2) if c < len(heap))
+        return found
+
+    def rules(self):
+        return [entry[3] for entry in self.heap if entry[3] is not None]
+
+
+class Schedule:
+    """One owner's care rules and feeding rounds, indexed by barn and due time.
+
+    follow(repo, ledger) must be called before any query: the schedule
+    subscribes to the repository so a horse's rules move with it, and reads
+    feeding rounds from ledger. Call barn_removed() when a barn is removed.
+    """
+
+    def __init__(self, path, owner, meal_times=MEAL_TIMES):
+        self.log = RecordLog(path)
+        self.owner = owner
+        self.meal_times = meal_times
+        self.pending = []
+        self.repo = None
+        self.ledger = None
+        self._versions = {}
+        self._rules = {}
+        self._by_horse = {}   # horse id -> {rule id: rule}
+        self._entries = {}    # rule id -> its heap entry
+        self._queues = {}     # lowercase barn name (None for no barn) -> _BarnQueue
+        self._stale = 0
+        self._cursor = datetime.datetime.combine(datetime.date.today(), datetime.time())
+        self._sequence = itertools.count()
+        self._load()
+
+    def _load(self):
+        with _collector_paused():
+            for entry in self.log.replay().values():
+                self._versions[(RULE, entry["id"])] = entry.get("version", 0)
+                rule = Rule.from_dict(entry["data"])
+                self._rules[rule.id] = rule
+
+    @metrics.timed("schedule_build")
+    def follow(self, repo, ledger):
+        """Index the rules by the barns their horses are in and follow repo's changes."""
+        self.repo, self.ledger = repo, ledger
+        with _collector_paused():
+            for rule in list(self._rules.values()):
+                target = repo.horse_by_id(rule.horse_id) if rule.horse_id is not None else repo.barn_named(rule.barn)
+                if target is None:
+                    self.remove_rule(rule)  # its horse or barn was removed while no schedule followed it
+                else:
+                    self._queue_rule(rule, push=False)
+            for queue in self._queues.values():
+                heapq.heapify(queue.heap)
+        repo.subscribe(self)
+
+    def horse_changed(self, before, after):
+        if after is None:
+            for rule in list(self._by_horse.get(before.id, {}).values()):
+                self.remove_rule(rule)
+        elif before is not None and _key(before.barn) != _key(after.barn):
+            for rule in self._by_horse.get(after.id, {}).values():
+                self._unqueue(rule)
+                self._enqueue(rule, after.barn)
+
+    def barn_removed(self, barn_name):
+        """Drop a removed barn's own rules; the repository does not report barn changes."""
+        for rule in self.rules(barn=barn_name):
+            self.remove_rule(rule)
+
+    # ===============================
+    # RULES
+    # ===============================
+    def rules(self, horse_id=None, barn=None):
+        """Rules of one horse, of one barn (not its horses'), or all of them."""
+        rules = self._rules.values()
+        if horse_id is not None:
+            rules = self._by_horse.get(horse_id, {}).values()
+        elif barn is not None:
+            rules = [r for r in rules if r.barn and _key(r.barn) == _key(barn)]
+        return sorted(rules, key=lambda r: (r.kind, r.times[0], r.id))
+
+    def rule(self, rule_id):
+        return self._rules.get(rule_id)
+
+    def add_rule(self, rule):
+        """Schedule a new rule; its horse or barn must exist."""
+        if rule.horse_id is not None and self.repo.horse_by_id(rule.horse_id) is None:
+            raise ValueError(f"Horse '{rule.horse_id}' not found.")
+        if rule.barn is not None:
+            barn = self.repo.barn_named(rule.barn)
+            if barn is None:
+                raise ValueError(f"Barn '{rule.barn}' not found.")
+            rule.barn = barn.barn_name
+        rule.owner = rule.owner or self.owner
+        self._rules[rule.id] = rule
+        self._queue_rule(rule)
+        self.pending.append({"op": "put", "kind": RULE, "id": rule.id, "owner": rule.owner,
+                             "data": rule.to_dict()})
+        return rule
+
+    def remove_rule(self, rule):
+        if self._rules.pop(rule.id, None) is None:
+            return
+        self._unqueue(rule)
+        if rule.horse_id is not None:
+            self._by_horse.get(rule.horse_id, {}).pop(rule.id, None)  # not queued if dropped by follow()
+        self.pending.append({"op": "del", "kind": RULE, "id": rule.id, "owner": rule.owner})
+
+    def _queue_rule(self, rule, push=True):
+        if rule.horse_id is not None:
+            self._by_horse.setdefault(rule.horse_id, {})[rule.id] = rule
+            self._enqueue(rule, self.repo.horse_by_id(rule.horse_id).barn, push)
+        else:
+            self._enqueue(rule, rule.barn, push)
+
+    def _queue(self, barn):
+        queue = self._queues.get(_key(barn))
+        if queue is None:
+            queue = self._queues[_key(barn)] = _BarnQueue(self._cursor)
+        return queue
+
+    def _enqueue(self, rule, barn, push=True):
+        # With push=False the entry is only appended; the caller heapifies.
+        queue = self._queue(barn)
+        entry = [rule.next_due(queue.cursor), rule.priority, next(self._sequence), rule]
+        self._entries[rule.id] = entry
+        if push:
+            heapq.heappush(queue.heap, entry)
+        else:
+            queue.heap.append(entry)
+
+    def _unqueue(self, rule):
+        entry = self._entries.pop(rule.id, None)
+        if entry is not None:
+            entry[3] = None
+            self._stale += 1
+            if self._stale > max(1000, len(self._rules)):
+                self._rebuild()
+
+    def _rebuild(self):
+        for queue in self._queues.values():
+            queue.heap = [entry for entry in queue.heap if entry[3] is not None]
+            heapq.heapify(queue.heap)
+        self._stale = 0
+
+    # ===============================
+    # WHAT IS DUE
+    # ===============================
+    def _care(self, queue_key, start, end):
+        queue = self._queues.get(queue_key)
+        if queue is None:
+            return []
+        if start >= queue.cursor:
+            queue.advance(start)
+            rules = queue.due_before(end)
+        else:
+            rules = queue.rules()  # before the heap's cursor: ask every rule
+        tasks = []
+        for rule in rules:
+            horse = self.repo.horse_by_id(rule.horse_id) if rule.horse_id else None
+            for due in rule.due_between(start, end):
+                tasks.append(Task(due, rule.priority, rule.kind, horse.barn if horse else rule.barn,
+                                  horse.name if horse else None, rule.note, rule.id))
+        return tasks
+
+    def _rounds(self, barn, start, end):
+        tasks = []
+        day = start.date()
+        while day <= (end - datetime.timedelta(microseconds=1)).date():
+            for meal, at in self.meal_times.items():
+                due = datetime.datetime.combine(day, at)
+                if start <= due < end:
+                    hays = self.ledger.rations(barn, meal)
+                    if hays:
+                        note = ", ".join(f"{hay} x{count}" for hay, count in sorted(hays.items()))
+                        tasks.append(Task(due, FEEDING_PRIORITY, "feeding", barn, None, f"{meal}: {note}", None))
+            day += datetime.timedelta(days=1)
+        return tasks
+
+    @metrics.timed("tasks_due")
+    def due(self, start, end, barn=None):
+        """Tasks due in [start, end), in one barn (by name, any case) or in all, by time then priority.
+
+        Care tasks of horses in no barn are only listed when barn is None.
+        """
+        if barn is not None:
+            found = self.repo.barn_named(barn)
+            name = found.barn_name if found else barn
+            tasks = self._care(_key(name), start, end) + self._rounds(name, start, end)
+        else:
+            tasks = []
+            for key in self._queues:
+                tasks += self._care(key, start, end)
+            for name in {b for b, _ in self.ledger.barn_meals if b != NO_BARN}:
+                tasks += self._rounds(name, start, end)
+        tasks.sort(key=lambda t: (t.due, t.priority, t.barn or "", t.kind, t.horse or ""))
+        metrics.count("tasks_listed", len(tasks))
+        return tasks
+
+    def day(self, date, barn=None):
+        """Every task of one day."""
+        start = datetime.datetime.combine(date, datetime.time())
+        return self.due(start, start + datetime.timedelta(days=1), barn)
+
+    # ===============================
+    # WRITING
+    # ===============================
+    def prepare(self):
+        """Take the rule changes made since the last call, the last one per rule; None if there are none."""
+        entries, self.pending = self.pending, []
+        return list({e["id"]: e for e in entries}.values()) or None
+
+    def merge(self, older, newer):
+        return list({e["id"]: e for e in older + newer}.values())
+
+    def commit(self, entries):
+        """Write entries to the log; rules another session changed first are left as it wrote them."""
+        os.makedirs(os.path.dirname(self.log.path) or ".", exist_ok=True)
+        with self.log.lock():
+            self.log.commit(entries, self._versions)
+            if self.log.garbage() > max(1000, len(self.log.live)):
+                self.log.compact()
+
+    def save(self):
+        entries = self.prepare()
+        if entries:
+            self.commit(entries)
+
+
+def format_tasks(tasks):
+    """Tasks as lines of text, one per task."""
+    lines = []
+    for task in tasks:
+        where = task.barn or "no barn"
+        who = f"{task.horse} ({where})" if task.horse else where
+        note = f" - {task.note}" if task.note else ""
+        lines.append(f"{task.due:%Y-%m-%d %H:%M} [{PRIORITIES[task.priority]}] {task.kind}: {who}{note}")
+    return lines
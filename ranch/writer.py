@@ -0,0 +1,141 @@
+"""Debounced saves on a background thread."""
+import threading
+import time
+
+
+class BackgroundWriter:
+    """Collects prepared batches and commits them on a thread.
+
+    A sink is anything with merge(older, newer) and commit(batch): a
+    Storage, whose batches come from Storage.prepare(), or a StallHistory.
+    submit() only queues a batch for its sink (storage by default), so the
+    caller never waits for the disk. Batches that arrive close together
+    are merged and written at once: a write starts when no batch has come
+    in for delay seconds, when max_batches are waiting, or max_delay after
+    the oldest waiting one. Sinks are written in the order they first got
+    a batch. flush() writes what is waiting right away and returns once
+    it is on disk; close() flushes and stops the thread.
+
+    A failed write is kept in errors for the caller to pick up through
+    take_errors() or flush(). ConflictError batches are dropped, as the
+    caller reloads after a conflict. Other failures (a full disk) are kept
+    and written together with the next batch or flush.
+    """
+
+    def __init__(self, storage, delay=1.0, max_batches=20, max_delay=5.0):
+        self.storage = storage
+        self.delay = delay
+        self.max_batches = max_batches
+        self.max_delay = max_delay
+        self.commits = 0
+        self._cond = threading.Condition()
+        self._pending = {}  # sink -> merged batch
+        self._batches = 0
+        self._first = self._last = 0.0
+        self._writing = False
+        self._failed = False
+        self._flushing = 0
+        self._closed = False
+        self._errors = []
+        self._thread = threading.Thread(target=self._run, name="ranch-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, batch, sink=None):
+        """Queue a batch for sink (the storage by default); None is ignored."""
+        if batch is None:
+            return
+        with self._cond:
+            self._queue(sink or self.storage, batch)
+            self._failed = False
+            self._cond.notify_all()
+
+    def _queue(self, sink, batch):
+        now = time.monotonic()
+        if not self._pending:
+            self._batches, self._first = 0, now
+        older = self._pending.get(sink)
+        self._pending[sink] = batch if older is None else sink.merge(older, batch)
+        self._batches += 1
+        self._last = now
+
+    def idle(self):
+        """True when nothing is waiting or being written."""
+        with self._cond:
+            return not self._pending and not self._writing
+
+    def take_errors(self):
+        """Errors from writes since the last call, oldest first."""
+        with self._cond:
+            errors, self._errors = self._errors, []
+            return errors
+
+    def flush(self):
+        """Write everything waiting now and wait for it; returns take_errors()."""
+        with self._cond:
+            self._failed = False
+            self._flushing += 1
+            self._cond.notify_all()
+            while self._writing or (self._pending and not self._failed):
+                self._cond.wait()
+            self._flushing -= 1
+        return self.take_errors()
+
+    def close(self):
+        """Flush and stop the thread; returns the errors of the final flush."""
+        errors = self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        return errors
+
+    # ===============================
+    # WRITER THREAD
+    # ===============================
+    def _due(self):
+        # Seconds until the waiting batches should be written; 0 when they are due.
+        if self._flushing or self._closed or self._batches >= self.max_batches:
+            return 0
+        return max(0.0, min(self._last + self.delay, self._first + self.max_delay) - time.monotonic())
+
+    def _next_batches(self):
+        with self._cond:
+            while True:
+                if self._pending and not self._failed:
+                    wait = self._due()
+                    if wait == 0:
+                        batches, self._pending = self._pending, {}
+                        self._writing = True
+                        return batches
+                elif self._closed:
+                    return None
+                else:
+                    wait = None
+                self._cond.wait(wait)
+
+    def _run(self):
+        while True:
+            batches = self._next_batches()
+            if batches is None:
+                return
+            failed, errors = {}, []
+            for sink, batch in batches.items():
+                try:
+                    sink.commit(batch)
+                except Exception as e:  # handed to the caller through take_errors()
+                    errors.append(e)
+                    if isinstance(e, OSError):
+                        failed[sink] = batch
+            with self._cond:
+                self._writing = False
+                self._errors.extend(errors)
+                if not errors:
+                    self.commits += 1
+                if failed:
+                    # Keep them, ahead of anything queued since, until the
+                    # next submit() or flush() tries again.
+                    newer, self._pending = self._pending, {}
+                    for sink, batch in list(failed.items()) + list(newer.items()):
+                        self._queue(sink, batch)
+                    self._failed = True
+                self._cond.notify_all()
@@ -0,0 +1,160 @@
+"""Error responses from the JSON API, driven through RanchService.handle()."""
+import asyncio
+import json
+
+import pytest
+
+from ranch.api import RanchService
+from ranch.auth import UserStore
+from ranch.storage import ShardedStorage
+
+
+class Writer:
+    """Collects what the service writes to a connection."""
+
+    def __init__(self):
+        self.data = b""
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def exchange(service, raw):
+    """Feed raw request bytes to a connection and return [(status, payload)] for each response."""
+    async def run():
+        reader = asyncio.StreamReader(limit=1024)
+        reader.feed_data(raw)
+        reader.feed_eof()
+        writer = Writer()
+        await service.handle(reader, writer)
+        assert writer.closed
+        return writer.data
+    data, responses = asyncio.run(run()), []
+    while data:
+        head, _, rest = data.partition(b"\r\n\r\n")
+        fields = dict(line.lower().split(b": ", 1) for line in head.split(b"\r\n")[1:])
+        length = int(fields[b"content-length"])
+        responses.append((int(head.split()[1]), json.loads(rest[:length])))
+        data = rest[length:]
+    return responses
+
+
+@pytest.fixture
+def service(tmp_path):
+    users = UserStore(str(tmp_path / "users.log"), iterations=1000)
+    users.register("alice", "secret")
+    service = RanchService(users, lambda: ShardedStorage(str(tmp_path / "ranch_data")))
+    service.token = users.issue_token("alice")
+    return service
+
+
+def request(service, method, target, body=None, headers=""):
+    data = json.dumps(body).encode() if body is not None else b""
+    return (f"{method} {target} HTTP/1.1\r\nAuthorization: Bearer {service.token}\r\n{headers}"
+            f"Content-Length: {len(data)}\r\n\r\n").encode() + data
+
+
+def call(service, method, target, body=None):
+    return exchange(service, request(service, method, target, body))[0]
+
+
+@pytest.mark.parametrize("query", ["per_page=0", "per_page=-3", "per_page=abc", "page=0", "page=x", "page=1.5"])
+def test_bad_paging_is_a_bad_request(service, query):
+    status, payload = call(service, "GET", f"/horses?{query}")
+    assert status == 400
+    assert query.split("=")[0] in payload["error"]
+
+
+def test_paging_within_limits_is_answered(service):
+    assert call(service, "GET", "/horses?page=2&per_page=10000") == \
+        (200, {"horses": [], "total": 0, "page": 2, "pages": 1})
+
+
+def test_overlong_header_line_is_answered_and_closed(service):
+    raw = request(service, "GET", "/horses", headers=f"X-Padding: {'x' * 2000}\r\n")
+    raw += request(service, "GET", "/horses")  # never read: the connection is closed
+    assert exchange(service, raw) == [(431, {"error": "header line too long"})]
+
+
+def test_overlong_request_line_is_answered_and_closed(service):
+    assert exchange(service, request(service, "GET", "/horses?name=" + "x" * 2000)) == \
+        [(414, {"error": "request line too long"})]
+
+
+@pytest.mark.parametrize("method, target, body", [
+    ("POST", "/barns", {"barn_name": 5, "stalls": 2}),
+    ("POST", "/barns", {"barn_name": "North"}),
+    ("POST", "/horses", {"name": "Star", "birth_date": 20150401}),
+    ("POST", "/horses", {"name": "Star", "birth_date": "April"}),
+])
+def test_fields_of_the_wrong_type_are_a_bad_request(service, method, target, body):
+    assert call(service, method, target, body)[0] == 400
+
+
+def raw_request(service, head, body=b""):
+    return exchange(service, head.encode() + body)[0]
+
+
+def test_login_with_a_wrong_password_is_refused(service):
+    body = json.dumps({"username": "alice", "password": "wrong"}).encode()
+    assert raw_request(service, f"POST /login HTTP/1.1\r\nContent-Length: {len(body)}\r\n\r\n", body)[0] == 401
+
+
+def test_requests_need_a_valid_token(service):
+    assert raw_request(service, "GET /horses HTTP/1.1\r\n\r\n")[0] == 401
+    assert raw_request(service, "GET /horses HTTP/1.1\r\nAuthorization: Bearer nope\r\n\r\n")[0] == 401
+
+
+def test_unknown_paths_and_methods(service):
+    assert call(service, "GET", "/stables")[0] == 404
+    assert call(service, "PUT", "/horses")[0] == 405
+    assert call(service, "GET", "/horses/nope") == (404, {"error": "horse 'nope' not found"})
+    assert call(service, "DELETE", "/barns/nope")[0] == 404
+
+
+@pytest.mark.parametrize("body, status", [(b"{", 400), (b"[1, 2]", 400)])
+def test_bodies_that_are_not_json_objects(service, body, status):
+    head = f"POST /barns HTTP/1.1\r\nAuthorization: Bearer {service.token}\r\nContent-Length: {len(body)}\r\n\r\n"
+    assert raw_request(service, head, body)[0] == status
+
+
+@pytest.mark.parametrize("header, status", [
+    ("Content-Length: ten", 400),
+    (f"Content-Length: {2 << 20}", 413),
+    ("Transfer-Encoding: chunked", 501),
+])
+def test_request_framing_errors(service, header, status):
+    assert raw_request(service, f"POST /barns HTTP/1.1\r\n{header}\r\n\r\n")[0] == status
+
+
+def test_malformed_request_line(service):
+    assert raw_request(service, "GET\r\n\r\n") == (400, {"error": "malformed request line"})
+
+
+def test_failed_write_leaves_the_data_as_it_was(service):
+    assert call(service, "POST", "/barns", {"barn_name": "North", "stalls": 1})[0] == 201
+    assert call(service, "POST", "/horses", {"name": "Star", "birth_date": "2015-04-01", "barn": "North"})[0] == 201
+    status, payload = call(service, "POST", "/horses", {"name": "Comet", "birth_date": "2015-04-01", "barn": "North"})
+    assert (status, payload) == (400, {"error": "barn 'North' is full"})
+    assert call(service, "GET", "/horses")[1]["total"] == 1
+    assert call(service, "GET", "/barns/North")[1]["free_stalls"] == 0
+
+
+def test_edit_that_loses_to_another_session_is_a_conflict(service, tmp_path):
+    horse = call(service, "POST", "/horses", {"name": "Star", "birth_date": "2015-04-01"})[1]
+    other = ShardedStorage(str(tmp_path / "ranch_data"))
+    horses, barns = other.load("alice")
+    horses[0].breed = "Arabian"
+    other.save("alice", horses, barns)
+
+    status, payload = call(service, "PATCH", f"/horses/{horse['id']}", {"breed": "Shire"})
+    assert status == 409 and "Star" in payload["error"]
+    assert call(service, "GET", f"/horses/{horse['id']}")[1]["breed"] == "Arabian"  # reloaded
+    assert call(service, "PATCH", f"/horses/{horse['id']}", {"breed": "Shire"})[0] == 200
@@ -0,0 +1,95 @@
+"""Imported operations that cannot be applied are refused with BatchError."""
+import json
+
+import pytest
+
+from ranch import session
+from ranch.auth import UserStore
+from ranch.batch import BatchError, apply_operations, read_operations
+from ranch.cli import run_batch
+from ranch.repository import RanchRepository
+
+OWNER = "owner0"
+ADD_BARN = {"op": "add_barn", "barn_name": "North", "stalls": 1}
+
+
+def write(tmp_path, operations):
+    path = tmp_path / "import.json"
+    path.write_text(json.dumps(operations))
+    return str(path)
+
+
+@pytest.mark.parametrize("operations, message", [
+    ([1], "Operation 1: must be an object"),
+    (["add-horse"], "Operation 1: must be an object"),
+    ([ADD_BARN, [ADD_BARN]], "Operation 2: must be an object"),
+    ({"op": "add_barn"}, "Operations must be a list"),
+    ([{"op": "add-horse"}], "Operation 1: unknown op 'add-horse'"),
+    ([{"barn_name": "North"}], "Operation 1: unknown op 'None'"),
+    ([{"op": "add_barn", "stalls": 2}], "Operation 1 (add_barn): missing field 'barn_name'"),
+    ([{"op": "add_barn", "barn_name": 5, "stalls": 2}], "Operation 1 (add_barn): 'int' object"),
+    ([{"op": "add_barn", "barn_name": "North", "stalls": "many"}], "Operation 1 (add_barn): invalid literal"),
+    ([ADD_BARN, {"op": "edit_horse", "name": "Star", "set": {}}], "Operation 2 (edit_horse): horse 'Star' not found"),
+    ([ADD_BARN, {"op": "add_horse", "name": "Star", "birth_date": "2015-04-01", "barn": "North", "stall": 2}],
+     "Operation 2 (add_horse): barn 'North' has no stall 2"),
+])
+def test_bad_operations_are_reported_by_number(operations, message):
+    with pytest.raises(BatchError) as raised:
+        apply_operations(RanchRepository(), OWNER, operations)
+    assert str(raised.value).startswith(message)
+
+
+def test_a_bad_operation_is_found_before_anything_changes():
+    repo = RanchRepository()
+    with pytest.raises(BatchError):
+        apply_operations(repo, OWNER, [ADD_BARN, "remove everything"])
+    assert repo.barns == [] and repo.dirty == set()
+
+
+def test_import_file_must_hold_a_list(tmp_path):
+    with pytest.raises(BatchError):
+        read_operations(write(tmp_path, {"op": "add_barn"}))
+    with pytest.raises(BatchError):
+        apply_operations(RanchRepository(), OWNER, read_operations(write(tmp_path, [1])))
+
+
+def test_unsupported_import_file_is_refused(tmp_path):
+    with pytest.raises(BatchError):
+        read_operations(str(tmp_path / "import.xml"))
+
+
+def test_full_barn_is_reported():
+    operations = [ADD_BARN] + [{"op": "add_horse", "name": name, "birth_date": "2015-04-01", "barn": "North"}
+                               for name in ("Star", "Comet")]
+    with pytest.raises(BatchError, match="Operation 3 \\(add_horse\\): barn 'North' is full"):
+        apply_operations(RanchRepository(), OWNER, operations)
+
+
+@pytest.fixture
+def ranch_dir(tmp_path, monkeypatch):
+    """An empty ranch in the working directory with one user, alice, and a fresh session."""
+    monkeypatch.chdir(tmp_path)
+    for name in ("current_user", "users", "repo", "search_index", "feed_ledger", "render_cache", "history",
+                 "schedule", "storage", "writer", "jobs"):
+        monkeypatch.setattr(session, name, None)
+    UserStore(session.USERS_LOG, iterations=1000).register("alice", "secret")
+    return tmp_path
+
+
+def run_import(ranch_dir, operations):
+    return run_batch(["--user", "alice", "--password", "secret", "import", write(ranch_dir, operations)])
+
+
+@pytest.mark.parametrize("operations", [[1], ["add-horse"], {"op": "add_barn"}, [ADD_BARN, {"op": "add_barn"}]])
+def test_import_errors_are_printed_and_nothing_is_saved(ranch_dir, capsys, operations):
+    assert run_import(ranch_dir, operations) == 1
+    assert capsys.readouterr().out.startswith("Batch aborted, nothing was saved: ")
+    session.load_data()
+    assert session.repo.barns == []
+
+
+def test_import_is_saved(ranch_dir, capsys):
+    assert run_import(ranch_dir, [ADD_BARN]) == 0
+    assert "1 operation(s) applied." in capsys.readouterr().out
+    session.load_data()
+    assert [b.barn_name for b in session.repo.barns] == ["North"]
@@ -0,0 +1,51 @@
+"""Metrics recorded from several threads at once."""
+import sys
+import threading
+
+import pytest
+
+from ranch import metrics
+
+
+@pytest.fixture
+def enabled(monkeypatch):
+    monkeypatch.setattr(metrics, "ENABLED", True)
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)  # switch threads often enough for a race to show
+    metrics.reset()
+    yield
+    sys.setswitchinterval(interval)
+    metrics.reset()
+
+
+def test_no_update_is_lost_and_reports_run_meanwhile(enabled):
+    threads, calls = 8, 5000
+    reports, errors = [], []
+
+    def work(number):
+        for i in range(calls):
+            metrics.count("bytes_read", 2)
+            metrics.record("storage_read", 0.001)
+            metrics.count(f"thread{number}_{i % 50}")  # new names while reports iterate
+
+    def report():
+        try:
+            while any(t.is_alive() for t in workers):
+                reports.append(metrics.as_dict())
+                metrics.prometheus_text()
+        except Exception as e:
+            errors.append(e)
+
+    workers = [threading.Thread(target=work, args=(n,)) for n in range(threads)]
+    reporter = threading.Thread(target=report)
+    for thread in workers:
+        thread.start()
+    reporter.start()
+    for thread in workers + [reporter]:
+        thread.join()
+
+    assert errors == []
+    result = metrics.as_dict()
+    assert result["counters"]["bytes_read"] == 2 * threads * calls
+    assert result["timings"]["storage_read"]["calls"] == threads * calls
+    assert sum(v for k, v in result["counters"].items() if k.startswith("thread")) == threads * calls
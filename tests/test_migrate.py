@@ -0,0 +1,45 @@
+"""Migrating the legacy files into shards, once."""
+import pytest
+
+from ranch.migrate import main, migrate
+from ranch.storage import ShardedStorage, write_records
+
+OWNER = "owner0"
+
+
+@pytest.fixture
+def legacy(tmp_path):
+    horses, barns = str(tmp_path / "horses.json"), str(tmp_path / "barns.json")
+    write_records(horses, [{"id": "h0", "name": "Star", "owner": OWNER}])
+    write_records(barns, [])
+    return str(tmp_path / "ranch_data"), horses, barns
+
+
+def rename_star(data_dir):
+    storage = ShardedStorage(data_dir)
+    horses, barns = storage.load(OWNER)
+    horses[0].name = "Comet"
+    storage.save(OWNER, horses, barns)
+
+
+def names(data_dir):
+    return [h.name for h in ShardedStorage(data_dir).load(OWNER)[0]]
+
+
+def test_migrating_again_is_refused(legacy, capsys):
+    data_dir, horses, barns = legacy
+    assert migrate(data_dir, horses, barns) == 1
+    rename_star(data_dir)
+    with pytest.raises(FileExistsError):
+        migrate(data_dir, horses, barns)
+    assert main(["--data-dir", data_dir, "--horses", horses, "--barns", barns, "--log", ""]) == 1
+    assert "--force" in capsys.readouterr().out
+    assert names(data_dir) == ["Comet"]
+
+
+def test_force_migrates_again(legacy):
+    data_dir, horses, barns = legacy
+    migrate(data_dir, horses, barns)
+    rename_star(data_dir)
+    assert main(["--data-dir", data_dir, "--horses", horses, "--barns", barns, "--log", "", "--force"]) == 0
+    assert names(data_dir) == ["Star"]
@@ -0,0 +1,136 @@
+"""The repository's indexes and free stalls against the records they index."""
+import pytest
+
+from ranch.consistency import check
+from ranch.records import Barn, Horse
+from ranch.repository import RanchRepository
+from ranch.stalls import PlacementError
+
+OWNER = "owner0"
+
+
+def make_repo(stalls=(2, 3), stabled=2):
+    """Barns North, South, ... with the given stalls; the first stabled horses fill North."""
+    barns = [Barn(f"b{i}", name, count, owner=OWNER) for i, (name, count) in enumerate(zip(("North", "South"), stalls))]
+    horses = [Horse(f"h{i}", f"Horse {i}", owner=OWNER) for i in range(5)]
+    for stall, horse in enumerate(horses[:stabled], start=1):
+        horse.barn, horse.stall = "North", stall
+        barns[0].horse_ids.append(horse.id)
+    return RanchRepository(horses, barns)
+
+
+def assert_consistent(repo):
+    """No consistency problems, and every index answers as one rebuilt from the records would."""
+    assert check(repo.horses, repo.barns)[0] == []
+    fresh = RanchRepository([h.copy() for h in repo.horses], [b.copy() for b in repo.barns])
+    for horse in repo.horses:
+        assert repo.horse_named(horse.name).id == fresh.horse_named(horse.name).id
+        assert getattr(repo.barn_of(horse), "id", None) == getattr(fresh.barn_of(horse), "id", None)
+    for barn in repo.barns:
+        assert repo.free_stalls(barn) == fresh.free_stalls(barn)
+        assert repo.next_free_stall(barn) == fresh.next_free_stall(barn)
+        for stall in range(1, barn.stalls + 1):
+            assert [h.id for h in repo.horses_in_stall(barn.barn_name, stall)] == \
+                [h.id for h in fresh.horses_in_stall(barn.barn_name, stall)]
+    assert [b.id for b in repo.available_barns()] == [b.id for b in fresh.available_barns()]
+
+
+def test_assign_to_a_full_barn_changes_nothing():
+    repo = make_repo()
+    south = repo.barn_named("South")
+    for horse in repo.horses[2:]:
+        repo.assign(horse, south)
+    moving = repo.horse_by_id("h0")
+    assert repo.assign(moving, south) is None
+    assert (moving.barn, moving.stall) == ("North", 1)
+    assert repo.barn_named("North").horse_ids == ["h0", "h1"]
+    assert_consistent(repo)
+
+
+def test_assign_within_a_full_barn_keeps_or_finds_a_stall():
+    repo = make_repo()
+    north = repo.barn_named("North")
+    assert repo.assign(repo.horse_by_id("h0"), north) == 1
+    assert north.horse_ids == ["h1", "h0"]
+    assert_consistent(repo)
+
+
+def test_assign_within_a_full_barn_to_a_shared_stall_changes_nothing():
+    repo = make_repo()
+    north = repo.barn_named("North")
+    doubled = repo.horse_by_id("h2")
+    repo.assign(doubled, north, 2)  # apply_plan and imports may put two horses in one stall
+    assert repo.assign(doubled, north) is None
+    assert (doubled.barn, doubled.stall) == ("North", 2)
+    assert north.horse_ids == ["h0", "h1", "h2"]
+    assert repo.free_stalls(north) == 0
+
+
+def test_unassign_frees_the_stall():
+    repo = make_repo()
+    north, horse = repo.barn_named("North"), repo.horse_by_id("h0")
+    repo.unassign(horse)
+    assert (horse.barn, horse.stall) == (None, None)
+    assert repo.next_free_stall(north) == 1
+    assert repo.available_barns() == [north, repo.barn_named("South")]
+    assert_consistent(repo)
+
+
+def test_moving_between_barns_updates_both():
+    repo = make_repo()
+    north, south, horse = repo.barn_named("North"), repo.barn_named("South"), repo.horse_by_id("h1")
+    assert repo.assign(horse, south, 3) == 3
+    assert repo.horses_in_stall("North", 2) == [] and repo.horses_in_stall("south", 3) == [horse]
+    assert repo.barn_of(horse) is south and north.horse_ids == ["h0"]
+    assert_consistent(repo)
+
+
+def test_removing_a_horse_frees_its_stall_and_name():
+    repo = make_repo()
+    horse = repo.horse_by_id("h0")
+    repo.remove_horse(horse)
+    assert repo.horse_by_id("h0") is None and repo.horse_named("Horse 0") is None
+    assert repo.next_free_stall(repo.barn_named("North")) == 1
+    assert_consistent(repo)
+
+
+def test_removing_a_barn_unassigns_its_horses():
+    repo = make_repo()
+    repo.remove_barn(repo.barn_named("North"))
+    assert repo.barn_named("North") is None
+    assert all(h.barn is None and repo.barn_of(h) is None for h in repo.horses)
+    assert repo.horses_in_stall("North", 1) == []
+    assert_consistent(repo)
+
+
+def test_renaming_keeps_the_name_index():
+    repo = make_repo()
+    horse = repo.horse_by_id("h3")
+    repo.update_horse(horse, name="Star")
+    assert repo.horse_named("STAR") is horse and repo.horse_named("Horse 3") is None
+    assert_consistent(repo)
+
+
+def test_place_fills_barns_and_stalls_in_order():
+    repo = make_repo()
+    unplaced = [h for h in repo.horses if h.barn is None]
+    plan = repo.place(unplaced)
+    assert [(h.id, b.barn_name, s) for h, b, s in plan] == [("h2", "South", 1), ("h3", "South", 2), ("h4", "South", 3)]
+    assert repo.available_barns() == []
+    assert_consistent(repo)
+
+
+def test_place_without_room_changes_nothing():
+    repo = make_repo(stalls=(2, 1))
+    with pytest.raises(PlacementError):
+        repo.place([h for h in repo.horses if h.barn is None])
+    assert repo.barn_named("South").horse_ids == [] and repo.free_stalls(repo.barn_named("South")) == 1
+    assert_consistent(repo)
+
+
+def test_dirty_names_every_changed_record():
+    repo = make_repo()
+    assert repo.take_dirty() == set()
+    repo.assign(repo.horse_by_id("h0"), repo.barn_named("South"))
+    assert repo.take_dirty() == {("horse", "h0"), ("barn", "b0"), ("barn", "b1")}
+    assert repo.take_dirty() == set()
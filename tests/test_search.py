@@ -0,0 +1,24 @@
+"""Paging through search results."""
+import pytest
+
+from ranch.records import Horse
+from ranch.repository import RanchRepository
+from ranch.search import SearchIndex
+
+
+@pytest.fixture
+def index():
+    return SearchIndex(RanchRepository([Horse(f"h{i}", f"Horse {i}") for i in range(5)]))
+
+
+def test_pages_cover_every_match_once(index):
+    pages = [index.query(page=n, per_page=2) for n in (1, 2, 3)]
+    assert [p.pages for p in pages] == [3, 3, 3]
+    assert [h.name for p in pages for h in p.horses] == [f"Horse {i}" for i in range(5)]
+    assert index.query(page=4, per_page=2).horses == []
+
+
+@pytest.mark.parametrize("page, per_page", [(0, 20), (-1, 20), (1, 0), (1, -5)])
+def test_page_and_per_page_below_one_are_refused(index, page, per_page):
+    with pytest.raises(ValueError):
+        index.query(page=page, per_page=per_page)
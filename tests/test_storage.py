@@ -0,0 +1,211 @@
+"""Two sessions sharing one data directory, on each storage backend."""
+import os
+
+import pytest
+
+from ranch.records import Barn, Horse
+from ranch.snapshot import write_snapshot
+from ranch.storage import ConflictError, JsonStorage, LogStorage, RecordLog, ShardedStorage, SnapshotLog, new_id
+from ranch.writer import BackgroundWriter
+
+OWNER = "owner0"
+
+
+def horses(*names):
+    return [Horse(f"h{i}", name, owner=OWNER) for i, name in enumerate(names)]
+
+
+def named(records, name):
+    return next(r for r in records if r.name == name)
+
+
+BACKENDS = {
+    "json": lambda root: JsonStorage(str(root / "horses.json"), str(root / "barns.json")),
+    "log": lambda root: LogStorage(str(root / "ranch.log")),
+    "sharded": lambda root: ShardedStorage(str(root / "ranch_data")),
+}
+
+
+@pytest.fixture(params=sorted(BACKENDS))
+def sessions(request, tmp_path):
+    """Two sessions on one backend, each having loaded the same three horses."""
+    make = BACKENDS[request.param]
+    make(tmp_path).save(OWNER, horses("Star", "Comet", "Blaze"), [Barn("b0", "North", 4, owner=OWNER)])
+    first, second = make(tmp_path), make(tmp_path)
+    return (first, *first.load(OWNER)), (second, *second.load(OWNER)), lambda: make(tmp_path).load(OWNER)
+
+
+def test_edits_to_different_records_are_both_kept(sessions):
+    (first, mine, barns), (second, theirs, their_barns), stored = sessions
+    named(theirs, "Comet").breed = "Arabian"
+    second.save(OWNER, theirs, their_barns)
+    named(mine, "Star").breed = "Shire"
+    first.save(OWNER, mine, barns)
+    assert {h.name: h.breed for h in stored()[0]} == {"Star": "Shire", "Comet": "Arabian", "Blaze": ""}
+
+
+def test_edits_to_the_same_record_conflict(sessions):
+    (first, mine, barns), (second, theirs, their_barns), stored = sessions
+    named(theirs, "Star").breed = "Arabian"
+    second.save(OWNER, theirs, their_barns)
+    named(mine, "Star").breed = "Shire"
+    named(mine, "Comet").breed = "Pony"
+    with pytest.raises(ConflictError) as raised:
+        first.save(OWNER, mine, barns)
+    assert raised.value.records == [("horse", "Star")]
+    assert {h.name: h.breed for h in stored()[0]} == {"Star": "Arabian", "Comet": "Pony", "Blaze": ""}
+
+
+def test_conflict_without_partial_saves_nothing(sessions):
+    (first, mine, barns), (second, theirs, their_barns), stored = sessions
+    named(theirs, "Star").breed = "Arabian"
+    second.save(OWNER, theirs, their_barns)
+    named(mine, "Star").breed = "Shire"
+    named(mine, "Comet").breed = "Pony"
+    with pytest.raises(ConflictError):
+        first.save(OWNER, mine, barns, partial=False)
+    assert {h.name: h.breed for h in stored()[0]} == {"Star": "Arabian", "Comet": "", "Blaze": ""}
+
+
+def test_removal_by_one_session_and_edit_by_the_other(sessions):
+    (first, mine, barns), (second, theirs, their_barns), stored = sessions
+    theirs.remove(named(theirs, "Blaze"))
+    second.save(OWNER, theirs, their_barns)
+    named(mine, "Star").breed = "Shire"
+    first.save(OWNER, mine, barns)
+    assert {h.name: h.breed for h in stored()[0]} == {"Star": "Shire", "Comet": ""}
+    named(mine, "Blaze").breed = "Pony"  # removed meanwhile
+    with pytest.raises(ConflictError):
+        first.save(OWNER, mine, barns)
+    assert sorted(h.name for h in stored()[0]) == ["Comet", "Star"]
+
+
+def test_saves_only_the_records_named_as_changed(sessions):
+    (first, mine, barns), (second, theirs, their_barns), stored = sessions
+    named(theirs, "Comet").breed = "Arabian"
+    second.save(OWNER, theirs, their_barns, changed={("horse", named(theirs, "Comet").id)})
+    assert {h.name: h.breed for h in stored()[0]}["Comet"] == "Arabian"
+
+
+def test_background_writer_commits_prepared_batches(sessions):
+    (first, mine, barns), (second, theirs, their_barns), stored = sessions
+    writer = BackgroundWriter(first, delay=0)
+    named(mine, "Star").breed = "Shire"
+    writer.submit(first.prepare(OWNER, mine, barns))
+    named(mine, "Comet").breed = "Pony"
+    writer.submit(first.prepare(OWNER, mine, barns))
+    writer.close()
+    assert writer.take_errors() == []
+    assert {h.name: h.breed for h in stored()[0]} == {"Star": "Shire", "Comet": "Pony", "Blaze": ""}
+
+
+def test_record_log_replays_after_another_session_compacts(tmp_path):
+    path = str(tmp_path / "records.log")
+    mine, theirs = RecordLog(path), RecordLog(path)
+    versions = {}
+    for log in (mine, theirs):
+        log.replay()
+    entry = {"op": "put", "kind": "horse", "id": "h0", "owner": OWNER, "data": {"name": "Star"}}
+    with mine.lock():
+        mine.commit([entry], versions)
+    for name in ("Comet", "Blaze"):  # twice, so an inode number can come round again
+        with theirs.lock():
+            theirs.catch_up()
+            theirs.commit([dict(entry, data={"name": name})], {("horse", "h0"): theirs.get(("horse", "h0"))["version"]})
+            theirs.compact()
+    with mine.lock():
+        mine.catch_up()
+    assert mine.get(("horse", "h0"))["data"] == {"name": "Blaze"}
+    assert mine.get(("horse", "h0"))["version"] == 3
+
+
+@pytest.mark.parametrize("make", [
+    lambda root: ShardedStorage(str(root / "ranch_data"), compact_min=0),
+    lambda root: LogStorage(str(root / "ranch.log"), compact_min=0),
+], ids=["sharded", "log"])
+def test_edits_survive_compaction_by_another_session(tmp_path, make):
+    first, second = make(tmp_path), make(tmp_path)
+    first.save(OWNER, horses("Star", "Comet", "Blaze"), [Barn("b0", "North", 4, owner=OWNER)])
+    mine, _ = first.load(OWNER)
+    for name in ("Comet", "Blaze"):
+        theirs, barns = second.load(OWNER)
+        named(theirs, name).breed = "Arabian"  # each save compacts
+        second.save(OWNER, theirs, barns)
+    named(mine, "Star").breed = "Shire"
+    first.save(OWNER, mine, barns)
+
+    reader = make(tmp_path)
+    stored, _ = reader.load(OWNER)
+    assert {h.name: h.breed for h in stored} == {"Star": "Shire", "Comet": "Arabian", "Blaze": "Arabian"}
+
+
+def test_conflicting_edit_after_compaction_is_reported(tmp_path):
+    first = ShardedStorage(str(tmp_path), compact_min=0)
+    second = ShardedStorage(str(tmp_path), compact_min=0)
+    first.save(OWNER, horses("Star"), [])
+    mine, _ = first.load(OWNER)
+    for breed in ("Arabian", "Shire"):
+        theirs, _ = second.load(OWNER)
+        theirs[0].breed = breed
+        second.save(OWNER, theirs, [])
+    mine[0].breed = "Pony"
+    with pytest.raises(ConflictError):
+        first.save(OWNER, mine, [])
+    stored, _ = ShardedStorage(str(tmp_path)).load(OWNER)
+    assert stored[0].breed == "Shire"
+
+
+def put(hid, name, version=1):
+    return {"op": "put", "kind": "horse", "id": hid, "owner": OWNER, "version": version,
+            "data": Horse(hid, name, owner=OWNER).to_dict()}
+
+
+def names(log):
+    return sorted(e["data"]["name"] for e in log.entries())
+
+
+def test_snapshot_log_follows_another_sessions_compactions(tmp_path):
+    path = str(tmp_path / "shard.log")
+    mine, theirs = SnapshotLog(path), SnapshotLog(path)
+    with theirs.lock():
+        theirs.append([put("h0", "Star"), put("h1", "Comet")])
+        theirs.compact()
+    mine.replay()
+    for hid in ("h0", "h1"):  # a removal, then a new snapshot in each round
+        with theirs.lock():
+            theirs.catch_up()
+            theirs.append([{"op": "del", "kind": "horse", "id": hid, "owner": OWNER}, put(hid + "x", "Blaze")])
+            theirs.compact()
+    with mine.lock():
+        mine.catch_up()
+    assert names(mine) == ["Blaze", "Blaze"]
+    mine.close()
+    theirs.close()
+
+
+def test_snapshot_written_without_its_log_reads_the_same(tmp_path):
+    path = str(tmp_path / "shard.log")
+    log = SnapshotLog(path)
+    with log.lock():
+        log.append([put("h0", "Star"), put("h1", "Comet")])
+        log.compact()
+        log.append([{"op": "del", "kind": "horse", "id": "h0", "owner": OWNER}, put("h2", "Blaze")])
+        # A compaction cut short after the snapshot was replaced and before the log was.
+        write_snapshot(log.snapshot_path, list(log.entries()), new_id(), log.header["snapshot"])
+    log.close()
+    reopened = SnapshotLog(path)
+    reopened.replay()
+    assert names(reopened) == ["Blaze", "Comet"]
+    reopened.close()
+
+
+def test_log_whose_snapshot_is_missing_is_refused(tmp_path):
+    path = str(tmp_path / "shard.log")
+    log = SnapshotLog(path)
+    with log.lock():
+        log.append([put("h0", "Star")])
+        log.compact()
+    log.close()
+    os.remove(log.snapshot_path)
+    with pytest.raises(FileNotFoundError):
+        SnapshotLog(path).replay()